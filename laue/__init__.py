@@ -54,12 +54,15 @@ from .core import (cam_to_gnomonic, cam_to_thetachi,
     gnomonic_to_thetachi, hough, hough_reduce, inter_lines,
     thetachi_to_cam, thetachi_to_gnomonic, Transformer,
     comb2ind, ind2comb, atomic_pic_search, atomic_find_subsets,
-    atomic_find_zone_axes)
-from .experiment import Experiment, OrderedExperiment
-from .utilities import (Recordable, read_image, create_image,
+    atomic_find_zone_axes, SpatialIndex, AxesIncidence, pairwise_distances)
+from .experiment import (Experiment, OrderedExperiment,
+    shard_experiment, merge_experiments, SpotTable)
+from .utilities import (Recordable, read_image, check_image, read_hdf5_stack, create_image,
     images_to_iter, TimeCost, Lambdify, limited_imap,
     pickleable_method, prevent_generator_size, reduce_object,
-    NestablePool, RecallingIterator, extract_parameters)
+    NestablePool, RecallingIterator, reorder, extract_parameters,
+    CostModel, scheduled_imap, ConcurrencyPolicy, SpillBuffer, SpillDict, CacheManager,
+    DistributedPool, LocalCluster, write_results, open_results)
 
 __all__ = [
     # laue.core
@@ -68,15 +71,20 @@ __all__ = [
     "hough_reduce", "inter_lines", "thetachi_to_cam", "thetachi_to_gnomonic",
     "Transformer", "comb2ind", "ind2comb",
     "atomic_pic_search", "atomic_find_subsets", "atomic_find_zone_axes",
+    "SpatialIndex", "AxesIncidence", "pairwise_distances",
 
     # laue.experiment
-    "Experiment", "OrderedExperiment",
+    "Experiment", "OrderedExperiment", "shard_experiment", "merge_experiments",
+    "SpotTable",
 
     # laue.utilities
-    "Recordable", "read_image", "create_image",
+    "Recordable", "read_image", "check_image", "read_hdf5_stack", "create_image",
     "images_to_iter", "TimeCost", "Lambdify", "limited_imap",
     "pickleable_method", "prevent_generator_size", "reduce_object",
-    "NestablePool", "RecallingIterator", "extract_parameters",
+    "NestablePool", "RecallingIterator", "reorder", "extract_parameters",
+    "CostModel", "scheduled_imap", "ConcurrencyPolicy", "SpillBuffer", "SpillDict",
+    "CacheManager", "DistributedPool", "LocalCluster", "write_results",
+    "open_results",
    ]
 
 
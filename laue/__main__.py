@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+
+"""
+** Traitement par lot en ligne de commande. **
+----------------------------------------------
+
+Enchaine la detection des spots, la calibration, la recherche des axes
+de zone et l'estimation des grains sur un repertoire, une expression glob
+ou une pile HDF5, puis ecrit les resultats dans un fichier en colonnes.
+
+Examples
+--------
+
+    python -m laue "images/*.mccd" -o result.h5 --det calib.det --workers 8
+    python -m laue stack.h5::/entry/data -o result.npz --stages detection zone_axes
+"""
+
+import argparse
+import csv
+import os
+import re
+import sys
+import time
+
+import numpy as np
+
+
+STAGES = ("detection", "calibration", "zone_axes", "subsets")
+CALIBRATION = ("dd", "xcen", "ycen", "xbet", "xgam", "pixelsize")
+
+def _parse_bytes(size):
+    """
+    ** Convertit une taille comme "512M" ou "4G" en octets. **
+
+    Examples
+    --------
+    >>> from laue.__main__ import _parse_bytes
+    >>> _parse_bytes("512M"), _parse_bytes("2g"), _parse_bytes("1000")
+    (536870912, 2147483648, 1000)
+    >>>
+    """
+    match = re.fullmatch(r"\s*(\d+(?:\.\d*)?)\s*([kmgt]?)i?b?\s*", size.lower())
+    if match is None:
+        raise argparse.ArgumentTypeError(f"{size!r} n'est pas une taille valide.")
+    return int(float(match.group(1)) * 1024**" kmgt".index(match.group(2) or " "))
+
+def _build_tables(experiment, axes=None, subsets=None):
+    """
+    ** Met les resultats sous forme de colonnes. **
+
+    Parameters
+    ----------
+    experiment : laue.experiment.base_experiment.Experiment
+        L'experience dont les diagrammes sont extraits.
+    axes : list, optional
+        Pour chaque diagramme, ses axes de zone si ils sont calcules.
+    subsets : list, optional
+        Pour chaque diagramme, ses bouts de grains si ils sont calcules.
+
+    Returns
+    -------
+    dict
+        ``{"spots": colonnes, "frames": colonnes}``, chaque colonne etant un ``np.ndarray``.
+        Les angles ne sont fournis que si la camera est calibree.
+    """
+    calibrated = experiment._calibration_parameters is not None
+    spots = {name: [] for name in ("frame", "spot", "x", "y", "intensity")}
+    if calibrated:
+        spots.update({"two_theta": [], "chi": []})
+    frames = {"frame": [], "name": [], "spots": [], "zone_axes": [], "subsets": []}
+
+    for frame, diag in enumerate(experiment):
+        nbr = len(diag)
+        spots["frame"].append(np.full(nbr, frame, dtype=np.int32))
+        spots["spot"].append(np.arange(nbr, dtype=np.int32))
+        positions = diag.get_positions().reshape(2, nbr)
+        spots["x"].append(positions[0])
+        spots["y"].append(positions[1])
+        spots["intensity"].append(np.array([spot.get_intensity() for spot in diag], dtype=np.float64))
+        if calibrated:
+            theta, chi = diag.get_theta_chi().reshape(2, nbr)
+            spots["two_theta"].append(2*theta)
+            spots["chi"].append(chi)
+        frames["frame"].append(frame)
+        frames["name"].append(diag.get_id())
+        frames["spots"].append(nbr)
+        frames["zone_axes"].append(-1 if axes is None else len(axes[frame]))
+        frames["subsets"].append(-1 if subsets is None else len(subsets[frame]))
+
+    spots = {name: (np.concatenate(column) if column else np.empty(0)) for name, column in spots.items()}
+    frames = {name: np.array(column) for name, column in frames.items()}
+    frames["name"] = frames["name"].astype(str)
+    return {"spots": spots, "frames": frames}
+
+def _write_tables(filename, tables):
+    """
+    ** Ecrit les tables en colonnes. **
+
+    Notes
+    -----
+    * ``.h5``, ``.hdf5`` : Un groupe par table, un jeu de donnees par colonne.
+    * ``.npz`` : Les colonnes sont nommees ``"table/colonne"``.
+    * ``.csv`` : La table des spots est ecrite dans ``filename``, celle des
+    diagrammes dans le meme fichier suffixe par ``_frames``.
+    """
+    ext = os.path.splitext(filename)[1].lower()
+    if ext in {".h5", ".hdf5"}:
+        try:
+            import h5py
+        except ImportError as err:
+            raise ImportError("Pour ecrire un fichier HDF5, il faut installer le module 'h5py'.") from err
+        with h5py.File(filename, "w") as file:
+            for table, columns in tables.items():
+                group = file.create_group(table)
+                for name, column in columns.items():
+                    if column.dtype.kind == "U":
+                        column = column.astype(h5py.string_dtype())
+                    group.create_dataset(name, data=column, compression="gzip" if len(column) > 1024 else None)
+    elif ext == ".npz":
+        np.savez(filename, **{f"{table}/{name}": column
+                              for table, columns in tables.items() for name, column in columns.items()})
+    elif ext == ".csv":
+        for table, path in (("spots", filename), ("frames", f"{filename[:-4]}_frames.csv")):
+            with open(path, "w", newline="", encoding="utf-8") as file:
+                writer = csv.writer(file)
+                writer.writerow(tables[table])
+                writer.writerows(zip(*(column.tolist() for column in tables[table].values())))
+    else:
+        raise ValueError(f"Seules les extensions '.h5', '.hdf5', '.npz' et '.csv' sont supportees, pas {ext!r}.")
+
+def _parser():
+    """
+    ** Les options de la ligne de commande. **
+    """
+    parser = argparse.ArgumentParser(prog="python -m laue",
+        description="Traite un lot de diagrammes de Laue.")
+    parser.add_argument("source",
+        help="Repertoire, expression glob ou pile HDF5 ('fichier.h5' ou 'fichier.h5::/jeu').")
+    parser.add_argument("-o", "--output", required=True,
+        help="Fichier de sortie en colonnes: .h5, .hdf5, .npz ou .csv.")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES),
+        help="Les etapes a calculer. La detection est toujours faite.")
+    parser.add_argument("--det", default=None, help="Fichier de calibration '.det'.")
+    for name in CALIBRATION:
+        parser.add_argument(f"--{name}", type=float, default=None, help=f"Parametre de calibration {name}.")
+    parser.add_argument("--workers", type=int, default=None,
+        help="Nombre de processus de calcul. Par defaut, un par coeur.")
+    parser.add_argument("--batch-size", type=int, default=None,
+        help="Nombre de taches ordonnancees ensemble. Par defaut, 4 par coeur.")
+    parser.add_argument("--memory-budget", type=_parse_bytes, default=None,
+        help="Memoire maximale des taches simultanees, par exemple '8G'.")
+    parser.add_argument("--cache-dir", default=None,
+        help="Repertoire ou sont deportes les diagrammes qui sortent de la fenetre en memoire.")
+    parser.add_argument("--window", type=int, default=256,
+        help="Nombre de diagrammes gardes en memoire quand '--cache-dir' est fourni.")
+    parser.add_argument("--threshold", type=float, default=None, help="Seuil de detection des spots.")
+    parser.add_argument("-v", "--verbose", action="count", default=0, help="Affiche l'avancement.")
+    return parser
+
+def main(argv=None):
+    """
+    ** Point d'entree de ``python -m laue``. **
+
+    Parameters
+    ----------
+    argv : list, optional
+        Les arguments de la ligne de commande, par defaut ``sys.argv[1:]``.
+
+    Returns
+    -------
+    dict
+        A chaque etape calculee, le couple ``(nbr_diagrammes, duree)``.
+    """
+    args = _parser().parse_args(argv)
+    kwargs = {name: getattr(args, name) for name in CALIBRATION if getattr(args, name) is not None}
+    if args.det is not None:
+        kwargs["config_file"] = args.det
+    options = {"processes": args.workers, "batch_size": args.batch_size,
+               "memory_budget": args.memory_budget, "threshold": args.threshold}
+    kwargs.update({name: value for name, value in options.items() if value is not None})
+    if args.cache_dir is not None:
+        kwargs.update({"spill_dir": args.cache_dir, "spill_window": args.window})
+
+    from laue.experiment.base_experiment import Experiment
+    experiment = Experiment(args.source, verbose=args.verbose, **kwargs)
+
+    timing = {}
+    axes = subsets = None
+    try: # Le pool des etapes est arrete a la fin, meme en cas d'erreur.
+        start = time.time()
+        nbr = len(experiment.get_diagrams())
+        timing["detection"] = (nbr, time.time()-start)
+        if "calibration" in args.stages:
+            start = time.time()
+            experiment.set_calibration()
+            timing["calibration"] = (nbr, time.time()-start)
+        if "zone_axes" in args.stages:
+            start = time.time()
+            axes = experiment.find_zone_axes()
+            timing["zone_axes"] = (nbr, time.time()-start)
+        if "subsets" in args.stages:
+            start = time.time()
+            subsets = experiment.find_subsets()
+            timing["subsets"] = (nbr, time.time()-start)
+
+        start = time.time()
+        _write_tables(args.output, _build_tables(experiment, axes, subsets))
+        timing["output"] = (nbr, time.time()-start)
+    finally:
+        experiment.close()
+
+    print(f"{'etape':<12} {'images':>8} {'duree (s)':>10} {'images/s':>10}", file=sys.stderr)
+    for stage, (frames, duration) in timing.items():
+        print(f"{stage:<12} {frames:>8} {duration:>10.2f} {frames/max(duration, 1e-9):>10.1f}",
+              file=sys.stderr)
+    total = sum(duration for _, duration in timing.values())
+    print(f"{'total':<12} {nbr:>8} {total:>10.2f} {nbr/max(total, 1e-9):>10.1f}", file=sys.stderr)
+    return timing
+
+
+if __name__ == "__main__":
+    main()
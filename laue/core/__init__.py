@@ -15,6 +15,8 @@ from .geometry import (cam_to_gnomonic, cam_to_thetachi,
     gnomonic_to_thetachi, hough, hough_reduce, inter_lines,
     Transformer, comb2ind, ind2comb,
     thetachi_to_cam, thetachi_to_gnomonic)
+from .incidence import AxesIncidence
+from .neighbors import SpatialIndex, pairwise_distances
 from .pic_search import atomic_pic_search
 from .subsets import atomic_find_subsets
 from .zone_axes import atomic_find_zone_axes
@@ -26,6 +28,12 @@ __all__ = [
     "hough_reduce", "inter_lines", "thetachi_to_cam", "thetachi_to_gnomonic",
     "Transformer", "comb2ind", "ind2comb",
 
+    # incidence
+    "AxesIncidence",
+
+    # neighbors
+    "SpatialIndex", "pairwise_distances",
+
     # pic_search
     "atomic_pic_search",
 
@@ -748,7 +748,7 @@ class Transformer(TransformerPickleable, Compilator):
         phi_vect, mu_vect = phi_vect.astype(dtype, copy=False), mu_vect.astype(dtype, copy=False)
 
         *over_dims, nbr_inter = phi_vect.shape # Recuperation des dimensions.
-        nbr = (nbr*(nbr-1))/2 # On converti le nombre de points alignes en nbr de segments.
+        nbr = (nbr*(nbr-1))//2 # On converti le nombre de points alignes en nbr de segments.
 
         # On commence par travailler avec les donnees reduites.
         phi_theo_std = math.pi / math.sqrt(3) # Variance theorique = (math.pi - -math.pi)**2 / 12
@@ -763,8 +763,9 @@ class Transformer(TransformerPickleable, Compilator):
         clusters = np.empty(np.prod(over_dims, dtype=int), dtype=object) # On doit d'abord creer un tableau d'objet 1d.
         if multiprocessing.current_process().name == "MainProcess" and np.prod(over_dims) >= os.cpu_count(): # Si ca vaut le coup de parraleliser:
             ser_self = cloudpickle.dumps(self) # Strategie car 'pickle' ne sais pas faire ca.
+            from laue.utilities.concurrency import ConcurrencyPolicy
             from laue.utilities.multi_core import pickleable_method
-            with multiprocessing.Pool() as pool:
+            with multiprocessing.Pool(**ConcurrencyPolicy().pool_kwargs()) as pool:
                 clusters[:] = pool.map(
                     pickleable_method, # Car si il y a autant de cluster dans chaque image,
                     (                   # numpy aurait envi de faire un tableau 2d plutot qu'un vecteur de listes.
@@ -1003,8 +1004,8 @@ class Transformer(TransformerPickleable, Compilator):
             phi_x, phi_y = 2*WEIGHT*np.cos(phi_vect_1d), 2*WEIGHT*np.sin(phi_vect_1d)
 
         # Recherche des clusters.
-        n_jobs = -1 if multiprocessing.current_process().name == "MainProcess" else 1
-        db_res = DBSCAN(eps=tol, min_samples=nbr, n_jobs=n_jobs).fit(
+        from laue.utilities.concurrency import get_threads
+        db_res = DBSCAN(eps=tol, min_samples=nbr, n_jobs=get_threads()).fit(
             np.vstack((phi_x, phi_y, 2*(1-WEIGHT)*mu_vect_1d)).transpose())
 
         # Mise en forme des clusters.
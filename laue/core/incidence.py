@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+
+"""
+** Appartenance des spots aux axes de zone. **
+----------------------------------------------
+
+La matrice d'incidence (axes x spots) d'un diagramme est rangee au
+format CSR: pour chaque axe, les rangs de ses spots sont contigus dans
+un seul tableau. Les grandeurs des axes (nombre de spots, distance
+moyenne, qualite) se calculent alors pour tous les axes d'un coup.
+"""
+
+import math
+
+import numpy as np
+
+
+def _axes_qualities(nbr_spots, dist_means, *, nbr_min=7, d_max=.0117, nbr_weight=.75):
+    """
+    ** La qualite de chaque axe, voir ``laue.zone_axis.ZoneAxis.get_quality``. **
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from laue.core.incidence import _axes_qualities
+    >>> np.round(_axes_qualities(np.array([7, 14, 30]), np.array([.001, .005, .02])), 3).tolist()
+    [0.316, 0.784, 0.752]
+    >>>
+    """
+    # f(nbr_min) = .1, f(2*nbr_min) = .8, f(+oo) = 1
+    nbr_max = 2 * nbr_min
+    a, b = .1, .8
+    lna, lnb = math.log((1-a)/a), math.log((1-b)/b)
+    beta = (nbr_min*lnb - nbr_max*lna) / (lnb - lna)
+    lamb = lna / (beta - nbr_min)
+    nbr_score = 1 / (1 + np.exp(-lamb*(np.asarray(nbr_spots, dtype=np.float64)-beta)))
+
+    # f([0, d_min[) = [1, .9[, f([d_min, d_max[) = [.9, .2[, f([d_max, +oo[) = [.2, 0[
+    dist_means = np.asarray(dist_means, dtype=np.float64)
+    d_min = d_max / 4
+    slope = (.9-.2)/(d_max-d_min)
+    dist_score = np.where(dist_means < d_min, 1 - ((1-.9)/d_min)*dist_means,
+        np.where(dist_means < d_max, .9 - slope*(dist_means-d_min),
+            .2*np.exp(-(slope/.2)*(dist_means-d_max))))
+
+    return nbr_weight*nbr_score + (1-nbr_weight)*dist_score
+
+
+class AxesIncidence:
+    """
+    ** Matrice d'incidence creuse entre les axes de zone et les spots. **
+
+    Notes
+    -----
+    * Les lignes sont les axes, les colonnes sont les spots.
+    * Les spots de l'axe ``i`` sont ``indices[indptr[i]:indptr[i+1]]``,
+    par rang croissant.
+    * La transposee (les axes de chaque spot) est construite a la premiere
+    requete qui en a besoin.
+    * Les distances moyennes et les qualites sont calculees une seule fois
+    pour tous les axes, puis gardees. Elles restent justes car les axes
+    sont oublies des que les coordonnees gnomoniques changent.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from laue.core.incidence import AxesIncidence
+    >>> incidence = AxesIncidence.from_groups([{4, 0, 2}, {2, 3}], 5, phi=[0.0, 1.0], mu=[0.1, 0.2])
+    >>> incidence.shape
+    (2, 5)
+    >>> incidence.get_spots(0).tolist(), incidence.get_axes(2).tolist()
+    ([0, 2, 4], [0, 1])
+    >>> incidence.spots_per_axis().tolist(), incidence.axes_per_spot().tolist()
+    ([3, 2], [1, 0, 2, 1, 1])
+    >>> incidence.toarray().astype(int).tolist()
+    [[1, 0, 1, 0, 1], [0, 0, 1, 1, 0]]
+    >>>
+    """
+    def __init__(self, indptr, indices, nbr_spots, phi, mu):
+        """
+        Parameters
+        ----------
+        indptr : np.ndarray
+            Le debut de chaque ligne dans ``indices``, de taille ``nbr_axes + 1``.
+        indices : np.ndarray
+            Les rangs des spots, tries au sein de chaque ligne.
+        nbr_spots : int
+            Le nombre de spots du diagramme, c'est le nombre de colonnes.
+        phi, mu : np.ndarray
+            Les coordonnees polaires des axes dans le plan gnomonic.
+        """
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.nbr_spots = int(nbr_spots)
+        self.phi = np.asarray(phi).reshape(-1)
+        self.mu = np.asarray(mu).reshape(-1)
+        assert len(self.phi) == len(self.mu) == len(self.indptr) - 1, \
+            "Il faut autant d'angles et de distances que d'axes."
+
+        self._t_indptr = None # La transposee, les axes de chaque spot.
+        self._t_indices = None
+        self._dist_means = None # La distance moyenne entre chaque axe et ses spots.
+        self._qualities = None # La qualite de chaque axe.
+
+    @classmethod
+    def from_groups(cls, groups, nbr_spots, phi, mu):
+        """
+        ** Construit la matrice a partir des spots de chaque axe. **
+
+        Parameters
+        ----------
+        groups : iterable
+            Pour chaque axe, un iterable des rangs de ses spots.
+        nbr_spots : int
+            Le nombre de spots du diagramme.
+        phi, mu : array_like
+            Les coordonnees polaires des axes.
+        """
+        groups = [np.fromiter(group, dtype=np.int64) for group in groups]
+        indptr = np.zeros(len(groups)+1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(group) for group in groups])
+        indices = (np.concatenate([np.sort(group) for group in groups])
+                   if groups else np.empty(0, dtype=np.int64))
+        return cls(indptr, indices, nbr_spots, phi, mu)
+
+    @property
+    def shape(self):
+        """
+        ** La forme (nbr_axes, nbr_spots) de la matrice. **
+        """
+        return len(self.indptr) - 1, self.nbr_spots
+
+    def _rows(self):
+        """
+        ** Le rang de l'axe de chaque element non nul. **
+        """
+        return np.repeat(np.arange(self.shape[0]), np.diff(self.indptr))
+
+    def _transpose(self):
+        """
+        ** La matrice transposee au format CSR, les axes de chaque spot. **
+        """
+        if self._t_indptr is None:
+            order = np.argsort(self.indices, kind="stable")
+            self._t_indices = self._rows()[order]
+            self._t_indptr = np.zeros(self.nbr_spots+1, dtype=np.int64)
+            self._t_indptr[1:] = np.cumsum(self.axes_per_spot())
+        return self._t_indptr, self._t_indices
+
+    def get_spots(self, axis):
+        """
+        ** Les rangs des spots de l'axe ``axis``, par ordre croissant. **
+        """
+        return self.indices[self.indptr[axis]:self.indptr[axis+1]]
+
+    def get_axes(self, spot):
+        """
+        ** Les rangs des axes qui passent par le spot ``spot``, par ordre croissant. **
+        """
+        indptr, indices = self._transpose()
+        return indices[indptr[spot]:indptr[spot+1]]
+
+    def spots_per_axis(self):
+        """
+        ** Le nombre de spots de chaque axe. **
+        """
+        return np.diff(self.indptr)
+
+    def axes_per_spot(self):
+        """
+        ** Le nombre d'axes qui passent par chaque spot. **
+        """
+        return np.bincount(self.indices, minlength=self.nbr_spots)
+
+    def dist_means(self, transformer, gnomonics):
+        """
+        ** La moyenne des distances entre chaque axe et ses spots. **
+
+        Parameters
+        ----------
+        transformer : laue.core.geometry.transformer.Transformer
+            Fournit l'equation de la distance entre un point et une droite.
+        gnomonics : np.ndarray
+            Les coordonnees gnomoniques de tous les spots, de shape (2, nbr_spots).
+
+        Returns
+        -------
+        np.ndarray
+            Une distance par axe, voir ``laue.zone_axis.ZoneAxis.dist_mean``.
+            Comme pour une moyenne axe par axe, elle vaut nan des
+            qu'une des distances de l'axe n'est pas definie.
+
+        Examples
+        --------
+        >>> import numpy as np
+        >>> from laue.core.incidence import AxesIncidence
+        >>> class Transformer:
+        ...     def get_fct_dist_line(self):
+        ...         return lambda phi, mu, x, y: np.abs(x*np.cos(phi) + y*np.sin(phi) - mu)
+        ...
+        >>> gnomonics = np.array([[0.1, 0.3, np.nan], [0.0, 0.0, 0.0]])
+        >>> incidence = AxesIncidence.from_groups([{0, 1}, {1, 2}], 3, phi=[0.0, 0.0], mu=[0.1, 0.3])
+        >>> np.round(incidence.dist_means(Transformer(), gnomonics), 3).tolist()
+        [0.1, nan]
+        >>>
+        """
+        if self._dist_means is None:
+            rows = self._rows()
+            x_vect, y_vect = np.asarray(gnomonics, dtype=np.float64)[:, self.indices]
+            dists = np.asarray(transformer.get_fct_dist_line()(
+                self.phi.astype(np.float64)[rows], self.mu.astype(np.float64)[rows], x_vect, y_vect),
+                dtype=np.float64)
+            dists = np.broadcast_to(dists, rows.shape)
+            counts = self.spots_per_axis()
+            sums = np.bincount(rows, weights=dists, minlength=self.shape[0])
+            with np.errstate(invalid="ignore", divide="ignore"):
+                self._dist_means = sums / counts
+        return self._dist_means
+
+    def qualities(self, transformer, gnomonics):
+        """
+        ** La qualite de chaque axe, voir ``laue.zone_axis.ZoneAxis.get_quality``. **
+
+        Les parametres sont ceux de ``AxesIncidence.dist_means``.
+        """
+        if self._qualities is None:
+            self._qualities = _axes_qualities(
+                self.spots_per_axis(), self.dist_means(transformer, gnomonics))
+        return self._qualities
+
+    def toarray(self):
+        """
+        ** La matrice d'incidence dense, de type booleen. **
+        """
+        dense = np.zeros(self.shape, dtype=bool)
+        dense[self._rows(), self.indices] = True
+        return dense
+
+    def to_sparse(self):
+        """
+        ** La matrice d'incidence au format ``scipy.sparse.csr_matrix``. **
+        """
+        try:
+            from scipy.sparse import csr_matrix
+        except ImportError as err:
+            raise ImportError("Il faut installer scipy pour exporter la matrice creuse.") from err
+        return csr_matrix(
+            (np.ones(len(self.indices), dtype=bool), self.indices, self.indptr), shape=self.shape)
+
+    def __len__(self):
+        """
+        ** Le nombre d'axes. **
+        """
+        return self.shape[0]
+
+    def __repr__(self):
+        return f"AxesIncidence(nbr_axes={self.shape[0]}, nbr_spots={self.nbr_spots})"
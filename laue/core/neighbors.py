@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+
+"""
+** Recherche rapide des plus proches voisins. **
+------------------------------------------------
+
+Un index est construit une fois sur les spots d'un diagramme, puis
+interroge autant de fois que necessaire, par paquets de points.
+C'est un arbre ``scipy.spatial.cKDTree`` si scipy est installe,
+sinon une recherche exhaustive vectorisee par blocs.
+
+Les distances exhaustives entre 2 familles de points ou d'axes sont
+calculees par ``pairwise_distances``, bloc de lignes par bloc de lignes,
+de sorte que la matrice complete n'existe jamais si seuls les plus
+proches voisins sont demandes.
+"""
+
+import numbers
+
+import numpy as np
+
+
+BLOCK_BYTES = 32*2**20 # Taille maximale d'un bloc de matrice de distances en octets.
+
+
+def _thetachi_to_uq(theta, chi):
+    """
+    ** Les vecteurs ``uq`` unitaires, en fonction des angles en degres. **
+
+    Notes
+    -----
+    A partir de ``uf = (cos(2.theta), sin(chi).sin(2.theta), cos(chi).sin(2.theta))``
+    et de ``uq = uf - ui``, la normalisation donne
+    ``uq = (-sin(theta), sin(chi).cos(theta), cos(chi).cos(theta))``.
+    L'angle entre 2 de ces vecteurs est la distance de
+    ``laue.core.geometry.transformer.Transformer.dist_cosine``.
+    """
+    theta, chi = np.radians(theta), np.radians(chi)
+    return np.stack([-np.sin(theta), np.sin(chi)*np.cos(theta), np.cos(chi)*np.cos(theta)], axis=-1)
+
+def _as_points(coords, space, dtype):
+    """
+    ** Les coordonnees (2, n) sous forme de points (n, d) propres a l'espace. **
+    """
+    coords = np.asarray(coords, dtype=dtype)
+    assert coords.ndim == 2 and coords.shape[0] == 2, \
+        f"Les coordonnees doivent etre de shape (2, n), pas {coords.shape}."
+    if space == "cosine":
+        return _thetachi_to_uq(*coords).astype(dtype, copy=False)
+    return coords.transpose()
+
+def _distance_blocks(points1, points2, space, *, weight=.5, block_bytes=BLOCK_BYTES):
+    """
+    ** Cede les distances entre ``points1`` et ``points2``, par blocs de lignes. **
+
+    Chaque bloc est un couple ``(start, distances)`` ou ``distances`` est
+    la matrice des distances entre ``points1[start:start+len(distances)]``
+    et tous les ``points2``. La taille des blocs est bornee par ``block_bytes``.
+    """
+    dim = 1 if space == "cosine" else points2.shape[1] # Taille des temporaires par element.
+    block = max(1, block_bytes // (points2.dtype.itemsize*dim*max(1, len(points2))))
+    for start in range(0, len(points1), block):
+        part = points1[start:start+block]
+        if space == "cosine":
+            dist = np.degrees(np.arccos(np.clip(part @ points2.transpose(), -1, 1)))
+        elif space == "axis":
+            pi = points2.dtype.type(np.pi)
+            angle = pi - np.abs(np.abs(points2[:, 0]-part[:, :1]) - pi)
+            if weight == 0:
+                dist = np.abs(points2[:, 1]-part[:, 1:])
+            elif weight == 1:
+                dist = angle
+            else:
+                dist = np.sqrt(weight**2*angle**2 + (1-weight)**2*(points2[:, 1]-part[:, 1:])**2)
+        else:
+            diff = part[:, np.newaxis, :] - points2[np.newaxis, :, :]
+            dist = np.sqrt((diff*diff).sum(axis=-1))
+        yield start, dist
+
+def _top_k(distances, k):
+    """
+    ** Les ``k`` plus petites distances de chaque ligne, triees, et leurs colonnes. **
+    """
+    if k < distances.shape[1]:
+        part = np.argpartition(distances, k-1, axis=1)[:, :k]
+    else:
+        part = np.broadcast_to(np.arange(distances.shape[1]), distances.shape)
+    part_dist = np.take_along_axis(distances, part, axis=1)
+    order = np.argsort(part_dist, axis=1, kind="stable")
+    return np.take_along_axis(part_dist, order, axis=1), np.take_along_axis(part, order, axis=1)
+
+def pairwise_distances(coords1, coords2=None, *, space="camera", dtype=np.float64,
+    k=None, radius=None, weight=.5):
+    r"""
+    ** Distances entre 2 familles de points ou d'axes, calculees par blocs. **
+
+    Parameters
+    ----------
+    coords1 : np.ndarray
+        Les coordonnees de la premiere famille, de shape (2, n).
+    coords2 : np.ndarray, optional
+        Les coordonnees de la seconde famille, de shape (2, m).
+        Par defaut, c'est la premiere famille.
+    space : str
+        * "camera" => Distance euclidienne (en pixel) dans le plan de la camera.
+        * "gnomonic" => Distance euclidienne (en mm) dans le plan gnomonic.
+        * "cosine" => Angle (en degre) entre les vecteurs ``uq``, les
+        coordonnees sont les angles theta et chi en degre.
+        * "axis" => Distance entre des axes de zone, les coordonnees sont
+        les angles et les distances ``(phi, mu)``, voir ``laue.zone_axis.distance``.
+    dtype : type, optional
+        La representation des nombres pendant les calculs, et des distances renvoyees.
+    k : int, optional
+        Si il est fourni, seules les ``k`` plus proches distances de chaque
+        element de ``coords1`` sont renvoyees.
+    radius : float, optional
+        Si il est fourni, seules les distances inferieures ou egales a ``radius`` sont renvoyees.
+    weight : float, optional
+        L'importance de l'angle pour l'espace "axis", voir ``laue.zone_axis.distance``.
+
+    Returns
+    -------
+    distances : np.ndarray, list
+        * Sans ``k`` ni ``radius``, la matrice complete de shape (n, m).
+        * Avec ``k``, les distances croissantes de shape (n, k), completees par inf.
+        * Avec ``radius`` seulement, pour chaque element de ``coords1``,
+        le vecteur de ses distances croissantes.
+    indices : np.ndarray, list
+        Renvoye seulement si ``k`` ou ``radius`` est fourni, les rangs
+        dans ``coords2`` associes aux distances. Ils sont completes par ``m``.
+
+    Notes
+    -----
+    Les lignes sont traitees par blocs de ``BLOCK_BYTES`` octets au plus.
+    Avec ``k`` ou ``radius``, la memoire reste donc bornee quel que soit ``n``.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from laue.core.neighbors import pairwise_distances
+    >>> points = np.array([[0.0, 1.0, 5.0, 9.0], [0.0, 0.0, 5.0, 9.0]])
+    >>> pairwise_distances(points[:, :2], points).round(2)
+    array([[ 0.  ,  1.  ,  7.07, 12.73],
+           [ 1.  ,  0.  ,  6.4 , 12.04]])
+    >>> dist, ind = pairwise_distances(points, k=2, dtype=np.float32)
+    >>> ind.tolist(), dist.dtype
+    ([[0, 1], [1, 0], [2, 3], [3, 2]], dtype('float32'))
+    >>> dist, ind = pairwise_distances(points, radius=1.5)
+    >>> [rows.tolist() for rows in ind]
+    [[0, 1], [1, 0], [2], [3]]
+    >>>
+    >>> thetachi = np.array([[30.0, 30.0, 60.0], [0.0, 10.0, 0.0]])
+    >>> pairwise_distances(thetachi[:, :1], thetachi, space="cosine").round(3)
+    array([[ 0.   ,  8.658, 30.   ]])
+    >>> axes = np.array([[0.0, np.pi/2], [0.1, 0.1]])
+    >>> pairwise_distances(axes, space="axis", weight=1.0).round(4)
+    array([[0.    , 1.5708],
+           [1.5708, 0.    ]])
+    >>>
+    """
+    assert space in {"camera", "gnomonic", "cosine", "axis"}, f"'space' can not be {repr(space)}."
+    assert np.issubdtype(dtype, np.floating), f"'dtype' doit etre un type flottant, pas {dtype}."
+    assert k is None or isinstance(k, numbers.Integral), f"'k' has to be int, not {type(k).__name__}."
+    assert k is None or k >= 1, f"'k' has to be positive, not {k}."
+    assert radius is None or isinstance(radius, numbers.Number), \
+        f"'radius' has to be a number, not {type(radius).__name__}."
+    assert isinstance(weight, numbers.Number), f"'weight' has to be a number not a {type(weight).__name__}."
+    assert 0 <= weight <= 1, f"'weight' must be in [0, 1], not {weight}."
+
+    points1 = _as_points(coords1, space, dtype)
+    points2 = points1 if coords2 is None else _as_points(coords2, space, dtype)
+    nbr1, nbr2 = len(points1), len(points2)
+    blocks = _distance_blocks(points1, points2, space, weight=weight)
+
+    # Matrice complete.
+    if k is None and radius is None:
+        distances = np.empty((nbr1, nbr2), dtype=dtype)
+        for start, block in blocks:
+            distances[start:start+len(block)] = block
+        return distances
+
+    # Voisins dans une boule.
+    if k is None:
+        distances, indices = [], []
+        for _, block in blocks:
+            rows, cols = np.nonzero(block <= radius)
+            dist = block[rows, cols]
+            order = np.lexsort((dist, rows)) # Par ligne puis par distance croissante.
+            splits = np.searchsorted(rows[order], np.arange(1, len(block)))
+            distances.extend(np.split(dist[order], splits))
+            indices.extend(np.split(cols[order], splits))
+        return distances, indices
+
+    # Les k plus proches voisins, eventuellement dans une boule.
+    distances = np.full((nbr1, k), np.inf, dtype=dtype)
+    indices = np.full((nbr1, k), nbr2, dtype=np.int64)
+    nbr = min(k, nbr2)
+    if not nbr:
+        return distances, indices
+    for start, block in blocks:
+        dist, ind = _top_k(block, nbr)
+        if radius is not None:
+            outside = ~(dist <= radius)
+            dist[outside], ind[outside] = np.inf, nbr2
+        distances[start:start+len(block), :nbr] = dist
+        indices[start:start+len(block), :nbr] = ind
+    return distances, indices
+
+class SpatialIndex:
+    """
+    ** Index des plus proches voisins d'un nuage de points 2d. **
+
+    Notes
+    -----
+    * Avec la metrique "euclidian", les points sont des coordonnees
+    cartesiennes, par exemple en pxl dans le plan de la camera ou
+    en mm dans le plan gnomonic.
+    * Avec la metrique "cosine", les points sont les angles theta, chi
+    en degres, les distances sont les angles entre les vecteurs ``uq``
+    en degres. Les vecteurs unitaires sont indexes en 3d, la corde etant
+    une fonction croissante de l'angle.
+    * Les points dont une coordonnee n'est pas finie ne sont pas indexes.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from laue.core.neighbors import SpatialIndex
+    >>> x, y = np.array([[0.0, 1.0, 5.0, 9.0], [0.0, 0.0, 5.0, 9.0]])
+    >>> index = SpatialIndex(x, y)
+    >>> dist, ind = index.knn([(0.2, 0.0), (8.0, 8.0)], k=2)
+    >>> ind.tolist()
+    [[0, 1], [3, 2]]
+    >>> np.round(dist, 2).tolist()
+    [[0.2, 0.8], [1.41, 4.24]]
+    >>> [rows.tolist() for rows in index.radius([(0.0, 0.0), (20.0, 0.0)], 1.5)]
+    [[0, 1], []]
+    >>>
+    >>> index = SpatialIndex(np.array([30.0, 30.0, 60.0]), np.array([0.0, 10.0, 0.0]), metric="cosine")
+    >>> dist, ind = index.knn([(30.0, 0.0)], k=3)
+    >>> ind.tolist(), np.round(dist, 3).tolist()
+    ([[0, 1, 2]], [[0.0, 8.658, 30.0]])
+    >>>
+    """
+    def __init__(self, x, y, *, metric="euclidian"):
+        """
+        Parameters
+        ----------
+        x, y : np.ndarray
+            Les 2 coordonnees des points a indexer, de meme shape (n,).
+        metric : str, optional
+            "euclidian" ou "cosine".
+        """
+        assert metric in {"euclidian", "cosine"}, \
+            f"'metric' must be 'euclidian' or 'cosine', not {metric!r}."
+        x, y = np.asarray(x, dtype=np.float64).ravel(), np.asarray(y, dtype=np.float64).ravel()
+        assert x.shape == y.shape, f"'x' et 'y' doivent avoir la meme taille: {x.shape} vs {y.shape}."
+
+        self.metric = metric
+        self._nbr = len(x) # Le nombre total de points, indexes ou non.
+        points = self._embed(np.stack([x, y], axis=1))
+        self._rows = np.flatnonzero(np.isfinite(points).all(axis=1)) # Les rangs des points indexes.
+        self._points = points[self._rows]
+        try:
+            from scipy.spatial import cKDTree
+        except ImportError:
+            self._tree = None # Recherche exhaustive.
+        else:
+            self._tree = cKDTree(self._points) if len(self._points) else None
+
+    def _embed(self, points):
+        """
+        ** Plonge les points dans l'espace euclidien de l'index. **
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        if self.metric == "cosine":
+            return _thetachi_to_uq(points[:, 0], points[:, 1])
+        return points
+
+    def _to_metric(self, chords):
+        """
+        ** Convertit les distances dans l'index en distances de la metrique. **
+        """
+        if self.metric == "cosine":
+            return np.degrees(2*np.arcsin(np.clip(chords/2, 0.0, 1.0)))
+        return chords
+
+    def _to_chord(self, distance):
+        """
+        ** Convertit une distance de la metrique en distance dans l'index. **
+        """
+        if self.metric == "cosine":
+            return 2*np.sin(np.radians(min(float(distance), 180.0))/2)
+        return float(distance)
+
+    def knn(self, points, k=1):
+        """
+        ** Les ``k`` plus proches voisins de chaque point. **
+
+        Parameters
+        ----------
+        points : array_like
+            Les points de requete, de shape (m, 2), dans le meme repere que l'index.
+        k : int, optional
+            Le nombre de voisins par point.
+
+        Returns
+        -------
+        distances : np.ndarray
+            Les distances croissantes, de shape (m, k). inf si il manque des voisins.
+        indices : np.ndarray
+            Les rangs des voisins, de shape (m, k). Le nombre de points si il en manque.
+        """
+        assert isinstance(k, numbers.Integral), f"'k' has to be int, not {type(k).__name__}."
+        assert k >= 1, f"'k' has to be positive, not {k}."
+        queries = self._embed(points)
+        distances = np.full((len(queries), k), np.inf)
+        indices = np.full((len(queries), k), self._nbr, dtype=np.int64)
+        nbr = min(k, len(self._points))
+        if not nbr or not len(queries):
+            return distances, indices
+
+        if self._tree is not None:
+            dist, ind = self._tree.query(queries, k=nbr)
+            dist, ind = dist.reshape(len(queries), nbr), ind.reshape(len(queries), nbr)
+        else:
+            dist = np.empty((len(queries), nbr))
+            ind = np.empty((len(queries), nbr), dtype=np.int64)
+            for start, block in _distance_blocks(queries, self._points, "camera"):
+                dist[start:start+len(block)], ind[start:start+len(block)] = _top_k(block, nbr)
+
+        distances[:, :nbr] = self._to_metric(dist)
+        indices[:, :nbr] = self._rows[ind]
+        return distances, indices
+
+    def radius(self, points, distance, *, return_distances=False):
+        """
+        ** Les voisins a moins de ``distance`` de chaque point. **
+
+        Parameters
+        ----------
+        points : array_like
+            Les points de requete, de shape (m, 2), dans le meme repere que l'index.
+        distance : float
+            La distance maximale, incluse, dans l'unite de la metrique.
+        return_distances : boolean, optional
+            Si True, renvoie aussi les distances.
+
+        Returns
+        -------
+        list
+            Pour chaque point, les rangs de ses voisins du plus proche au plus lointain.
+            Et pour chaque point les distances associees si ``return_distances`` est True.
+        """
+        assert isinstance(distance, numbers.Number), \
+            f"'distance' has to be a number, not {type(distance).__name__}."
+        queries = self._embed(points)
+        chord = self._to_chord(distance)
+        if not len(self._points):
+            empty = [np.empty(0, dtype=np.int64) for _ in range(len(queries))]
+            return (empty, [np.empty(0) for _ in empty]) if return_distances else empty
+
+        candidates = []
+        if self._tree is not None:
+            for query, rows in zip(queries, self._tree.query_ball_point(queries, chord)):
+                rows = np.asarray(rows, dtype=np.int64)
+                diff = self._points[rows] - query
+                candidates.append((rows, np.sqrt((diff*diff).sum(axis=1))))
+        else:
+            for _, block in _distance_blocks(queries, self._points, "camera"):
+                for dist in block:
+                    rows = np.flatnonzero(dist <= chord)
+                    candidates.append((rows, dist[rows]))
+
+        indices, distances = [], []
+        for rows, dist in candidates:
+            order = np.argsort(dist, kind="stable")
+            indices.append(self._rows[rows[order]])
+            distances.append(self._to_metric(dist[order]))
+        if return_distances:
+            return indices, distances
+        return indices
+
+    def __len__(self):
+        """
+        ** Le nombre de points indexes. **
+        """
+        return len(self._points)
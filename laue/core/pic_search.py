@@ -105,4 +105,45 @@ def atomic_pic_search(image, kernel_font, kernel_dilate, threshold):
     return spots_args
 
 def _pickelable_pic_search(args):
-    return atomic_pic_search(*args[0]), args[1]
+    (image, *params), infos = args
+    if image is None: # Le diagramme est deja extrait.
+        return None, infos
+    if isinstance(image, tuple): # L'image est lue et verifiee par le processus qui la traite.
+        from laue.utilities.image import check_image, read_image
+        image_path, shape, ignore_errors = image
+        image = read_image(image_path, ignore_errors=ignore_errors)
+        if image is None: # L'image est ignoree, son chemin est rendu pour 'Experiment._image_skipped'.
+            return None, (None, image_path)
+        try:
+            check_image(image, image_path, shape)
+        except (TypeError, ValueError) as err: # L'erreur est levee par le processus principal.
+            return err, infos
+    from laue.diagram import _detected_spots # Les spots sont materialises ici, dans le processus de calcul.
+    return _detected_spots(atomic_pic_search(image, *params)), infos
+
+def _degrade_pic_search(args, attempt):
+    """
+    ** Help for ``Experiment.get_diagrams``. **
+
+    Arguments d'une nouvelle tentative: le seuil est rehausse
+    pour capturer moins de taches.
+    """
+    (image, kernel_font, kernel_dilate, threshold), infos = args
+    return (image, kernel_font, kernel_dilate, min(80.0, threshold*1.5**attempt)), infos
+
+def _recover_pic_search(args, result):
+    """
+    ** Help for ``Experiment.get_diagrams``. **
+
+    Resultat d'une tentative degradee: les spots sont gardes tels quels,
+    le diagramme n'a pas d'autres parametres sous lesquels les ranger.
+    """
+    return result
+
+def _fail_pic_search(args):
+    """
+    ** Help for ``Experiment.get_diagrams``. **
+
+    Resultat d'une image dont le pic search a echoue: aucune tache.
+    """
+    return [], args[1]
@@ -20,6 +20,8 @@ Pour separer les grains d'un diagramme, les etapes sont les suivantes:
 
 import math
 
+import numpy as np
+
 
 class Splitable:
     """
@@ -117,6 +119,7 @@ class Splitable:
             f"Or elle vaut {distance_max}, ce qui sort de cet intervalle.")
 
 
+        self._check("subsets")
         if _get_args: # Si il faut seulement preparer le travail.
             if (angle_max, spots_max, distance_max) in self._subsets:
                 return None, None, angle_max, spots_max, distance_max
@@ -137,6 +140,7 @@ class Splitable:
 
         # Creation des sous ensembles.
         subsets = [{self[spot_id] for spot_id in subset} for subset in _atomic_subsets_res]
+        self._subsets[(angle_max, spots_max, distance_max)] = subsets
         return subsets
 
 def _get_spots_axes(diag):
@@ -144,20 +148,25 @@ def _get_spots_axes(diag):
     Recupere et met en forme les spots et les axes.
     Retourne 'spots' et 'axes' compatible avec ``find_subset``.
     """
+    gnomonics = diag.get_gnomonic_positions() # Un seul appel pour tous les spots.
+    zone_axes = diag.find_zone_axes()
+    incidence = diag._get_incidence(zone_axes)
+    qualities = incidence.qualities(diag.experiment.transformer, gnomonics).tolist()
+    gnomonics = gnomonics.transpose().tolist()
     spots = {
         i: {
-            "gnom": spot.get_gnomonic(),
-            "axes": {axis.get_id() for axis in spot.find_zone_axes()}
+            "gnom": tuple(gnomonics[i]),
+            "axes": set(incidence.get_axes(i).tolist())
         }
-        for i, spot in enumerate(diag)
+        for i in range(len(diag))
     }
     axes = {
-        axes.get_id(): {
-            "polar": axes.get_polar_coords(),
-            "quality": axes.get_quality(),
-            "spots": {spot.get_id() for spot in axes}
+        axis.get_id(): {
+            "polar": axis.get_polar_coords(),
+            "quality": qualities[row],
+            "spots": set(incidence.get_spots(row).tolist())
         }
-        for axes in diag.find_zone_axes()
+        for row, axis in enumerate(zone_axes)
     }
     return spots, axes
 
@@ -287,9 +296,15 @@ def atomic_find_subsets(spots_dict, axes_dict, angle_max, spots_max, distance_ma
     [{9, 10, 22}]
     >>>
     """
-    from laue.zone_axis import distance as distance_axis
-    from laue.spot import distance as distance_pic
     import networkx
+    from laue.core.neighbors import pairwise_distances
+
+    def distance_axis(axes1, axes2):
+        """
+        Ecarts angulaires entre 2 listes d'axes ``(phi, mu)``.
+        """
+        return pairwise_distances(np.array(axes1, dtype=np.float32).transpose(),
+            np.array(axes2, dtype=np.float32).transpose(), space="axis", weight=1.0, dtype=np.float32)
 
     def count_variant_axis(spot_id):
         """
@@ -300,7 +315,7 @@ def atomic_find_subsets(spots_dict, axes_dict, angle_max, spots_max, distance_ma
         if len(axes_id) <= 1:
             return len(axes_id)
         axes = [axes_dict[axis_id]["polar"] for axis_id in axes_id]
-        nbr_near = (distance_axis(axes, axes, weight=1) < angle_max).sum()
+        nbr_near = (distance_axis(axes, axes) < angle_max).sum()
         nbr = len(axes) - (nbr_near-len(axes))//2
         return nbr
 
@@ -326,17 +341,16 @@ def atomic_find_subsets(spots_dict, axes_dict, angle_max, spots_max, distance_ma
     graph.add_nodes_from(spots_at_cross)
 
     # Ajout grossier de certaine aretes.
+    too_close = pairwise_distances( # Toutes les distances d'un coup.
+        np.array([spots_dict[spot_id]["gnom"] for spot_id in spots_at_cross]).reshape(-1, 2).transpose(),
+        space="gnomonic") < distance_max
     excluded = [] # La liste des noeuds appartenant a des grains differents.
     candidate_axes = set() # L'ensemble des axes de zone consideres.
     for i, spot1 in enumerate(spots_at_cross[:-1]): # On faite toutes les combinaisons
-        for spot2 in spots_at_cross[i+1:]: # de 2 sommets possibles.
+        for j, spot2 in enumerate(spots_at_cross[i+1:], start=i+1): # de 2 sommets possibles.
 
             ## Exclusion des spots trop proches.
-            if distance_pic(
-                    spots_dict[spot1]["gnom"],
-                    spots_dict[spot2]["gnom"],
-                    space="gnomonic"
-                    ) < distance_max:
+            if too_close[i, j]:
                 excluded.append((spot1, spot2))
                 continue
 
@@ -349,8 +363,8 @@ def atomic_find_subsets(spots_dict, axes_dict, angle_max, spots_max, distance_ma
             axes1, axes2 = spots_dict[spot1]["axes"]-common_axes, spots_dict[spot2]["axes"]-common_axes
             if axes1 and axes2 and distance_axis(
                     [axes_dict[axis_id]["polar"] for axis_id in axes1],
-                    [axes_dict[axis_id]["polar"] for axis_id in axes2],
-                    weight=1).min() < angle_max: # tolerance angulaire de pi/32
+                    [axes_dict[axis_id]["polar"] for axis_id in axes2]
+                    ).min() < angle_max: # tolerance angulaire de pi/32
                 excluded.append((spot1, spot2))
                 continue
 
@@ -387,3 +401,31 @@ def _jump_find_subsets(args):
     if spots_dict is None: # Si il ne faut pas refaire les calculs
         return {"angle_max": angle_max, "spots_max": spots_max, "distance_max": distance_max}
     return atomic_find_subsets(spots_dict, axes_dict, angle_max, spots_max, distance_max)
+
+def _degrade_find_subsets(args, attempt):
+    """
+    ** Help for ``Experiment.find_subsets``. **
+
+    Arguments d'une nouvelle tentative: moins de spots sont consideres.
+    """
+    spots_dict, axes_dict, angle_max, spots_max, distance_max = args
+    return spots_dict, axes_dict, angle_max, max(2, spots_max // 2**attempt), distance_max
+
+def _recover_find_subsets(args, result):
+    """
+    ** Help for ``Experiment.find_subsets``. **
+
+    Resultat d'une tentative degradee: les grains sont ranges sous les
+    parametres degrades, avec lesquels ils ont ete calcules.
+    """
+    _, _, angle_max, spots_max, distance_max = args
+    return {"angle_max": angle_max, "spots_max": spots_max, "distance_max": distance_max,
+            "_atomic_subsets_res": result}
+
+def _fail_find_subsets(args):
+    """
+    ** Help for ``Experiment.find_subsets``. **
+
+    Resultat d'un diagramme dont la separation a echoue: aucun grain.
+    """
+    return []
@@ -10,7 +10,9 @@ try:
     import numexpr
 except ImportError:
     numexpr = None
-import psutil
+
+
+BLOCK_BYTES = 32*2**20 # Taille maximale d'un bloc de matrice de distances en octets.
 
 
 def atomic_find_zone_axes(transformer, gnomonics, dmax, nbr, tol):
@@ -160,21 +162,19 @@ def atomic_find_zone_axes(transformer, gnomonics, dmax, nbr, tol):
     ## Recuperation des points aux intersections.
     
     ### Calcul des points les plus proche pour chaque intersections.
-    used_memory = len(x_inters)*len(xg_spots)*8 # Taille de la matrice de distance en octet.
-    if psutil is not None and psutil.virtual_memory().available > 2*used_memory:
-        xg_spots_mesh, x_inters_mesh = np.meshgrid(xg_spots, x_inters, copy=False)
-        yg_spots_mesh, y_inters_mesh = np.meshgrid(yg_spots, y_inters, copy=False)
+    ### La matrice des distances est calculee par blocs de lignes pour borner la memoire.
+    nearest_spots = np.empty(len(x_inters), dtype=int)
+    block = max(1, BLOCK_BYTES // (8*max(1, len(xg_spots)))) # Nombre d'intersections par bloc.
+    for start in range(0, len(x_inters), block):
+        x_inters_col = x_inters[start:start+block, np.newaxis]
+        y_inters_col = y_inters[start:start+block, np.newaxis]
         if numexpr is not None: # d[inter, gnomo]
             distances = numexpr.evaluate(
-                "sqrt((xg_spots_mesh-x_inters_mesh)**2 + (yg_spots_mesh-y_inters_mesh)**2)")
+                "(xg_spots-x_inters_col)**2 + (yg_spots-y_inters_col)**2")
         else:
-            distances = np.sqrt((xg_spots_mesh-x_inters_mesh)**2 + (yg_spots_mesh-y_inters_mesh)**2)
-        nearest_spots = np.argmin(distances, axis=1) # Pour chaque intersections, son spot le plus proche.
-        del distances, xg_spots_mesh, x_inters_mesh, yg_spots_mesh, y_inters_mesh
-    else: # Si il n'y a pas suffisement de RAM.
-        nearest_spots = np.array([ # attention 'numexpr' est 7 fois plus lent.
-            np.argmin(np.sqrt((xg_spots-x_inter)**2 + (yg_spots-y_inter)**2))
-            for x_inter, y_inter in zip(x_inters, y_inters)], dtype=int)
+            distances = (xg_spots-x_inters_col)**2 + (yg_spots-y_inters_col)**2
+        nearest_spots[start:start+block] = np.argmin(distances, axis=1) # Pour chaque intersections, son spot le plus proche.
+    del distances
 
     ### Selection des bons candidats.
     spots_left = [] # Les spots non references.
@@ -195,25 +195,17 @@ def atomic_find_zone_axes(transformer, gnomonics, dmax, nbr, tol):
 
     ## Recuperation des points colles a un seul axe.
     spots_left = np.array(spots_left, dtype=int) # Les indices des spots restants.
-
-    used_memory = len(spots_left)*len(angles)*8 # Taille memoire de la matrice de distances.
-    if psutil is not None and psutil.virtual_memory().available > 2*used_memory:
+    block = max(1, BLOCK_BYTES // (8*len(angles))) # Nombre de spots par bloc.
+    for start in range(0, len(spots_left), block):
+        spots_block = spots_left[start:start+block]
         distances = transformer.dist_line( # d[line, point]
-            angles, dists, xg_spots[spots_left], yg_spots[spots_left])
+            angles, dists, xg_spots[spots_block], yg_spots[spots_block])
         axis_ind = np.argmin(distances, axis=0) # A chaque points, indice de la droite la plus proche.
         close_spots = distances.min(axis=0) < dmax # La matrice des points suffisement proches.
         del distances
-        for axis_ind, spot_left in zip(axis_ind[close_spots], spots_left[close_spots]):
+        for axis_ind, spot_left in zip(axis_ind[close_spots], spots_block[close_spots]):
             axes_spots_ind[axis_ind].add(spot_left)
-            spots_axes_ind[spot_left].add(axis_ind)   
-    else: # Si il n'y a pas suffisement de RAM.
-        for spot_left, xg_pic, yg_pic in zip(spots_left, xg_spots[spots_left], yg_spots[spots_left]):
-            xg_pic, yg_pic = np.array([xg_pic], dtype=np.float32), np.array([yg_pic], dtype=np.float32)
-            distances = transformer.dist_line(angles, dists, xg_pic, yg_pic) # d[line, point]
-            axis_ind = np.argmin(distances[:, 0])
-            if distances[axis_ind] < dmax:
-                axes_spots_ind[axis_ind].add(spot_left)
-                spots_axes_ind[spot_left].add(axis_ind)
+            spots_axes_ind[spot_left].add(axis_ind)
 
     # Suppression des axes qui contiennent pas suffisement de points.
     mask_axes_to_keep = np.array([len(spots_ind) for spots_ind in axes_spots_ind]) >= nbr
@@ -245,3 +237,32 @@ def _jump_find_zone_axes(args):
     if transformer is None: # Si il ne faut pas refaire les calculs
         return {"dmax": dmax, "nbr": nbr, "tol": tol}
     return atomic_find_zone_axes(transformer, gnomonics, dmax, nbr, tol)
+
+def _degrade_find_zone_axes(args, attempt):
+    """
+    ** Help for ``Experiment.find_zone_axes``. **
+
+    Arguments d'une nouvelle tentative: la tolerance est reduite
+    et il faut plus de points par axe, ce qui allege le clustering.
+    """
+    transformer, gnomonics, dmax, nbr, tol = args
+    return transformer, gnomonics, dmax, nbr + 2*attempt, tol / 2**attempt
+
+def _recover_find_zone_axes(args, result):
+    """
+    ** Help for ``Experiment.find_zone_axes``. **
+
+    Resultat d'une tentative degradee: les axes sont ranges sous les
+    parametres degrades, avec lesquels ils ont ete calcules.
+    """
+    _, _, dmax, nbr, tol = args
+    return {"dmax": dmax, "nbr": nbr, "tol": tol, "_axes_args": result}
+
+def _fail_find_zone_axes(args):
+    """
+    ** Help for ``Experiment.find_zone_axes``. **
+
+    Resultat d'un diagramme dont la recherche a echoue: aucun axe.
+    """
+    _, gnomonics, *_ = args
+    return (), (), (), ((),)*gnomonics.shape[-1]
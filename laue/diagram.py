@@ -3,10 +3,6 @@
 """
 ** Permet de manipuler un diagramme de Laue unique. **
 -----------------------------------------------------
-
-Notes
------
-Si le module ``psutil`` est installe, la memoire sera mieux geree.
 """
 
 import hashlib
@@ -16,10 +12,6 @@ import os
 
 import cv2
 import numpy as np
-try:
-    import psutil # Pour acceder a la memoire disponible.
-except ImportError:
-    psutil = None
 
 from laue.spot import Spot
 from laue.core.subsets import Splitable
@@ -32,9 +24,130 @@ __pdoc__ = {"LaueDiagram.__contains__": True,
             "LaueDiagram.__len__": True}
 
 
+def _format_table(names, columns):
+    """
+    ** Met en forme des colonnes de 20 caracteres, d'un seul coup. **
+
+    Parameters
+    ----------
+    names : tuple
+        Les titres des colonnes.
+    columns : iterable
+        Les colonnes de meme longueur, de type ``np.ndarray``.
+
+    Returns
+    -------
+    str
+        Le texte des fichiers ``.dat`` et ``.cor``, titres compris.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from laue.diagram import _format_table
+    >>> print(_format_table(("a", "b"), (np.array([1.5, 2.0]), np.array([3, 4]))), end="")
+    a                    b                   
+    1.5                  3                   
+    2.0                  4                   
+    >>>
+    """
+    row = " ".join(("{:<20}",)*len(names)) + "\n"
+    rows = list(zip(*(np.asarray(column).tolist() for column in columns))) # Les types natifs sont plus rapides.
+    return row.format(*names) + (row*len(rows)).format(*(value for line in rows for value in line))
+
+
+def _pack_images(images):
+    """
+    ** Met les images des spots bout a bout dans une seule arene. **
+
+    Parameters
+    ----------
+    images : iterable
+        Les images 2d des spots, None pour un spot dont l'image est inconnue.
+
+    Returns
+    -------
+    pixels : np.ndarray
+        Les pixels de toutes les images, a plat et dans l'ordre des spots.
+    has_image : np.ndarray
+        Pour chaque spot, True si son image est dans l'arene.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from laue.diagram import _pack_images
+    >>> pixels, has_image = _pack_images([np.ones((2, 3), dtype=np.uint16), None])
+    >>> pixels.shape, pixels.dtype, has_image.tolist()
+    ((6,), dtype('uint16'), [True, False])
+    >>>
+    """
+    images = list(images)
+    has_image = np.array([image is not None for image in images], dtype=bool)
+    images = [np.ravel(image) for image in images if image is not None]
+    pixels = np.concatenate(images) if images else np.empty(0, dtype=np.uint16) # Copie, libere l'image mere.
+    return pixels, has_image
+
+def _centroids(bbox, pixels, starts, intensities):
+    """
+    ** Les baricentres de plusieurs spots, en une seule passe sur l'arene. **
+
+    Parameters
+    ----------
+    bbox : np.ndarray
+        Les boites (x, y, w, h) des spots, de shape (n, 4).
+    pixels : np.ndarray
+        L'arene qui contient les images des spots, voir ``_pack_images``.
+    starts : np.ndarray
+        Le debut de l'image de chaque spot dans l'arene.
+    intensities : np.ndarray
+        La somme des pixels de chaque spot.
+
+    Returns
+    -------
+    np.ndarray
+        Les coordonnees x, y des baricentres en pxl, de shape (n, 2).
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from laue.diagram import _centroids
+    >>> pixels = np.array([1, 1, 0, 0, 2, 2], dtype=np.uint16) # Un spot 3x2 en (10, 20).
+    >>> _centroids(np.array([[10, 20, 3, 2]]), pixels, np.array([0]), np.array([6]))
+    array([[11.16666667, 20.66666667]])
+    >>>
+    """
+    bbox = np.asarray(bbox, dtype=np.int64).reshape(-1, 4)
+    sizes = bbox[:, 2] * bbox[:, 3]
+    owner = np.repeat(np.arange(len(bbox)), sizes) # Le spot de chaque pixel.
+    local = np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes)-sizes, sizes) # Rang dans l'image.
+    weights = pixels[np.repeat(np.asarray(starts, dtype=np.int64), sizes) + local].astype(np.float64)
+    width = bbox[owner, 2]
+    sum_x = np.bincount(owner, weights*(bbox[owner, 0] + local%width), minlength=len(bbox))
+    sum_y = np.bincount(owner, weights*(bbox[owner, 1] + local//width), minlength=len(bbox))
+    return np.stack([sum_x, sum_y], axis=1) / np.asarray(intensities, dtype=np.float64).reshape(-1, 1)
+
+def _spot_qualities(intensities, distortions):
+    """
+    ** La qualite de chaque spot, voir ``laue.spot.Spot.get_quality``. **
+    """
+    cout_ref = 100_000
+    val_cout_ref = 0.95
+    distortion_weight = 0.667
+
+    a = -math.log(1-val_cout_ref) / cout_ref
+    return ((1-distortion_weight)
+          * (1 - np.exp(-a*np.asarray(intensities, dtype=np.float64)))
+          + distortion_weight*distortions)
+
+
 class LaueDiagram(Splitable, DiagramPickleable):
     """
     Represente un diagramme de Laue associe a une seule image.
+
+    Notes
+    -----
+    Les grandeurs des spots sont rangees dans des tableaux paralleles, une
+    ligne par spot. Les instances de ``laue.spot.Spot`` ne sont que des vues
+    sur ces lignes, elles sont creees a la demande.
     """
     def __init__(self, name, experiment):
         """
@@ -56,29 +169,188 @@ class LaueDiagram(Splitable, DiagramPickleable):
         """
         self._name = name
         self.experiment = experiment # C'est l'experience qui contient ce diagramme.
-        self._spots = [] # La liste des spots en vrac. Ils doivent etres remplis par ailleur.
+
+        # Les spots, une ligne par spot. Ils doivent etres remplis par ailleur.
+        self._bbox = np.empty((0, 4), dtype=np.int32) # Les boites x, y, w, h.
+        self._distortions = np.empty(0, dtype=np.float64) # Les facteurs de diformite.
+        self._intensities = np.empty(0, dtype=np.int64) # Les sommes des pixels.
+        self._qualities = np.empty(0, dtype=np.float64) # La beautee des points.
+        self._has_image = np.empty(0, dtype=bool) # Vrai si l'image du spot est dans l'arene.
+        self._pixels = np.empty(0, dtype=np.uint16) # L'arene, les images des spots bout a bout.
+        self._pixel_offsets = np.zeros(1, dtype=np.int64) # Le debut de chaque image dans l'arene.
 
         # Declaration des variables futur.
         self._quality = None # Facteur qui dit a quel point ce diagramme est joli a l'oeil.
         self._image_xy = None # L'image brute avec le fond et tout.
-        self._image_gnom = None # Image projete dans le plan gnomonic.
-        self._sorted_spots = {} # Les listes des spots tries selon un ordre particulier.
+        self._positions = np.empty((0, 2), dtype=np.float64) # Les baricentres, NaN si inconnus.
+        self._gnomonics = None # Les coordonnees x, y dans le plan gnomonic, NaN si inconnues.
+        self._thetachis = None # Les angles des rayons diffractes, NaN si inconnus.
+        self._sorted_spots = {} # Les rangs des spots tries selon un ordre particulier.
+        self._indexes = {} # Les index des plus proches voisins, dans chaque espace.
         self._axes = {} # Les axes de zones.
+        self._incidences = {} # Les matrices d'incidence axes x spots, memes clefs que les axes.
         self._subsets = {} # Les sous ensembles.
-        self._spots_set = None # L'ensemble des spots pour une recherche plus rapide.
         self._hkl = {} # Les prediction des indices hkl
+        self._tokens = {} # A chaque etape, la signature des parametres de ses resultats en cache.
 
-    def _set_spots(self, spots):
+    def _set_spots(self, bbox, distortions, pixels, has_image, *, intensities=None, positions=None):
         """
         ** Met les spots dans le diagrame. **
 
         Parameters
         ----------
-        spots : list
-            Ensemble des points chauds. Ils doivent heriter de ``laue.spot.Spot``.
-            Pas set car l'ordre doit etre fige.
+        bbox : np.ndarray
+            Les boites (x, y, w, h) des spots, de shape (nbr_spots, 4).
+            L'ordre est fige, c'est celui des rangs des spots.
+        distortions : np.ndarray
+            Le facteur de distortion de chaque spot.
+        pixels : np.ndarray
+            Les images des spots bout a bout, voir ``_pack_images``.
+            Le fond diffus doit etre deja enleve.
+        has_image : np.ndarray
+            Pour chaque spot, True si son image est dans ``pixels``.
+        intensities : np.ndarray, optional
+            Les intensites, obligatoires si des images manquent.
+            Par defaut, elles sont calculees depuis ``pixels``.
+        positions : np.ndarray, optional
+            Les baricentres deja connus, de shape (nbr_spots, 2), NaN si inconnus.
+        """
+        self._bbox = np.asarray(bbox, dtype=np.int32).reshape(-1, 4)
+        nbr = len(self._bbox)
+        self._distortions = np.asarray(distortions, dtype=np.float64).reshape(nbr)
+        self._has_image = np.asarray(has_image, dtype=bool).reshape(nbr)
+        self._pixels = np.asarray(pixels).ravel()
+        self._pixel_offsets = np.zeros(nbr+1, dtype=np.int64)
+        np.cumsum(np.where(self._has_image, self._bbox[:, 2].astype(np.int64)*self._bbox[:, 3], 0),
+                  out=self._pixel_offsets[1:])
+        if intensities is None: # Toutes les sommes d'un coup, par difference des cumuls.
+            sums = np.zeros(len(self._pixels)+1, # Meme type que ``np.sum``.
+                            dtype={"b": np.uint64, "u": np.uint64, "i": np.int64}.get(
+                                self._pixels.dtype.kind, np.float64))
+            np.cumsum(self._pixels, dtype=sums.dtype, out=sums[1:])
+            intensities = sums[self._pixel_offsets[1:]] - sums[self._pixel_offsets[:-1]]
+        self._intensities = np.asarray(intensities).reshape(nbr)
+        self._qualities = _spot_qualities(self._intensities, self._distortions)
+        self._positions = (np.full((nbr, 2), np.nan) if positions is None
+                           else np.array(positions, dtype=np.float64).reshape(nbr, 2))
+        self._gnomonics = self._thetachis = None
+        self._sorted_spots = {}
+        self._indexes = {}
+
+    def _get_spot_image(self, index):
+        """
+        ** L'image d'un spot, une vue sur l'arene, None si elle est inconnue. **
+        """
+        if not self._has_image[index]:
+            return None
+        _, _, w, h = self._bbox[index].tolist()
+        return self._pixels[self._pixel_offsets[index]:self._pixel_offsets[index+1]].reshape(h, w)
+
+    def _get_positions(self, indices):
+        """
+        ** Les baricentres des spots de rangs ``indices``, de shape (2, n). **
+
+        Des qu'il en manque un, tous ceux du diagramme qui ne sont
+        pas encore connus sont calcules d'un coup.
+        """
+        if np.isnan(self._positions[indices, 0]).any():
+            missing = np.flatnonzero(np.isnan(self._positions[:, 0]) & self._has_image)
+            self._positions[missing] = _centroids(
+                self._bbox[missing], self._pixels, self._pixel_offsets[missing], self._intensities[missing])
+        return self._positions[indices].transpose()
+
+    def _get_coords(self, space, indices):
+        """
+        ** Les coordonnees des spots de rangs ``indices``, de shape (2, n). **
+
+        Parameters
+        ----------
+        space : str
+            "gnomonic" pour les coordonnees dans le plan gnomonic,
+            "thetachi" pour les angles des rayons diffractes.
+        indices : np.ndarray
+            Les rangs des spots. Des qu'il en manque un, tous les spots du
+            diagramme dont les coordonnees sont inconnues sont projetes d'un coup.
+        """
+        self._check(space)
+        attr = {"gnomonic": "_gnomonics", "thetachi": "_thetachis"}[space]
+        values = getattr(self, attr)
+        if values is None:
+            missing = np.arange(len(self)) if len(indices) else indices
+        elif np.isnan(values[indices, 0]).any():
+            missing = np.flatnonzero(np.isnan(values[:, 0]))
+        else:
+            missing = indices[:0]
+        if len(missing):
+            transform = (self.experiment.transformer.cam_to_gnomonic if space == "gnomonic"
+                         else self.experiment.transformer.cam_to_thetachi)
+            coords = np.asarray(transform(*self._get_positions(missing), self.experiment.set_calibration(),
+                                          dtype=np.float64)) # Pour ecrire les .cor sans arrondi.
+            if values is None:
+                values = np.full((len(self), 2), np.nan, dtype=np.float64)
+                setattr(self, attr, values)
+            values[missing] = coords.reshape(2, -1).transpose()
+        if values is None: # Si il n'y a aucun spot.
+            return np.empty((2, 0))
+        return values[indices].transpose()
+
+    def materialize(self):
+        """
+        ** Calcule d'un coup les grandeurs derivees de tous les spots. **
+
+        Notes
+        -----
+        * Les intensites et les qualites sont calculees des que les spots sont connus.
+        * Les positions sont calculees en une seule passe sur les pixels de tous les spots.
+        * Si la calibration est connue, les coordonnees gnomoniques puis les
+        angles theta, chi sont obtenus en un seul appel au ``Transformer`` chacun.
+        * Les processus de calcul materialisent les positions juste apres la
+        detection, les diagrammes de ``laue.experiment.base_experiment.Experiment``
+        arrivent donc avec leurs positions deja calculees.
+
+        Returns
+        -------
+        LaueDiagram
+            Le diagramme lui-meme, pour enchainer les appels.
+
+        Examples
+        --------
+        >>> import numpy as np
+        >>> import laue
+        >>> image = np.zeros((64, 64), dtype=np.uint16)
+        >>> image[30:33, 20:23] = 1000
+        >>> parameters = dict(dd=70.0, xcen=32.0, ycen=32.0, xbet=0.0, xgam=0.0, pixelsize=0.08)
+        >>> diag = laue.Experiment([image], **parameters)[0]
+        >>> calibration = diag.experiment.set_calibration()
+        >>> bool(np.isnan(diag.materialize()._gnomonics).any())
+        False
+        >>>
+        """
+        indices = np.arange(len(self))
+        self._get_positions(indices)
+        if self.experiment is not None and self.experiment._calibration_parameters is not None:
+            self._get_coords("gnomonic", indices)
+            self._get_coords("thetachi", indices)
+        return self
+
+    def _select_indices(self, *, n=None, sort=None):
         """
-        self._spots = spots
+        ** Les rangs des spots de ``LaueDiagram.select_spots``. **
+        """
+        if sort is None:
+            indices = np.arange(len(self))
+        elif hasattr(sort, "__call__"):
+            indices = np.array([spot.get_id() for spot in sorted(self, key=sort)], dtype=np.int64)
+        else:
+            if sort not in self._sorted_spots: # On enregistre les rangs pour de melleur
+                values = {"intensity": self._intensities, # perfs aux apels suivants.
+                          "distortion": self._distortions,
+                          "quality": self._qualities}[sort]
+                self._sorted_spots[sort] = np.argsort(-values, kind="stable")
+            indices = self._sorted_spots[sort]
+        if n is not None:
+            return indices[:n]
+        return indices
 
     def _set_image(self, image):
         """
@@ -148,6 +420,7 @@ class LaueDiagram(Splitable, DiagramPickleable):
             f"'dmax' doit etre un flottant, pas un {type(dmax).__name__}."
         assert dmax > 0, f"La distance doit etre strictement positive elle vaut {dmax}."
 
+        self._check("zone_axes")
         if _get_args: # Si il faut seulement preparer le travail.
             if (dmax, nbr, tol) in self._axes:
                 return None, None, dmax, nbr, tol # Pour accelerer les calculs.
@@ -169,17 +442,70 @@ class LaueDiagram(Splitable, DiagramPickleable):
             phi_s, mu_s, axis_spots_ind, spots_axes_ind = _axes_args
 
         # Creation des objets 'ZoneAxis'.
+        from laue.core.incidence import AxesIncidence
         from laue.zone_axis import ZoneAxis
+        incidence = AxesIncidence.from_groups(axis_spots_ind, len(self), phi_s, mu_s)
         self._axes[(dmax, nbr, tol)] = [
             ZoneAxis(diagram=self,
-                     spots_ind=spots_ind,
+                     spots_ind=incidence.get_spots(i).tolist(),
                      identifier=i,
                      phi=phi,
                      mu=mu)
-            for i, (phi, mu, spots_ind) in enumerate(zip(phi_s, mu_s, axis_spots_ind))]
+            for i, (phi, mu) in enumerate(zip(phi_s, mu_s))]
+        self._incidences[(dmax, nbr, tol)] = incidence
+        for axis in self._axes[(dmax, nbr, tol)]:
+            axis._incidence = incidence
 
         return self._axes[(dmax, nbr, tol)]
 
+    def _get_incidence(self, axes):
+        """
+        ** La matrice d'incidence d'une liste d'axes renvoyee par ``find_zone_axes``. **
+
+        Elle est construite si besoin, par exemple quand les axes
+        ont ete relus depuis un fichier, puis gardee avec les axes.
+        """
+        from laue.core.incidence import AxesIncidence
+        key = next((key for key, value in self._axes.items() if value is axes), None)
+        if key is not None and key in self._incidences:
+            return self._incidences[key]
+        incidence = AxesIncidence.from_groups((axis.spots.keys() for axis in axes), len(self),
+            [axis._phi for axis in axes], [axis._mu for axis in axes])
+        if key is not None:
+            self._incidences[key] = incidence
+        for axis in axes:
+            axis._incidence = incidence
+        return incidence
+
+    def get_axes_incidence(self, **kwds):
+        """
+        ** La matrice d'incidence creuse entre les axes de zone et les spots. **
+
+        Parameters
+        ----------
+        **kwds
+            Les parametres de ``LaueDiagram.find_zone_axes``.
+
+        Returns
+        -------
+        laue.core.incidence.AxesIncidence
+            La ligne ``i`` correspond a l'axe ``self.find_zone_axes(**kwds)[i]``,
+            la colonne ``j`` au spot ``self[j]``.
+
+        Examples
+        --------
+        >>> import laue
+        >>> image = "laue/examples/ge_blanc.mccd"
+        >>> diag = laue.experiment.base_experiment.Experiment(image, config_file="laue/examples/ge_blanc.det")[0]
+        >>> incidence = diag.get_axes_incidence()
+        >>> incidence.shape == (len(diag.find_zone_axes()), len(diag))
+        True
+        >>> incidence.spots_per_axis().tolist() == [len(axis) for axis in diag.find_zone_axes()]
+        True
+        >>>
+        """
+        return self._get_incidence(self.find_zone_axes(**kwds))
+
     def get_gnomonic_positions(self, *, n=None, sort=None):
         """
         ** Recupere la position des spots dans le plan gnomonic. **
@@ -213,23 +539,11 @@ class LaueDiagram(Splitable, DiagramPickleable):
         (2, 78)
         >>> np.round(diag.get_gnomonic_positions(n=4, sort="quality"), 2)
         array([[ 0.25,  0.08,  0.27, -0.26],
-               [ 0.32,  0.01, -0.3 , -0.2 ]], dtype=float32)
+               [ 0.32,  0.01, -0.3 , -0.2 ]])
         >>>
         """
         # On calcul les projections pour tous les points a la fois.
-        if self._spots[0]._gnomonic is None:
-            coords_gnomonic = self.experiment.transformer.cam_to_gnomonic(
-                *self.get_positions(n=n, sort=sort),
-                self.experiment.set_calibration())
-            for spot, xg, yg in zip(self, *coords_gnomonic):
-                spot._gnomonic = (xg, yg)
-        # On extrait juste ce qu'il nous interresse.
-        else:
-            coords_gnomonic = np.array(
-                [spot.get_gnomonic() for spot in self.select_spots(n=n, sort=sort)],
-                ).transpose()
-
-        return coords_gnomonic
+        return self._get_coords("gnomonic", self._select_indices(n=n, sort=sort))
 
     def get_id(self):
         """
@@ -286,8 +600,10 @@ class LaueDiagram(Splitable, DiagramPickleable):
                [0, 0, 0, ..., 0, 0, 0]], dtype=uint16)
         >>>
         """
-        if self._image_gnom is not None:
-            return self._image_gnom
+        key = ("image_gnomonic", self.get_id(), self.experiment.stages.token("calibration"))
+        image_gnom = self.experiment.cache.get(key)
+        if image_gnom is not None:
+            return image_gnom
 
         if self.experiment.verbose:
             print(f"Image gnomonic de {self.get_id()}...")
@@ -298,8 +614,7 @@ class LaueDiagram(Splitable, DiagramPickleable):
         image_gnom = cv2.remap(image_xy,
             map_x, map_y, interpolation=cv2.INTER_LINEAR)
 
-        if psutil is not None and psutil.virtual_memory().percent < 75:
-            self._image_gnom = image_gnom
+        self.experiment.cache.put(key, image_gnom)
 
         if self.experiment.verbose:
             print(f"    OK: Image gnomonic caluculee.")
@@ -339,6 +654,10 @@ class LaueDiagram(Splitable, DiagramPickleable):
         """
         if self._image_xy is not None:
             return self._image_xy
+        if self.experiment is not None:
+            image = self.experiment.cache.get(("image_xy", self.get_id()))
+            if image is not None:
+                return image
 
         if not os.path.exists(self.get_id()):
             raise NameError(f"Impossible de trouver le fichier {repr(self.get_id())}.")
@@ -346,8 +665,8 @@ class LaueDiagram(Splitable, DiagramPickleable):
         from laue.utilities.image import read_image
         image = read_image(self.get_id())
 
-        if psutil is not None and psutil.virtual_memory().percent < 75:
-            self._image_xy = image
+        if self.experiment is not None:
+            self.experiment.cache.put(("image_xy", self.get_id()), image)
 
         return image
 
@@ -369,7 +688,10 @@ class LaueDiagram(Splitable, DiagramPickleable):
                     - (int, int) => Interprete comme x_camera et y_camera en pxl.
                     - (float, float) => Interprete comme x_gnomonic et y_gnomonic en mm.
         space : str
-            Given to ``laue.spot.distance``.
+            L'espace dans lequel les distances sont mesurees,
+            voir ``LaueDiagram.get_spatial_index``. Par defaut, il est deduit
+            du type du spot de reference. Si il vaut "angle", un tuple
+            est interprete comme theta et chi en degre.
         n_max : int
             C'est le nombre maximum de voisins (reference comprise) a renvoyer.
             C'est la taille maximal de la liste renvoyee. Par defaut, il n'y a pas de limite.
@@ -420,15 +742,17 @@ class LaueDiagram(Splitable, DiagramPickleable):
         if isinstance(spot, (int, np.integer)): # Si le spot est designe par son rang.
             spot = self[spot] # On recupere l'instance du spot lui-meme.
         if isinstance(spot, Spot): # Si le spot est trop complexe.
-            if space is None or space == "camera":
+            if space is None:
+                space = "camera"
+            if space not in {"camera", "gnomonic", "angle", "cosine"}:
+                raise ValueError(f"L'espace {space} est pas connu. "
+                    "Seul, 'camera', 'gnomonic' et 'angle' sont admissibles.")
+            if space == "camera":
                 spot = spot.get_position()
             elif space == "gnomonic":
                 spot = spot.get_gnomonic()
-            elif space == "angle":
-                spot = spot.get_theta_chi()
             else:
-                raise ValueError(f"L'espace {space} est pas connu. "
-                    "Seul, 'camera', 'gnomonic' et 'angle' sont admissibles.")
+                spot = spot.get_theta_chi()
         elif isinstance(spot, tuple):
             if len(spot) != 2:
                 raise ValueError("Si le spot de reference est un tuple, il doit "
@@ -446,32 +770,33 @@ class LaueDiagram(Splitable, DiagramPickleable):
         else:
             raise TypeError("Seul les types 'int', 'tuple' et 'Spot' sont supportees. "
                 f"Or le type fourni est {type(spot).__name__}.")
-        
-        if self.experiment.verbose:
-            print(f"Recherche des voisins du spot {spot}...")
 
-        if space is None:
-            space = "camera"
-
-        # Recherche des voisins
-        from laue.spot import distance
-
-        d_list = distance(spot, self.select_spots(), space=space)
-        nbr = len(self)
         if d_max is not None:
             if not isinstance(d_max, numbers.Number):
                 raise TypeError(f"'d_max' has to be a number, not a {type(d_max).__name__}.")
             if d_max <= 0:
                 raise ValueError(f"'d_max' doit etre strictement positif. Or il vaut {d_max}.")
-            nbr = (d_list <= d_max).sum()
         if n_max is not None:
             if not isinstance(n_max, int):
                 raise TypeError(f"'n_max' has to be a integer, not a {type(n_max).__name__}.")
             if n_max < 1:
                 raise ValueError(f"Il faut selectioner au moin 1 voisin. {n_max} c'est pas suffisant.")
-            nbr = min(nbr, n_max)
 
-        neighbors = [self._spots[spot_ind] for spot_ind in np.argsort(d_list)[:nbr]]
+        if self.experiment.verbose:
+            print(f"Recherche des voisins du spot {spot}...")
+
+        # Recherche des voisins
+        index = self.get_spatial_index(space)
+        if n_max is None and d_max is None: # Tous les spots, du plus proche au plus lointain.
+            dist, rows = index.knn([spot], k=max(1, len(self)))
+            rows = rows[0, np.isfinite(dist[0])]
+        elif n_max is None:
+            rows = index.radius([spot], d_max)[0]
+        else:
+            dist, rows = index.knn([spot], k=n_max)
+            rows = rows[0, dist[0] <= (np.inf if d_max is None else d_max)]
+
+        neighbors = [Spot(self, spot_ind) for spot_ind in rows.tolist()]
         if self.experiment.verbose:
             print(f"    OK: il y a {len(neighbors)} voisins.")
         return neighbors
@@ -508,9 +833,7 @@ class LaueDiagram(Splitable, DiagramPickleable):
                [1657., 1214., 1661.,  599.]])
         >>>
         """
-        return np.array(
-            [spot.get_position(**kwds) for spot in self.select_spots(n=n, sort=sort)],
-            ).transpose()
+        return self._get_positions(self._select_indices(n=n, sort=sort))
 
     def get_quality(self):
         r"""
@@ -556,9 +879,65 @@ class LaueDiagram(Splitable, DiagramPickleable):
 
         spot_qual_weight = 0.5
 
-        self._quality = (1-spot_qual_weight)*f_nbr(len(self), 60, 120) + spot_qual_weight*np.mean([spot.get_quality() for spot in self])
+        self._quality = (1-spot_qual_weight)*f_nbr(len(self), 60, 120) + spot_qual_weight*np.mean(self._qualities)
         return self._quality
 
+    def get_spatial_index(self, space="camera"):
+        """
+        ** L'index des plus proches voisins des spots de ce diagramme. **
+
+        Parameters
+        ----------
+        space : str
+            * "camera" => Positions en pxl dans le plan de la camera.
+            * "gnomonic" => Positions en mm dans le plan gnomonic.
+            * "angle" ou "cosine" => Angles theta, chi, distance angulaire en degre.
+
+        Returns
+        -------
+        laue.core.neighbors.SpatialIndex
+            L'index, construit au premier appel puis garde en cache
+            tant que les coordonnees des spots ne changent pas.
+            Les rangs qu'il renvoie sont les rangs des spots dans le diagramme.
+
+        Examples
+        --------
+        >>> import numpy as np
+        >>> import laue
+        >>> image = np.zeros((64, 64), dtype=np.uint16)
+        >>> image[10:13, 10:13] = image[40:43, 50:53] = image[52:55, 50:53] = 1000
+        >>> diag = laue.Experiment([image])[0]
+        >>> index = diag.get_spatial_index()
+        >>> index is diag.get_spatial_index("camera")
+        True
+        >>> dist, ind = index.knn([(51, 41), (11, 11)], k=2)
+        >>> ind.tolist()
+        [[1, 0], [2, 1]]
+        >>> [rows.tolist() for rows in index.radius([(51, 46)], 7)]
+        [[1, 0]]
+        >>>
+        """
+        from laue.core.neighbors import SpatialIndex
+        space = {"cosine": "angle"}.get(space, space)
+        if space not in {"camera", "gnomonic", "angle"}:
+            raise ValueError(f"L'espace {space} est pas connu. "
+                "Seul, 'camera', 'gnomonic' et 'angle' sont admissibles.")
+        if space in {"gnomonic", "angle"}: # Invalide l'index si la calibration a change.
+            self._check({"gnomonic": "gnomonic", "angle": "thetachi"}[space])
+
+        if space not in self._indexes:
+            indices = np.arange(len(self))
+            if space == "camera":
+                x, y = self._get_positions(indices)
+                self._indexes[space] = SpatialIndex(x, y)
+            elif space == "gnomonic":
+                x, y = self._get_coords("gnomonic", indices)
+                self._indexes[space] = SpatialIndex(x, y)
+            else:
+                theta, chi = self._get_coords("thetachi", indices)
+                self._indexes[space] = SpatialIndex(theta, chi, metric="cosine")
+        return self._indexes[space]
+
     def get_theta_chi(self, *, n=None, sort=None):
         """
         ** Recupere la representation angulaire des spots. **
@@ -586,23 +965,11 @@ class LaueDiagram(Splitable, DiagramPickleable):
         (2, 78)
         >>> np.round(diag.get_theta_chi(n=4, sort="quality"))
         array([[ 29.,  40.,  29.,  58.],
-               [ 20.,   1., -18., -21.]], dtype=float32)
+               [ 20.,   1., -18., -21.]])
         >>>
         """
         # On calcul les projections pour tous les points a la fois.
-        if self._spots[0]._thetachi is None:
-            angles_thetachi = self.experiment.transformer.cam_to_thetachi(
-                *self.get_positions(n=n, sort=sort),
-                self.experiment.set_calibration())
-            for spot, theta, chi in zip(self, *angles_thetachi):
-                spot._thetachi = (theta, chi)
-        # On extrait juste ce qu'il nous interresse.
-        else:
-            angles_thetachi = np.array(
-                [spot.get_theta_chi() for spot in self.select_spots(n=n, sort=sort)],
-                ).transpose()
-
-        return angles_thetachi
+        return self._get_coords("thetachi", self._select_indices(n=n, sort=sort))
 
     def plot_all(self, *, display=True):
         """
@@ -801,6 +1168,7 @@ class LaueDiagram(Splitable, DiagramPickleable):
             ``shape = (len(self),)``
         """
         key = hashlib.md5(repr(args) + repr(sorted(kwds.items()))).hexdigest()
+        self._check("hkl")
         if key not in self._hkl:
             if key not in self.experiment._predictors:
                 from laue.core.hkl_nn.prediction import Predictor
@@ -849,14 +1217,9 @@ class LaueDiagram(Splitable, DiagramPickleable):
             f"'{', '.join(EXT_OK)}' sont supportees. Pas '.{filename.split('.')[-1]}'.")
 
         ext = filename.split(".")[-1].lower()
-        if ext == "dat":
+        if ext in {"dat", "cor"}:
             with open(filename, "w", encoding="utf-8") as file:
-                file.write("{:<20} {:<20} {:<20}\n".format("spot_X", "spot_Y", "spot_I"))
-                for spot in self:
-                    file.write("{x:<20} {y:<20} {i:<20}\n".format(
-                        x=spot.get_position()[0],
-                        y=spot.get_position()[1],
-                        i=spot.get_intensity()))
+                file.write(_format_table(*self._get_table(ext)))
         elif ext in {"jpg", "jpeg", "svg", "png"}:
             plt = self.plot_all(display=False)
             plt.savefig(filename)
@@ -864,17 +1227,26 @@ class LaueDiagram(Splitable, DiagramPickleable):
             import pickle
             with open(filename, "wb") as file:
                 pickle.dump(self, file)
-        elif ext == "cor":
-            with open(filename, "w", encoding="utf-8") as file:
-                file.write((" ".join(("{:<20}",)*5) + "\n").format(
-                    "2theta", "chi", "X", "Y", "I"))
-                for spot in self:
-                    file.write((" ".join(("{:<20}",)*5) + "\n").format(
-                        2*spot.get_theta_chi()[0],
-                        spot.get_theta_chi()[1],
-                        spot.get_position()[0],
-                        spot.get_position()[1],
-                        spot.get_intensity()))
+
+    def _get_table(self, ext):
+        """
+        ** Les colonnes des fichiers ``.dat`` ou ``.cor``. **
+
+        Les coordonnees sont calculees pour tous les spots a la fois.
+
+        Returns
+        -------
+        names : tuple
+            Les titres des colonnes.
+        columns : list
+            Les colonnes, de type ``np.ndarray``.
+        """
+        positions = self.get_positions().reshape(2, len(self))
+        intensities = self._intensities
+        if ext == "dat":
+            return ("spot_X", "spot_Y", "spot_I"), [*positions, intensities]
+        theta, chi = self.get_theta_chi().reshape(2, len(self)) if len(self) else np.empty((2, 0))
+        return ("2theta", "chi", "X", "Y", "I"), [2*theta, chi, *positions, intensities]
 
     def select_spots(self, *, n=None, sort=None):
         """
@@ -927,29 +1299,30 @@ class LaueDiagram(Splitable, DiagramPickleable):
             or sort in {"intensity", "distortion", "quality"}), \
             f"'sort' ne peut pas etre {sort}."
 
-        if sort is None: # Si il n'y a pas de tri a faire.
-            if n is None:
-                return self._spots.copy()
-            return self._spots[:n]
+        return [Spot(self, index) for index in self._select_indices(n=n, sort=sort).tolist()]
 
-        if hasattr(sort, "__call__"):
-            l_spots = sorted(self._spots, key=sort)
-        if sort in self._sorted_spots: # On enregistre la liste pour de melleur
-            l_spots = self._sorted_spots[sort] #  perfs aux apels suivants.
-        else:
-            if sort == "intensity":
-                l_spots = sorted(self._spots, key=(lambda spot: -spot.get_intensity()))
-            elif sort == "distortion":
-                l_spots = sorted(self._spots, key=(lambda spot: -spot.get_distortion()))
-            elif sort == "quality":
-                l_spots = sorted(self._spots, key=(lambda spot: -spot.get_quality()))
-            self._sorted_spots[sort] = l_spots
+    def _check(self, stage):
+        """
+        ** Invalide les resultats d'une etape si leurs parametres ont change. **
 
-        if n is not None:
-            return l_spots[:n]
-        return l_spots
+        Compare la signature sous laquelle les resultats en cache de ``stage``
+        ont ete calcules avec la signature courante de l'experience. Si elles
+        different, seuls les resultats de cette etape et de celles qui en
+        dependent sont supprimes.
 
-    def _clean(self):
+        Un diagramme detache de son experience (relu seul par ``pickle`` par exemple)
+        n'a plus de signature courante, ses resultats en cache sont alors servis tels quels.
+        """
+        if self.experiment is None:
+            return
+        self.experiment.set_calibration() # Les etapes suivies dependent toutes de la calibration.
+        token = self.experiment.stages.token(stage)
+        known = self._tokens.get(stage, None)
+        if known is not None and known != token:
+            self._clean(stage)
+        self._tokens[stage] = token # Sans signature, le cache est suppose a jour.
+
+    def _clean(self, *stages):
         """
         ** Supprime les attributs superfux. **
 
@@ -957,16 +1330,51 @@ class LaueDiagram(Splitable, DiagramPickleable):
         des informations desormais fausses. Si beaucoup d'images
         sont enregistrees dans la RAM, cela permet de faire de la
         place en memoire.
+
+        Parameters
+        ----------
+        *stages : str
+            Si elles sont fournies, seuls les resultats de ces etapes et
+            des etapes qui en dependent sont supprimes (voir ``laue.utilities.stages.STAGES``).
+            Les spots sont alors conserves tant que "detection" n'en fait pas partie.
         """
+        if stages:
+            from laue.utilities.stages import StageGraph
+            graph = self.experiment.stages if self.experiment is not None else StageGraph()
+            stages = graph.downstream(*stages)
+            if "detection" not in stages:
+                if "gnomonic" in stages:
+                    self._gnomonics = None
+                    self._indexes.pop("gnomonic", None)
+                if "thetachi" in stages:
+                    self._thetachis = None
+                    self._indexes.pop("angle", None)
+                if "zone_axes" in stages:
+                    self._axes = {}
+                    self._incidences = {}
+                if "subsets" in stages:
+                    self._subsets = {}
+                if "hkl" in stages:
+                    self._hkl = {}
+                for stage in stages:
+                    self._tokens.pop(stage, None)
+                return
+
         if os.path.exists(self.get_id()): # Il ne faut pas supprimer
             self._image_xy = None # une image que l'on ne peut pas retrouver!
         self._quality = None
-        self._image_gnom = None
+        if self.experiment is not None:
+            self.experiment.cache.discard(
+                ("image_gnomonic", self.get_id(), self.experiment.stages.token("calibration")))
         self._sorted_spots = {} # Si jamais la set_calibration ou un spot change.
+        self._indexes = {}
         self._axes = {} # Les axes de zone depandent de beaucoup de choses, on reste donc prudent.
-        self._spots_set = None # On libere de la memoire en faisant ca.
-        for spot in self:
-            spot._clean()
+        self._incidences = {}
+        self._subsets = {}
+        self._hkl = {}
+        self._tokens = {}
+        self._gnomonics = self._thetachis = None # Si jamais la set_calibration change.
+        self._positions[self._has_image] = np.nan # Sinon, ils ne sont pas recalculables.
 
     def __contains__(self, spot):
         """
@@ -1007,13 +1415,8 @@ class LaueDiagram(Splitable, DiagramPickleable):
             f"instance of Spot or int, not {type(spot).__name__}.")
 
         if isinstance(spot, int):
-            if spot < 0 or spot >= len(self):
-                return False
-            spot = self[spot]
-
-        if self._spots_set is None:
-            self._spots_set = set(self)
-        return spot in self._spots_set
+            return 0 <= spot < len(self)
+        return spot.diagram is self and 0 <= spot.get_id() < len(self)
 
     def __getitem__(self, item):
         """
@@ -1068,10 +1471,13 @@ class LaueDiagram(Splitable, DiagramPickleable):
         >>>
         """
         if isinstance(item, (int, np.integer)):
-            return self._spots[item]
+            index = int(item) + len(self) if item < 0 else int(item)
+            if not 0 <= index < len(self):
+                raise IndexError(f"Le diagramme n'a que {len(self)} spots, pas de spot {item}.")
+            return Spot(self, index)
 
         if isinstance(item, slice):
-            return self._spots[item]
+            return [Spot(self, index) for index in range(len(self))[item]]
 
         if isinstance(item, (Spot, tuple)):
             return self.get_neighbors(item, n_max=1).pop()
@@ -1098,8 +1504,8 @@ class LaueDiagram(Splitable, DiagramPickleable):
             Cede les instances des spots qui constituent
             ce diagramme dans un ordre indetermine mais invariant.
             Ces instances heritent de la classe ``laue.spot.Spot``.
-            Seul les pointeurs sont cedes, ce qui implique que toute
-            modification d'un spot sera globale.
+            Ce sont des vues sur les tableaux du diagramme, ce qui
+            implique que toute modification d'un spot sera globale.
 
         Examples
         --------
@@ -1111,7 +1517,8 @@ class LaueDiagram(Splitable, DiagramPickleable):
         ...
         >>>
         """
-        yield from self._spots
+        for index in range(len(self)):
+            yield Spot(self, index)
 
     def __len__(self):
         """
@@ -1126,7 +1533,7 @@ class LaueDiagram(Splitable, DiagramPickleable):
         78
         >>>
         """
-        return len(self._spots)
+        return len(self._distortions)
 
     def __str__(self):
         """
@@ -1143,3 +1550,25 @@ class LaueDiagram(Splitable, DiagramPickleable):
         """
         return ("LaueDiagram("
                 f"name={repr(self.get_id())})")
+
+
+def _detected_spots(spots_args):
+    """
+    ** Met les spots de ``laue.core.pic_search.atomic_pic_search`` en tableaux. **
+
+    Les images sont rangees dans une arene et les grandeurs des
+    spots sont materialisees d'un coup, voir ``LaueDiagram.materialize``.
+
+    Returns
+    -------
+    dict
+        Les arguments nommes de ``LaueDiagram._set_spots``.
+    """
+    diag = LaueDiagram(None, None)
+    diag._set_spots(
+        [spot_args["bbox"] for spot_args in spots_args],
+        [spot_args["distortion"] for spot_args in spots_args],
+        *_pack_images(spot_args["spot_im"] for spot_args in spots_args))
+    diag.materialize()
+    return {"bbox": diag._bbox, "distortions": diag._distortions, "pixels": diag._pixels,
+            "has_image": diag._has_image, "intensities": diag._intensities, "positions": diag._positions}
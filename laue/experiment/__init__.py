@@ -12,8 +12,10 @@ import inspect
 
 from .base_experiment import Experiment
 from .ordered_experiment import OrderedExperiment
+from .sharding import shard_experiment, merge_experiments
+from .spot_table import SpotTable
 
-__all__ = ["Experiment", "OrderedExperiment"]
+__all__ = ["Experiment", "OrderedExperiment", "shard_experiment", "merge_experiments", "SpotTable"]
 
 __pdoc__ = {obj: ("Alias vers ``laue."
                   f"{inspect.getsourcefile(globals()[obj]).split('laue/')[-1][:-3].replace('/', '.').replace('.__init__', '')}"
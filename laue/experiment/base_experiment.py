@@ -9,9 +9,12 @@
 """
 
 import collections
+import contextlib
+import itertools
 import multiprocessing
 import os
 import time
+import weakref
 
 import cloudpickle
 import cv2
@@ -21,9 +24,9 @@ try:
 except ImportError:
     psutil = None
 
-from laue.diagram import LaueDiagram
+from laue.diagram import LaueDiagram, _detected_spots
 from laue.core.geometry import transformer
-from laue.spot import Spot
+from laue.utilities.asynchronous import ExperimentAsync
 from laue.utilities.serialization import ExperimentPickleable
 from laue.utilities.data_consistency import Recordable
 
@@ -33,7 +36,7 @@ __pdoc__ = {"Experiment.__getitem__": True,
             "Experiment.__len__": True}
 
 
-class Experiment(ExperimentPickleable, Recordable):
+class Experiment(ExperimentPickleable, ExperimentAsync, Recordable):
     """
     ** Permet de travailler sur un lot d'images. **
     """
@@ -79,6 +82,62 @@ class Experiment(ExperimentPickleable, Recordable):
         ignore_errors : boolean, optional
             Permet d'ignorer certaine erreurs qui ne sont pas critiques.
             La valeur par defaut et True.
+        memory_budget : int, optional
+            La memoire maximale en octets que peuvent occuper ensemble
+            les taches lancees en parallele. Par defaut, c'est la moitie
+            de la memoire disponible au moment du lancement des calculs.
+            Voir ``laue.utilities.scheduling.scheduled_imap``.
+        timeout : float, optional
+            La duree maximale en secondes du traitement d'un diagramme
+            par une etape (pic search, axes de zone, grains). Au dela, le
+            processus est tue puis remplace. Par defaut, il n'y a pas de limite.
+        retries : int, optional
+            Le nombre de nouvelles tentatives, avec des parametres degrades,
+            pour un diagramme dont le traitement a echoue. Par defaut 1.
+            Les echecs definitifs n'interrompent pas l'experience. Eux et les
+            reussites degradees sont consignes dans
+            ``laue.experiment.base_experiment.Experiment.get_failures``.
+        batch_size : int, optional
+            Le nombre de taches lues puis ordonnancees ensemble a chaque etape.
+            Par defaut, 4 par coeur. Voir ``laue.utilities.scheduling.scheduled_imap``.
+        max_worker_memory : int, optional
+            La memoire maximale en octets de chaque processus de calcul.
+            Par defaut, il n'y a pas de limite.
+        processes : int, optional
+            Le nombre de processus de calcul. Par defaut, un par coeur.
+            Voir ``laue.utilities.concurrency.ConcurrencyPolicy``.
+        hierarchical : boolean, optional
+            Si True, quand il y a moins de diagrammes que de coeurs,
+            les coeurs en trop sont alloues aux threads de chaque processus.
+            La valeur par defaut est False.
+        affinity : str, optional
+            "core" pour epingler chaque processus sur un coeur physique,
+            "node" pour l'epingler sur un noeud NUMA. Dans ce cas, les images
+            sont lues par le processus qui les traite afin qu'elles restent
+            dans la memoire de son noeud. Par defaut, les processus ne sont pas epingles.
+        spill_window : int, optional
+            Si il est fourni, seuls les ``spill_window`` diagrammes et images les plus
+            recement utilises restent en memoire. Les autres sont ecrits sur le disque
+            puis relus au besoin. Par defaut, tout reste en memoire.
+            Voir ``laue.utilities.buffers.SpillBuffer``.
+        spill_dir : str, optional
+            Le repertoire ou sont ecrits les elements sortis de la fenetre.
+            Par defaut, c'est un repertoire temporaire.
+        cache_budget : int, optional
+            La memoire maximale en octets des images et des matrices
+            gardees en cache. Par defaut, c'est le quart de la memoire
+            disponible a la creation de l'experience.
+            Voir ``laue.utilities.cache.CacheManager``.
+        cold_cache_budget : int, optional
+            La memoire maximale en octets des elements evinces du cache,
+            gardes compresses. Par defaut 0, ils ne sont pas gardes.
+        backend : str or tuple, optional
+            Si elle est fournie, c'est l'adresse ("host:port" ou chemin d'un socket Unix)
+            sur laquelle les etapes attendent des processus de calcul distants, lances
+            avec ``python -m laue.utilities.distributed host:port``. Les chemins des images
+            doivent alors etre accessibles depuis toutes les machines.
+            L'adresse est occupee jusqu'a ``Experiment.close``.
+            Voir ``laue.utilities.distributed.DistributedPool``.
         config_file : str, optional
             Alias vers ``**detector_parameters``.
         **detector_parameters : number
@@ -126,6 +185,47 @@ class Experiment(ExperimentPickleable, Recordable):
         assert isinstance(ignore_errors, bool), \
             f"'ignore_errors' has to be a boolean, not a {type(ignore_errors).__name__}."
 
+        memory_budget = kwargs.get("memory_budget", None)
+        assert memory_budget is None or isinstance(memory_budget, int), \
+            f"'memory_budget' has to be an integer, not a {type(memory_budget).__name__}."
+        assert memory_budget is None or memory_budget > 0, \
+            f"'memory_budget' has to be positive. His value is '{memory_budget}'."
+
+        timeout = kwargs.get("timeout", None)
+        assert timeout is None or isinstance(timeout, (int, float)), \
+            f"'timeout' has to be a number, not a {type(timeout).__name__}."
+        assert timeout is None or timeout > 0, \
+            f"'timeout' has to be positive. His value is '{timeout}'."
+        retries = kwargs.get("retries", 1)
+        assert isinstance(retries, int), \
+            f"'retries' has to be an integer, not a {type(retries).__name__}."
+        assert retries >= 0, f"'retries' can not be negative. His value is '{retries}'."
+        batch_size = kwargs.get("batch_size", None)
+        assert batch_size is None or isinstance(batch_size, int), \
+            f"'batch_size' has to be an integer, not a {type(batch_size).__name__}."
+        assert batch_size is None or batch_size >= 1, \
+            f"'batch_size' has to be positive. His value is '{batch_size}'."
+        max_worker_memory = kwargs.get("max_worker_memory", None)
+        assert max_worker_memory is None or isinstance(max_worker_memory, int), \
+            f"'max_worker_memory' has to be an integer, not a {type(max_worker_memory).__name__}."
+        from laue.utilities.concurrency import ConcurrencyPolicy
+        concurrency = ConcurrencyPolicy(
+            kwargs.get("processes", None), hierarchical=kwargs.get("hierarchical", False),
+            affinity=kwargs.get("affinity", None))
+        spill_window = kwargs.get("spill_window", None)
+        assert spill_window is None or isinstance(spill_window, int), \
+            f"'spill_window' has to be an integer, not a {type(spill_window).__name__}."
+        assert spill_window is None or spill_window >= 1, \
+            f"'spill_window' has to be positive. His value is '{spill_window}'."
+        assert isinstance(kwargs.get("spill_dir", ""), str), \
+            f"'spill_dir' has to be str, not {type(kwargs['spill_dir']).__name__}."
+        assert isinstance(kwargs.get("cache_budget", 0), int), \
+            f"'cache_budget' has to be an integer, not a {type(kwargs['cache_budget']).__name__}."
+        assert isinstance(kwargs.get("cold_cache_budget", 0), int), \
+            f"'cold_cache_budget' has to be an integer, not a {type(kwargs['cold_cache_budget']).__name__}."
+        assert isinstance(kwargs.get("backend", ""), (str, tuple)), \
+            f"'backend' has to be str or tuple, not {type(kwargs['backend']).__name__}."
+
         if config_file is not None:
             kwargs["config_file"] = config_file
 
@@ -137,6 +237,11 @@ class Experiment(ExperimentPickleable, Recordable):
         self.threshold = threshold
         self.font_size = font_size
         self.ignore_errors = ignore_errors
+        self.memory_budget = memory_budget
+        self.timeout = timeout
+        self.retries = retries
+        self.max_worker_memory = max_worker_memory
+        self.concurrency = concurrency
         self.kwargs = kwargs
 
         # Precalul des constantes.
@@ -144,16 +249,29 @@ class Experiment(ExperimentPickleable, Recordable):
         self.kernel_dilate = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (self.max_space, self.max_space))
         self.transformer = transformer.Transformer(verbose=self.verbose) # Outil permetant de faire les transformations geometriques.
         self._predictors = {} # Predicteurs bases sur un reseau de neurones.
+        from laue.utilities.scheduling import CostModel
+        self._cost_model = CostModel() # Estime le cout des taches pour les ordonnancer.
+        self.cache = self._new_cache() # Les images et les matrices gardees en memoire.
 
         # Declaration des attributs interne de memoire.
         self._len = None # Nombre de diagrames lues.
-        self._buff_images = [] # La liste ordonnees des references d'images.
-        self._buff_diags = [] # La liste ordonnee des diagrames lus.
+        # Les references d'images, les diagrammes lus et ceux extraits par acces direct, a chaque rang.
+        self._buff_images, self._buff_diags, self._sparse_diags = self._new_buffers()
+        self._images_offset = 0 # Le nombre d'images retirees du debut de 'self._images'.
+        self._readable_images = [] # Pour chaque image deja vue, True si elle est presumee lisible.
+        self._unreadable_images = set() # Les chemins des images deja sautees.
+        self._shard_ranks = None # Si c'est un morceau, les rangs des diagrammes dans l'experience mere.
+        self._shared_pool = None # Un pool deja lance, partage avec d'autres experiences.
+        self._pool, self._pool_finalizer = None, None # Le pool propre a l'experience.
 
         self._mean_bg = None # Fond diffus estime par la moyenne de toutes les images.
         self._shape = None # Les dimensions des matrices des images xy.
+        from laue.utilities.stages import StageGraph
+        self.stages = StageGraph() # Les parametres dont dependent les resultats mis en cache.
+        self.stages.set_parameters("detection",
+            {"threshold": self.threshold, "font_size": self.font_size, "max_space": self.max_space})
         self._calibration_parameters = None # Le dictionaire des parametres geometrique de la camera.
-        self._gnomonic_matrix = None # Les matrices de transformation.
+        self._failures = {} # A chaque diagramme, les etapes qui ont echoue.
 
         self._images_iterator = None # Iterateur unique des informations des images.
         self._diagrams_iterator = None # Iterateur unique qui genere les diagrammes.
@@ -162,6 +280,33 @@ class Experiment(ExperimentPickleable, Recordable):
 
         Recordable.__init__(self, **kwargs) # Instancie le gestionaire d'enregistrement.
 
+    @property
+    def _calibration_parameters(self):
+        """
+        ** Le dictionaire des parametres geometrique de la camera, None si inconnus. **
+        """
+        return self._calibration_values
+
+    @_calibration_parameters.setter
+    def _calibration_parameters(self, parameters):
+        """
+        ** Change la calibration et invalide ce qui en depend. **
+        """
+        previous = self.__dict__.get("_calibration_values", None)
+        self._calibration_values = parameters
+        if self.stages.set_parameters("calibration", parameters) and previous is not None:
+            self._forget_results() # Les resultats memorises ne sont plus valables.
+
+    def _forget_results(self):
+        """
+        ** Oublie les axes et les bouts de grains deja cedes par les iterateurs. **
+        """
+        from laue.utilities.multi_core import RecallingIterator
+        for name in ("_axes_iterator", "_subsets_iterator"):
+            if getattr(self, name, None) is not None:
+                RecallingIterator.forget(getattr(self, name), mother=self)
+            setattr(self, name, None)
+
     def set_calibration(self, *diagrams):
         """
         ** Calibration de la camera. **
@@ -362,6 +507,50 @@ class Experiment(ExperimentPickleable, Recordable):
             print(f"    OK: set_calibration terminee: {self._calibration_parameters}")
         return self._calibration_parameters
 
+    def update_calibration(self, **parameters):
+        """
+        ** Change une partie des parametres de calibration. **
+
+        Notes
+        -----
+        * Seuls les resultats qui dependent de la calibration (coordonnees
+        gnomoniques, angles, axes de zone, bouts de grains, indices hkl)
+        sont recalcules a la demande. Les spots detectes sont conserves.
+        * Si les parametres ne changent pas, aucun cache n'est invalide.
+
+        Parameters
+        ----------
+        **parameters
+            Les parametres a changer, avec les memes noms que pour
+            ``laue.utilities.parsing.extract_parameters``.
+
+        Returns
+        -------
+        dict
+            Les nouveaux parametres de calibration complets.
+
+        Examples
+        --------
+        >>> import laue
+        >>> image = "laue/examples/ge_blanc.mccd"
+        >>> experiment = laue.experiment.base_experiment.Experiment(image, config_file="laue/examples/ge_blanc.det")
+        >>> diag = experiment[0]
+        >>> spot, axes = diag[0], diag.find_zone_axes()
+        >>> gnomonic = spot.get_gnomonic()
+        >>> experiment.update_calibration(dd=experiment.set_calibration()["dd"] + 1)["dd"] > 70
+        True
+        >>> diag[0] is spot # La detection n'est pas refaite.
+        True
+        >>> spot.get_gnomonic() == gnomonic, diag.find_zone_axes() is axes # Le reste est recalcule.
+        (False, False)
+        >>>
+        """
+        from laue.utilities.parsing import extract_parameters
+        new_parameters = extract_parameters(ignore_missing=True, **parameters)
+        self.kwargs.update(new_parameters) # Pour les morceaux et les processus fils.
+        self._calibration_parameters = {**self.set_calibration(), **new_parameters}
+        return self._calibration_parameters
+
     def _calibration_cost(self, params_as_vect, known_params, vect_labels, spots_position):
         """
         ** Help for ``set_calibration``. **
@@ -437,7 +626,7 @@ class Experiment(ExperimentPickleable, Recordable):
 
         return cost
 
-    def get_diagrams(self, *, tense_flow=False):
+    def get_diagrams(self, *, tense_flow=False, ordered=True):
         """
         ** Genere les diagrammes de l'experience. **
 
@@ -461,6 +650,13 @@ class Experiment(ExperimentPickleable, Recordable):
                 * Equivalent a ``laue.experiment.base_experiment.Experiment.__iter__``.
             * False. Sinon, attend que tous les diagrammes
             soient lues afin de tout renvoyer en meme temps.
+        ordered : boolean
+            * True : Les diagrammes sont cedes dans l'ordre des images.
+            * False : Les diagrammes sont cedes des qu'ils sont extraits,
+            sous la forme de couples ``(rang, diagramme)``. Un diagramme
+            lent ne bloque alors plus tous ceux qui le suivent. Voir
+            ``laue.utilities.multi_core.reorder`` pour retrouver l'ordre.
+            Ce mode ne doit pas etre itere en meme temps qu'une iteration ordonnee.
 
         Returns
         -------
@@ -488,20 +684,6 @@ class Experiment(ExperimentPickleable, Recordable):
         <class 'laue.diagram.LaueDiagram'>
         >>>
         """
-        def cast_to_diagram(spots_args, name, image=None):
-            """
-            Met en forme du pic search pour en faire des diagrames.
-            """
-            laue_diagram = LaueDiagram(name, experiment=self)
-            spots = [Spot(diagram=laue_diagram, identifier=i, **spot_args)
-                     for i, spot_args in enumerate(spots_args)]
-            laue_diagram._set_spots(spots)
-            if image is not None and (
-                    (not os.path.exists(name)) or (psutil is not None and psutil.virtual_memory().percent < 50)
-                    ):
-                laue_diagram._set_image(image)
-            return laue_diagram
-
         def show_iterator_state(func):
             """
             Insere des commentaires.
@@ -529,46 +711,29 @@ class Experiment(ExperimentPickleable, Recordable):
             """
             if multiprocessing.current_process().name == "MainProcess":
                 from laue.core.pic_search import _pickelable_pic_search
-                from laue.utilities.multi_core import limited_imap
-                with multiprocessing.Pool() as pool:
-                    yield from (
-                        cast_to_diagram(spots_args, name, image)
-                        for spots_args, (name, image) in limited_imap(pool,
+                from laue.utilities.scheduling import scheduled_imap
+                with self._stage_pool() as pool:
+                    for spots_args, (name, image) in scheduled_imap(pool,
                             _pickelable_pic_search,
-                            (
-                                (
-                                    (
-                                        image,
-                                        self.kernel_font,
-                                        self.kernel_dilate,
-                                        self.threshold
-                                    ),
-                                    (name, image)
-                                )
-                                for name, image in self.read_images(condition=(
-                                    lambda im_id: not any(im_id == d.get_id() for d in self._buff_diags)
-                                ))
-                            )
-                        )
-                    )
+                            self._pic_search_args(),
+                            cost=self._pic_search_cost,
+                            memory_budget=self.memory_budget,
+                            **self._fault_kwargs("pic_search")):
+                        if name is None: # Si l'image est ignoree par le processus de calcul.
+                            self._image_skipped(image)
+                            continue
+                        yield self._cast_to_diagram(spots_args, name, image)
             else:
-                from laue import atomic_pic_search
+                from laue.core.pic_search import _pickelable_pic_search
                 yield from (
-                    cast_to_diagram(
-                        atomic_pic_search(
-                            image,
-                            self.kernel_font,
-                            self.kernel_dilate,
-                            self.threshold
-                        ),
-                        name,
-                        image
-                    )
-                    for name, image in self.read_images(condition=(
-                        lambda im_id: not any(im_id == d.get_id() for d in self._buff_diags)
-                    ))
+                    self._cast_to_diagram(spots_args, name, image)
+                    for spots_args, (name, image) in map(_pickelable_pic_search, self._pic_search_args())
+                    if name is not None # Si l'image n'est pas ignoree.
                 )
-        
+
+        if not ordered:
+            return self._unordered_diagrams() if tense_flow else list(self._unordered_diagrams())
+
         if self._diagrams_iterator is None:
             self._diagrams_iterator = iter(_diagram_extractor(self))
 
@@ -577,7 +742,7 @@ class Experiment(ExperimentPickleable, Recordable):
             (lambda x: (yield from x))(RecallingIterator(self._diagrams_iterator, mother=self, buff_name="_buff_diags"))
             if tense_flow else list(RecallingIterator(self._diagrams_iterator, mother=self, buff_name="_buff_diags")))
 
-    def find_subsets(self, *, tense_flow=False, **kwds):
+    def find_subsets(self, *, tense_flow=False, ordered=True, **kwds):
         """
         ** Estime les grains dans chaque diagrame. **
 
@@ -602,6 +767,10 @@ class Experiment(ExperimentPickleable, Recordable):
             * False. Sinon, attend que tous les diagrammes soient lues afin de tout renvoyer en meme temps.
                 * C'est equvalent a ``[diag.find_subsets(**kwds) for diag in self]``.
                 * Au lieu de retourner un generateur, retourne une liste.
+        ordered : boolean
+            * True : Les resultats sont cedes dans l'ordre des diagrammes.
+            * False : Cede les couples ``(rang, subsets)`` des qu'ils sont prets.
+            Voir ``laue.experiment.base_experiment.Experiment.get_diagrams``.
         **kwds
             Se sont les parametres de la fonction ``laue.diagram.LaueDiagram.find_subsets``.
             Se sont aussi ceux de la fonction ``laue.diagram.LaueDiagram.find_zone_axes``.
@@ -647,29 +816,36 @@ class Experiment(ExperimentPickleable, Recordable):
         def _subsets_extractor(self):
             if multiprocessing.current_process().name == "MainProcess":
                 from laue.core.subsets import _jump_find_subsets
-                from laue.utilities.multi_core import limited_imap
-                with multiprocessing.Pool() as pool:
+                from laue.utilities.scheduling import scheduled_imap
+                with self._stage_pool() as pool:
                     yield from (
                         (
                             diag.find_subsets(_atomic_subsets_res=args)
                             if not isinstance(args, dict) else
                             diag.find_subsets(**args)
                         )
-                        for diag, args
+                        for args, diag # Le diagramme est relu une fois le resultat pret (spill_window).
                         in zip(
-                            self,
-                            limited_imap(pool,
+                            scheduled_imap(pool,
                                 _jump_find_subsets,
                                 (
                                     diag.find_subsets(**kwds, _get_args=True)
                                     for _, diag in zip(self.find_zone_axes(tense_flow=True, **kwds), self)
-                                )
-                            )
+                                ),
+                                cost=self._subsets_cost,
+                                memory_budget=self.memory_budget,
+                                **self._fault_kwargs("subsets", lambda rank: self[rank].get_id())
+                            ),
+                            self
                         )
                     )
             else:
                 yield from (diag.find_subsets(**kwds) for diag in self)
 
+        if not ordered:
+            pairs = ((i, subsets) for i, _, subsets in self._unordered_subsets(kwds))
+            return pairs if tense_flow else list(pairs)
+
         if not tense_flow:
             return list(self.find_subsets(tense_flow=True, **kwds))
 
@@ -679,7 +855,7 @@ class Experiment(ExperimentPickleable, Recordable):
         from laue.utilities.multi_core import RecallingIterator
         return (lambda x: (yield from x))(RecallingIterator(self._subsets_iterator, mother=self))
 
-    def find_zone_axes(self, *, tense_flow=False, **kwds):
+    def find_zone_axes(self, *, tense_flow=False, ordered=True, **kwds):
         """
         ** Recherche l'ensemble des axes de zones. **
 
@@ -704,6 +880,10 @@ class Experiment(ExperimentPickleable, Recordable):
             * False. Sinon, attend que tous les diagrammes soient lues afin de tout renvoyer en meme temps.
                 * C'est equvalent a ``[diag.find_zone_axes(**kwds) for diag in self]``.
                 * Au lieu de retourner un generateur, retourne une liste.
+        ordered : boolean
+            * True : Les resultats sont cedes dans l'ordre des diagrammes.
+            * False : Cede les couples ``(rang, axes)`` des qu'ils sont prets.
+            Voir ``laue.experiment.base_experiment.Experiment.get_diagrams``.
         **kwds
             Se sont les parametres de la fonction ``laue.diagram.LaueDiagram.find_zone_axes``.
 
@@ -756,30 +936,37 @@ class Experiment(ExperimentPickleable, Recordable):
             if multiprocessing.current_process().name == "MainProcess":
                 # Parallelisation des fils.
                 from laue.core.zone_axes import _jump_find_zone_axes
-                from laue.utilities.multi_core import limited_imap
-                with multiprocessing.Pool() as pool:
+                from laue.utilities.scheduling import scheduled_imap
+                with self._stage_pool() as pool:
                     yield from (
                         (
                             diag.find_zone_axes(_axes_args=args)
                             if not isinstance(args, dict) else
                             diag.find_zone_axes(**args)
                         )
-                        for diag, args
+                        for args, diag # Le diagramme est relu une fois le resultat pret (spill_window).
                         in zip(
-                            self,
-                            limited_imap(pool,
+                            scheduled_imap(pool,
                                 _jump_find_zone_axes,
                                 (
                                     diag.find_zone_axes(**kwds, _get_args=True)
                                     for diag in self
-                                )
-                            )
+                                ),
+                                cost=self._zone_axes_cost,
+                                memory_budget=self.memory_budget,
+                                **self._fault_kwargs("zone_axes", lambda rank: self[rank].get_id())
+                            ),
+                            self
                         )
                     )
 
             else:
                 yield from (diag.find_zone_axes(**kwds) for diag in self)
 
+        if not ordered:
+            pairs = ((i, axes) for i, _, axes in self._unordered_axes(kwds))
+            return pairs if tense_flow else list(pairs)
+
         if not tense_flow:
             return list(self.find_zone_axes(tense_flow=True, **kwds))
 
@@ -811,8 +998,10 @@ class Experiment(ExperimentPickleable, Recordable):
             Les limite en mm des pixel extremes:
             (xmin, xmax, ymin, ymax)
         """
-        if self._gnomonic_matrix is not None:
-            return self._gnomonic_matrix
+        key = ("gnomonic_matrix", self.stages.token("calibration")) # Perime si la calibration change.
+        gnomonic_matrix = self.cache.get(key)
+        if gnomonic_matrix is not None:
+            return gnomonic_matrix
 
         if self.verbose:
             print("Recuperation de la matrice gnomonic...")
@@ -837,9 +1026,7 @@ class Experiment(ExperimentPickleable, Recordable):
             print("    OK: La matrice gnomonic est calculee.")
 
         # Sauvegarde
-        if psutil is not None and psutil.virtual_memory().percent < 75:
-            self._gnomonic_matrix = (map_x, map_y, bornes)
-            return self._gnomonic_matrix
+        self.cache.put(("gnomonic_matrix", self.stages.token("calibration")), (map_x, map_y, bornes))
         return (map_x, map_y, bornes)
 
     def get_mean(self):
@@ -878,6 +1065,27 @@ class Experiment(ExperimentPickleable, Recordable):
             print("    OK: La moyenne des images est estimee.")
         return self._mean_bg
 
+    def get_failures(self):
+        """
+        ** Recupere les diagrammes dont le traitement a echoue. **
+
+        Notes
+        -----
+        * Un echec n'interrompt pas l'experience. Le diagramme concerne
+        recoit un resultat vide (pas de spots, d'axes ou de grains).
+        * Une reussite avec des parametres degrades est aussi consignee, sous la
+        forme ``"degraded(attempt=n)"``. Les axes et les grains ainsi obtenus sont
+        ranges dans le diagramme sous les parametres degrades.
+        * Les echecs sont conserves lors de la serialisation de l'experience.
+
+        Returns
+        -------
+        dict
+            A chaque nom de diagramme, associe un dictionaire
+            ``{etape: representation de l'erreur}``.
+        """
+        return {name: dict(stages) for name, stages in self._failures.items()}
+
     def get_images_shape(self):
         """
         ** Recupere les dimensions des images. **
@@ -897,7 +1105,53 @@ class Experiment(ExperimentPickleable, Recordable):
         self._shape = image.shape
         return self._shape
 
-    def read_images(self, condition=(lambda name: True)):
+    def _read_image_info(self, image_info, image_num, read=True):
+        """
+        ** Soit retourne directement, soit lit le fichier. **
+
+        Parameters
+        ----------
+        image_info : str or np.ndarray
+            La reference de l'image, telle que fournie a l'initialisateur.
+        image_num : int
+            Le rang de l'image, pour nommer les images sans chemin.
+        read : boolean, optional
+            Si False, le chemin d'une image sur le disque est renvoye
+            a la place de son contenu, sans verifications.
+
+        Returns
+        -------
+        name : str
+            Le nom de l'image, None si il faut ignorer cette image.
+        image : np.ndarray
+            Le contenu de l'image, None si il faut ignorer cette image.
+        """
+        # Mise en forme.
+        if isinstance(image_info, str) and not read:
+            return image_info, image_info
+        if isinstance(image_info, str):
+            image_name = image_info
+            from laue.utilities.image import read_image
+            image = read_image(image_info, ignore_errors=self.ignore_errors)
+            if image is None:
+                self._image_skipped(image_info)
+                return None, None
+        elif isinstance(image_info, np.ndarray):
+            image_name = f"image_{image_num}"
+            image = image_info
+        else:
+            raise TypeError("L'image doit etre de type str ou np.array, "
+                f"pas {type(image_info).__name__}.")
+
+        # Verifications
+        from laue.utilities.image import check_image
+        check_image(image, image_name, self._shape)
+        if self._shape is None:
+            self._shape = image.shape
+
+        return image_name, image
+
+    def read_images(self, condition=(lambda name: True), *, read=True):
         """
         ** Cede le contenu des images. **
 
@@ -916,6 +1170,10 @@ class Experiment(ExperimentPickleable, Recordable):
             Une fonction de selection qui prend en entree l'identifiant de l'image
             et qui renvoi True si il faut lire l'image, sinon. Si il renvoi False,
             l'image en question est sautee.
+        read : boolean or callable, optional
+            Si False, les images sur le disque ne sont pas lues ni verifiees,
+            leur chemin est cede a la place de leur contenu. Si c'est une fonction,
+            elle prend la reference de l'image et dit si il faut la lire.
 
         Yields
         ------
@@ -945,39 +1203,8 @@ class Experiment(ExperimentPickleable, Recordable):
         from laue.utilities.multi_core import RecallingIterator, prevent_generator_size
 
         def read_and_check_any_image(image_info, image_num):
-            """
-            Soit retroune directement, soit lit le fichier.
-            Retourne le nom de l'image et l'image elle-meme.
-            Renvoi None, None si il faut ignorer cette image.
-            """            
-            # Mise en forme.
-            if isinstance(image_info, str):
-                image_name = image_info
-                from laue.utilities.image import read_image
-                image = read_image(image_info, ignore_errors=self.ignore_errors)
-                if image is None:
-                    return None, None
-            elif isinstance(image_info, np.ndarray):
-                image_name = f"image_{image_num}"
-                image = image_info
-            else:
-                raise TypeError("L'image doit etre de type str ou np.array, "
-                    f"pas {type(image_info).__name__}.")
-
-            # Verifications
-            if not isinstance(image, np.ndarray):
-                raise TypeError(f"L'image doit etre un array numpy, pas un {type(image).__name__}.")
-            if image.ndim != 2:
-                raise TypeError(f"L'image {image_name} doit etre en niveau de gris pas de dimension {image.ndim}.")
-            if image.dtype != np.uint16:
-                raise TypeError(f"L'image {image_name} doit etre encodee en uint16, pas {image.dtype}.")
-            if self._shape is None:
-                self._shape = image.shape
-            if self._shape != image.shape:
-                raise ValueError(f"L'image {image_name} a pour taille {image.shape} tandis que les images "
-                    f"precedentes ont pour taille {self._shape}. Les images ne sont pas issues de la meme experience.")
-
-            return image_name, image
+            return self._read_image_info(image_info, image_num,
+                read=(read(image_info) if callable(read) else read))
 
         def show_iterator_state(func):
             """
@@ -1083,21 +1310,678 @@ class Experiment(ExperimentPickleable, Recordable):
                 file.write(f"{repr(self)}\n")
                 file.write(f"Calibration done at {time.asctime()}.\n")
 
-    def _clean(self):
+    def save_files(self, directory, ext="cor", *, threads=4):
+        """
+        ** Ecrit un fichier ``.dat`` ou ``.cor`` par diagramme. **
+
+        Notes
+        -----
+        * Les colonnes sont calculees ici, diagramme par diagramme, pendant
+        que la mise en forme et l'ecriture se font dans un pool de threads.
+        * Le contenu des fichiers est le meme qu'avec ``laue.diagram.LaueDiagram.save_file``.
+        * Chaque fichier porte le nom de l'image de son diagramme.
+
+        Parameters
+        ----------
+        directory : str
+            Le repertoire de destination, il est cree si besoin.
+        ext : str, optional
+            L'extension des fichiers, "cor" ou "dat".
+        threads : int, optional
+            Le nombre de threads d'ecriture.
+
+        Returns
+        -------
+        list
+            Les chemins des fichiers ecrits, dans l'ordre des diagrammes.
+
+        Examples
+        --------
+        >>> import os, tempfile
+        >>> import laue
+        >>> images = "laue/examples/*.mccd"
+        >>> experiment = laue.experiment.base_experiment.Experiment(images, config_file="laue/examples/ge_blanc.det")
+        >>> filenames = experiment.save_files(tempfile.mkdtemp())
+        >>> [os.path.basename(filename) for filename in filenames]
+        ['ge_blanc.cor']
+        >>>
+        """
+        assert isinstance(directory, str), f"'directory' has to be str, not {type(directory).__name__}."
+        assert ext in {"cor", "dat"}, f"'ext' must be 'cor' or 'dat', not {ext!r}."
+        assert isinstance(threads, int), f"'threads' has to be int, not {type(threads).__name__}."
+        assert threads >= 1, f"'threads' has to be positive, not {threads}."
+
+        from concurrent.futures import ThreadPoolExecutor
+        from laue.diagram import _format_table
+
+        def write(filename, names, columns):
+            with open(filename, "w", encoding="utf-8") as file:
+                file.write(_format_table(names, columns))
+            return filename
+
+        os.makedirs(directory, exist_ok=True)
+        if ext == "cor":
+            self.set_calibration()
+        filenames, pending = [], collections.deque()
+        with ThreadPoolExecutor(threads) as executor:
+            for diag in self:
+                name = os.path.splitext(os.path.basename(diag.get_id()))[0]
+                pending.append(executor.submit(
+                    write, os.path.join(directory, f"{name}.{ext}"), *diag._get_table(ext)))
+                while len(pending) > 4*threads: # Borne la memoire des colonnes en attente.
+                    filenames.append(pending.popleft().result())
+            filenames.extend(future.result() for future in pending)
+        return filenames
+
+    def get_spot_table(self, *, cell=32.0):
+        """
+        ** La table de tous les spots de l'experience. **
+
+        Les requetes sur tout le balayage se font sur des colonnes
+        ``np.ndarray`` plutot qu'en parcourant chaque ``laue.spot.Spot``.
+        La table est une photo de l'etat courant: elle doit etre
+        redemandee apres un changement de la calibration.
+
+        Parameters
+        ----------
+        cell : float, optional
+            La taille en pxl des cases de l'index spatial.
+
+        Returns
+        -------
+        laue.experiment.spot_table.SpotTable
+            La table, indexee par intensite et par position.
+
+        Examples
+        --------
+        >>> import laue
+        >>> images = "laue/examples/*.mccd"
+        >>> experiment = laue.experiment.base_experiment.Experiment(images, config_file="laue/examples/ge_blanc.det")
+        >>> table = experiment.get_spot_table()
+        >>> len(table) == len(experiment[0])
+        True
+        >>> rows = table.select(intensity_min=1000, near=(1000, 1000), radius=30)
+        >>>
+        """
+        from laue.experiment.spot_table import SpotTable
+        return SpotTable(self, cell=cell)
+
+    def close(self):
+        """
+        ** Arrete le pool de processus des differentes etapes. **
+
+        Le pool est cree a la premiere etape parallele puis garde
+        pour les suivantes. Il est arrete ici, a la sortie d'un bloc ``with``
+        ou quand l'experience est detruite. Une etape ulterieure en relance un.
+
+        Examples
+        --------
+        >>> import laue
+        >>> experiment = laue.experiment.base_experiment.Experiment("laue/examples/*.mccd")
+        >>> experiment.close()
+        >>>
+        """
+        if self._pool_finalizer is not None:
+            self._pool_finalizer()
+        self._pool, self._pool_finalizer = None, None
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        super().__exit__(exc_type, exc_value, traceback)
+        self.close()
+
+    def _clean(self, *stages):
         """
         ** Tente de liberer de la memoire. **
 
         Supprime tous les attributs qui sont suceptibles
         de prendre de la place en memoire.
+
+        Parameters
+        ----------
+        *stages : str
+            Si elles sont fournies, seuls les resultats de ces etapes et
+            des etapes qui en dependent sont supprimes (voir ``laue.utilities.stages.STAGES``).
+            Sinon, tout ce qui est recalculable est supprime.
         """
         if self.verbose:
             print("Suppression des attributs facultatifs...")
-        self._gnomonic_matrix = None
-        for diag in self:
-            diag._clean()
+        if not stages:
+            self.cache.clear()
+        if not stages or self.stages.downstream(*stages) & {"zone_axes", "subsets"}:
+            self._forget_results()
+        diags = self if not stages else [*self._buff_diags, *self._sparse_diags.values()] # Sans en extraire.
+        for diag in diags:
+            diag._clean(*stages)
         if self.verbose:
             print("    OK: Le volume de donnees et minimum.")
 
+    def _new_cache(self):
+        """
+        ** Cree le cache des images et des tableaux derives. **
+
+        Returns
+        -------
+        laue.utilities.cache.CacheManager
+            Un cache dont le budget est fixe par ``cache_budget``.
+        """
+        from laue.utilities.cache import CacheManager
+        budget = self.kwargs.get("cache_budget", None)
+        if budget is None:
+            budget = (psutil.virtual_memory().available // 4 if psutil is not None
+                      else 2**30)
+        return CacheManager(budget, cold_budget=self.kwargs.get("cold_cache_budget", 0))
+
+    def _new_buffers(self):
+        """
+        ** Cree les memoires tampons des images et des diagrammes. **
+
+        Returns
+        -------
+        buff_images : list or laue.utilities.buffers.SpillBuffer
+            La liste ordonnees des references d'images.
+        buff_diags : list or laue.utilities.buffers.SpillBuffer
+            La liste ordonnee des diagrames lus.
+        sparse_diags : laue.utilities.buffers.SpillDict
+            Les diagrammes extraits par acces direct, a chaque rang.
+            Ils sont retrouves par leur nom sans etre relus.
+        """
+        from laue.utilities.buffers import SpillDict
+        from laue.utilities.serialization import _results_signature # Pour les points de sauvegarde.
+        window = self.kwargs.get("spill_window", None)
+        directory = self.kwargs.get("spill_dir", None)
+        sparse_diags = SpillDict(window, key=LaueDiagram.get_id, on_load=self._attach_diagram,
+            signature=_results_signature,
+            directory=(None if directory is None else os.path.join(directory, "sparse")))
+        if window is None:
+            return [], [], sparse_diags
+        from laue.utilities.buffers import SpillBuffer
+        return (
+            SpillBuffer(window, directory=(None if directory is None else os.path.join(directory, "images"))),
+            SpillBuffer(window, directory=(None if directory is None else os.path.join(directory, "diagrams")),
+                key=LaueDiagram.get_id, on_load=self._attach_diagram, signature=_results_signature),
+            sparse_diags)
+
+    def _attach_diagram(self, diagram):
+        """
+        ** Rattache a cette experience un diagramme relu depuis le disque. **
+        """
+        diagram.experiment = self
+
+    def _diagrams_ids(self):
+        """
+        ** Les noms des diagrammes deja extraits, sans les relire. **
+        """
+        if isinstance(self._buff_diags, list):
+            return [diag.get_id() for diag in self._buff_diags]
+        return self._buff_diags.keys()
+
+    def _nbr_tasks(self):
+        """
+        ** Le nombre de diagrammes de l'experience, si il est deja connu. **
+
+        Il est connu une fois toutes les images lues, ou des le debut
+        si les images sont fournies dans une liste.
+        """
+        if self._len is not None:
+            return self._len
+        if isinstance(self._images, list):
+            return self._images_offset + len(self._images)
+        return None
+
+    @contextlib.contextmanager
+    def _stage_pool(self):
+        """
+        ** Fournit le pool de processus des differentes etapes. **
+
+        Le pool est cree a la premiere etape puis reutilise par les suivantes,
+        jusqu'a ``Experiment.close``. Le nombre de processus et de threads
+        par processus est fixe par ``self.concurrency`` en fonction du nombre
+        de diagrammes, si il est connu. Pendant l'etape, le processus principal
+        n'a droit qu'aux threads d'un processus du pool
+        (voir ``laue.utilities.concurrency.sharing_cores``).
+
+        Yields
+        ------
+        laue.utilities.scheduling.WorkerPool
+            Un pool dont les processus sont surveilles. Si ``backend`` est fourni,
+            c'est un ``laue.utilities.distributed.DistributedPool``. Si un pool
+            partage est attache a l'experience (``self._shared_pool``), il est
+            utilise a la place et n'est jamais ferme par l'experience.
+        """
+        from laue.utilities.concurrency import sharing_cores
+        nbr_tasks = self._nbr_tasks()
+        if self._shared_pool is not None:
+            pool = self._shared_pool
+        else:
+            if self._pool is None:
+                if self.kwargs.get("backend", None) is not None:
+                    from laue.utilities.distributed import DistributedPool
+                    self._pool = DistributedPool(self.kwargs["backend"])
+                else:
+                    from laue.utilities.scheduling import WorkerPool
+                    self._pool = WorkerPool(**self.concurrency.pool_kwargs(nbr_tasks),
+                        max_memory=self.max_worker_memory)
+                self._pool_finalizer = weakref.finalize(self, self._pool.terminate)
+            pool = self._pool
+        with sharing_cores(self.concurrency.get_threads(nbr_tasks)):
+            try:
+                yield pool
+            except Exception:
+                if pool is self._pool: # Des taches peuvent encore l'occuper.
+                    self.close()
+                raise
+
+    def _fault_kwargs(self, stage, get_name=None):
+        """
+        ** Parametres d'ordonnancement et de tolerance aux pannes de ``scheduled_imap``. **
+
+        Parameters
+        ----------
+        stage : str
+            Le nom de l'etape, "pic_search", "zone_axes" ou "subsets".
+        get_name : callable, optional
+            Associe au rang d'une tache le nom du diagramme concerne.
+            Pour le pic search, le nom est deja dans les arguments.
+
+        Returns
+        -------
+        dict
+            Les arguments nommes ``window``, ``timeout``, ``retries``, ``degrade``,
+            ``on_failure`` et ``on_degraded``.
+
+        Notes
+        -----
+        Une tache qui ne reussit qu'avec des parametres degrades est consignee
+        dans ``self._failures``. Les axes et les grains obtenus sont ranges sous
+        les parametres degrades, pas sous ceux demandes.
+        """
+        if stage == "pic_search":
+            from laue.core.pic_search import _degrade_pic_search as degrade
+            from laue.core.pic_search import _fail_pic_search as fallback
+            from laue.core.pic_search import _recover_pic_search as recover
+        elif stage == "zone_axes":
+            from laue.core.zone_axes import _degrade_find_zone_axes as degrade
+            from laue.core.zone_axes import _fail_find_zone_axes as fallback
+            from laue.core.zone_axes import _recover_find_zone_axes as recover
+        else:
+            from laue.core.subsets import _degrade_find_subsets as degrade
+            from laue.core.subsets import _fail_find_subsets as fallback
+            from laue.core.subsets import _recover_find_subsets as recover
+
+        def on_failure(rank, args, error):
+            name = args[1][0] if get_name is None else get_name(rank)
+            self._failures.setdefault(name, {})[stage] = repr(error)
+            if self.verbose:
+                print(f"    Echec de {stage} pour {name}: {error!r}")
+            return fallback(args)
+
+        def on_degraded(rank, args, attempt, result):
+            name = args[1][0] if get_name is None else get_name(rank)
+            self._failures.setdefault(name, {})[stage] = f"degraded(attempt={attempt})"
+            if self.verbose:
+                print(f"    {stage} pour {name} degrade a la tentative {attempt}.")
+            return recover(args, result)
+
+        return {"window": self.kwargs.get("batch_size", None),
+                "timeout": self.timeout, "retries": self.retries,
+                "degrade": degrade, "on_failure": on_failure, "on_degraded": on_degraded}
+
+    def _pic_search_cost(self, args):
+        """
+        ** Cout estime d'une tache de ``_pickelable_pic_search``. **
+        """
+        (image, *_), _ = args
+        if image is None: # Si le diagramme est deja extrait.
+            return 0.0, 0
+        if isinstance(image, tuple): # Si l'image est lue par le processus de calcul.
+            return self._cost_model.pic_search(self.get_images_shape())
+        return self._cost_model.pic_search(image.shape)
+
+    def _zone_axes_cost(self, args):
+        """
+        ** Cout estime d'une tache de ``_jump_find_zone_axes``. **
+        """
+        transformer_, gnomonics, *_ = args
+        if transformer_ is None: # Si le resultat est deja connu.
+            return 0.0, 0
+        return self._cost_model.zone_axes(gnomonics.shape[-1])
+
+    def _subsets_cost(self, args):
+        """
+        ** Cout estime d'une tache de ``_jump_find_subsets``. **
+        """
+        spots_dict, axes_dict, *_ = args
+        if spots_dict is None: # Si le resultat est deja connu.
+            return 0.0, 0
+        return self._cost_model.subsets(len(spots_dict), len(axes_dict))
+
+    def _cast_to_diagram(self, spots_args, name, image=None):
+        """
+        ** Met en forme du pic search pour en faire des diagrames. **
+
+        Si le diagramme a deja ete extrait par acces direct, il est repris
+        tel quel du stock des diagrammes epars. Si le processus de calcul
+        a refuse l'image, son erreur est levee ici.
+        """
+        if isinstance(spots_args, Exception):
+            raise spots_args
+        rank = self._sparse_diags.find(name)
+        if rank is not None:
+            return self._sparse_diags.pop(rank)
+        if spots_args is None:
+            raise KeyError(f"Le diagramme {name} n'a pas ete extrait.")
+        if not isinstance(spots_args, dict): # Si la detection n'a pas ete faite par un processus de calcul.
+            spots_args = _detected_spots(spots_args)
+        laue_diagram = LaueDiagram(name, experiment=self)
+        laue_diagram._set_spots(**spots_args)
+        if image is not None:
+            if not os.path.exists(name): # Car elle ne pourra pas etre relue.
+                laue_diagram._set_image(image)
+            elif not self.kwargs.get("spill_window", None): # Sinon, l'image est relue.
+                self.cache.put(("image_xy", name), image)
+        return laue_diagram
+
+    def _pic_search_args(self):
+        """
+        ** Prepare les arguments de ``_pickelable_pic_search``. **
+
+        Seules les images dont le diagramme n'est pas encore extrait sont lues.
+        Si les processus sont epingles (``affinity``), les images sur le disque ne sont pas
+        lues ici, seul leur chemin est transmis pour que le processus de calcul les lise
+        et les verifie. Une image qu'il ignore (``ignore_errors``) lui fait rendre le nom None.
+        Les images deja traitees par acces direct ne sont pas relues, l'image est remplacee par None.
+
+        Yields
+        ------
+        args : tuple
+            Les arguments de ``laue.core.pic_search.atomic_pic_search``.
+            L'image peut etre remplacee par None ou par le triplet
+            ``(chemin, dimensions attendues, ignore_errors)``.
+        infos : tuple
+            Le nom de l'image et l'image elle-meme, ou None si elle n'est pas lue.
+        """
+        condition = lambda im_id: not any(im_id == d_id for d_id in self._diagrams_ids())
+        sparse = lambda im_id: self._sparse_diags.find(im_id) is not None
+        routed = self.concurrency.affinity is not None
+        read = lambda im_id: not (isinstance(im_id, str) and (routed or sparse(im_id)))
+        for name, image in self.read_images(condition=condition, read=read):
+            if sparse(name):
+                yield (None, self.kernel_font, self.kernel_dilate, self.threshold), (name, None)
+                continue
+            if isinstance(image, str):
+                yield (((image, self.get_images_shape(), self.ignore_errors),
+                        self.kernel_font, self.kernel_dilate, self.threshold), (name, None))
+                continue
+            yield (image, self.kernel_font, self.kernel_dilate, self.threshold), (name, image)
+
+    def _get_direct(self, rank):
+        """
+        ** Extrait un diagramme sans extraire les precedents. **
+
+        N'est possible que si les images sont fournies dans une liste.
+        Le diagramme est range dans ``self._sparse_diags`` puis repris
+        tel quel lors de l'extraction sequentielle.
+
+        Avec ``ignore_errors``, l'extraction sequentielle saute les images
+        illisibles, ce qui decale les rangs des suivantes. L'image du diagramme
+        est donc cherchee par ``Experiment._readable_position``, qui ne lit
+        aucune des images precedentes. Si l'une d'elles s'avere illisible,
+        ``Experiment._image_skipped`` corrige les rangs deja attribues.
+
+        Parameters
+        ----------
+        rank : int
+            Le rang du diagramme, eventuellement negatif.
+
+        Returns
+        -------
+        laue.diagram.LaueDiagram
+            Le diagramme de rang ``rank``, ou None si il faut passer
+            par l'extraction sequentielle.
+        """
+        if not isinstance(self._images, list):
+            return None
+        nbr = self._images_offset + len(self._images)
+        if rank < 0:
+            rank += nbr
+        if not len(self._buff_diags) <= rank < nbr:
+            return None
+        while True: # Une image illisible decale les rangs, il faut chercher a nouveau.
+            if rank in self._sparse_diags:
+                return self._sparse_diags[rank]
+            position = self._readable_position(rank) if self.ignore_errors else rank
+            if position is None:
+                return None
+            image_info = (self._buff_images[position] if position < self._images_offset
+                          else self._images[position-self._images_offset])
+            name, image = self._read_image_info(image_info, rank)
+            if image is not None:
+                break
+        from laue.core.pic_search import atomic_pic_search
+        diag = self._cast_to_diagram(
+            atomic_pic_search(image, self.kernel_font, self.kernel_dilate, self.threshold),
+            name, image)
+        self._sparse_diags[rank] = diag
+        return diag
+
+    def _readable_position(self, rank):
+        """
+        ** La position dans la liste de l'image du diagramme de rang ``rank``. **
+
+        Les fichiers qui precedent ne sont pas lus: un fichier est presume
+        lisible si il existe et qu'il n'a pas deja ete saute. La presomption est
+        gardee dans ``self._readable_images`` et corrigee par
+        ``Experiment._image_skipped``. Les tableaux ne sont jamais sautes.
+
+        Returns
+        -------
+        int
+            La position de l'image, None si il y a moins de ``rank+1`` images presumees lisibles.
+        """
+        nbr = self._images_offset + len(self._images)
+        count = 0
+        for position in range(nbr):
+            if position == len(self._readable_images):
+                image_info = (self._buff_images[position] if position < self._images_offset
+                              else self._images[position-self._images_offset])
+                self._readable_images.append(not isinstance(image_info, str)
+                    or (os.path.isfile(image_info) and image_info not in self._unreadable_images))
+            if self._readable_images[position]:
+                if count == rank:
+                    return position
+                count += 1
+        return None
+
+    def _image_skipped(self, image_info):
+        """
+        ** Prend note d'une image sautee car illisible. **
+
+        Si cette image etait presumee lisible par ``Experiment._readable_position``,
+        les diagrammes extraits par acces direct qui la suivent ont recu un rang
+        trop grand de un. Ils sont decales dans ``self._sparse_diags``.
+
+        Parameters
+        ----------
+        image_info : str
+            Le chemin de l'image sautee.
+        """
+        if not isinstance(image_info, str) or image_info in self._unreadable_images:
+            return
+        self._unreadable_images.add(image_info)
+        rank = 0 # Le rang presume de l'image.
+        for position, readable in enumerate(self._readable_images):
+            if not readable:
+                continue
+            if image_info == (self._buff_images[position] if position < self._images_offset
+                              else self._images[position-self._images_offset]):
+                self._readable_images[position] = False
+                for key in sorted(key for key in self._sparse_diags.keys() if key > rank):
+                    self._sparse_diags[key-1] = self._sparse_diags.pop(key)
+                return
+            rank += 1
+
+    def _unordered_diagrams(self):
+        """
+        ** Cede les diagrammes au fur et a mesure qu'ils sont extraits. **
+
+        Les diagrammes deja connus sont cedes en premier. Les suivants sont
+        cedes des qu'ils sont prets, puis ranges dans ``self._buff_diags``
+        par un tampon de reordonnancement afin de ne pas etre recalcules.
+
+        Yields
+        ------
+        rank : int
+            Le rang du diagramme dans l'experience.
+        diagram : laue.diagram.LaueDiagram
+            Le diagramme extrait.
+        """
+        start = len(self._buff_diags)
+        yield from itertools.islice(enumerate(self._buff_diags), start)
+        if len(self) and start >= len(self): # Si il n'y a plus rien a extraire.
+            return
+
+        if multiprocessing.current_process().name != "MainProcess":
+            yield from itertools.islice(enumerate(self), start, None)
+            return
+
+        from laue.core.pic_search import _pickelable_pic_search
+        from laue.utilities.scheduling import scheduled_imap
+        pending = {} # Les diagrammes arrives en avance, a chaque tache. None si l'image est ignoree.
+        next_task = 0 # La premiere tache dont le diagramme n'est pas encore range.
+        skippable = self.ignore_errors and self.concurrency.affinity is not None # Voir '_pic_search_args'.
+        with self._stage_pool() as pool:
+            for task, (spots_args, (name, image)) in scheduled_imap(
+                    pool, _pickelable_pic_search, self._pic_search_args(),
+                    cost=self._pic_search_cost, memory_budget=self.memory_budget,
+                    ordered=False, **self._fault_kwargs("pic_search")):
+                if name is None:
+                    self._image_skipped(image)
+                pending[task] = None if name is None else self._cast_to_diagram(spots_args, name, image)
+                ready = [] if skippable or name is None else [(start+task, pending[task])]
+                while next_task in pending: # Une image ignoree decale le rang des suivantes.
+                    diag = pending.pop(next_task)
+                    next_task += 1
+                    if diag is not None:
+                        if skippable:
+                            ready.append((len(self._buff_diags), diag))
+                        self._buff_diags.append(diag)
+                for rank, diag in ready:
+                    if self.verbose >= 2:
+                        print(f"    diagramme num {rank} extrait: "
+                              f"(...{diag.get_id()[-20:]}) avec {len(diag)} spots")
+                    yield rank, diag
+
+    def _kept_diagram(self, rank, diag):
+        """
+        ** Le diagramme de rang ``rank`` tel que le garde l'experience. **
+
+        Avec ``spill_window``, un diagramme peut etre deporte sur le disque
+        pendant que sa tache tourne. L'objet ``diag`` n'est alors plus celui
+        qui sera relu: les resultats doivent aller a la copie relue.
+
+        Parameters
+        ----------
+        rank : int
+            Le rang du diagramme dans l'experience.
+        diag : laue.diagram.LaueDiagram
+            Le diagramme tel qu'il etait au lancement de la tache.
+
+        Returns
+        -------
+        laue.diagram.LaueDiagram
+            ``diag`` lui meme si il n'est pas encore range dans ``self._buff_diags``
+            ou si il n'en est pas sorti, sinon sa version relue.
+        """
+        if rank < len(self._buff_diags):
+            return self._buff_diags[rank]
+        return diag
+
+    def _unordered_axes(self, kwds):
+        """
+        ** Cede les axes de zone au fur et a mesure qu'ils sont trouves. **
+
+        Parameters
+        ----------
+        kwds : dict
+            Les parametres de ``laue.diagram.LaueDiagram.find_zone_axes``.
+
+        Yields
+        ------
+        rank : int
+            Le rang du diagramme dans l'experience.
+        diagram : laue.diagram.LaueDiagram
+            Le diagramme considere.
+        axes : list
+            Les axes de zone de ce diagramme.
+        """
+        if multiprocessing.current_process().name != "MainProcess":
+            for rank, diag in self._unordered_diagrams():
+                yield rank, diag, diag.find_zone_axes(**kwds)
+            return
+
+        from laue.core.zone_axes import _jump_find_zone_axes
+        from laue.utilities.scheduling import scheduled_imap
+
+        tasks = {} # A chaque tache, associe le rang et le diagramme.
+        def args_gen():
+            for task, (rank, diag) in enumerate(self._unordered_diagrams()):
+                tasks[task] = (rank, diag)
+                yield diag.find_zone_axes(**kwds, _get_args=True)
+
+        with self._stage_pool() as pool:
+            for task, args in scheduled_imap(pool, _jump_find_zone_axes, args_gen(),
+                    cost=self._zone_axes_cost, memory_budget=self.memory_budget, ordered=False,
+                    **self._fault_kwargs("zone_axes", lambda task: tasks[task][1].get_id())):
+                rank, diag = tasks.pop(task)
+                diag = self._kept_diagram(rank, diag)
+                yield rank, diag, (
+                    diag.find_zone_axes(_axes_args=args)
+                    if not isinstance(args, dict) else
+                    diag.find_zone_axes(**args))
+
+    def _unordered_subsets(self, kwds):
+        """
+        ** Cede les bouts de grains au fur et a mesure qu'ils sont trouves. **
+
+        Parameters
+        ----------
+        kwds : dict
+            Les parametres de ``laue.diagram.LaueDiagram.find_subsets``.
+
+        Yields
+        ------
+        rank : int
+            Le rang du diagramme dans l'experience.
+        diagram : laue.diagram.LaueDiagram
+            Le diagramme considere.
+        subsets : list
+            Les bouts de grains de ce diagramme.
+        """
+        if multiprocessing.current_process().name != "MainProcess":
+            for rank, diag, _ in self._unordered_axes(kwds):
+                yield rank, diag, diag.find_subsets(**kwds)
+            return
+
+        from laue.core.subsets import _jump_find_subsets
+        from laue.utilities.scheduling import scheduled_imap
+
+        tasks = {} # A chaque tache, associe le rang et le diagramme.
+        def args_gen():
+            for task, (rank, diag, _) in enumerate(self._unordered_axes(kwds)):
+                tasks[task] = (rank, diag)
+                yield diag.find_subsets(**kwds, _get_args=True)
+
+        with self._stage_pool() as pool:
+            for task, args in scheduled_imap(pool, _jump_find_subsets, args_gen(),
+                    cost=self._subsets_cost, memory_budget=self.memory_budget, ordered=False,
+                    **self._fault_kwargs("subsets", lambda task: tasks[task][1].get_id())):
+                rank, diag = tasks.pop(task)
+                diag = self._kept_diagram(rank, diag)
+                yield rank, diag, (
+                    diag.find_subsets(_atomic_subsets_res=args)
+                    if not isinstance(args, dict) else
+                    diag.find_subsets(**args))
+
     def __getitem__(self, item):
         """
         ** Recupere un ou plusieurs diagrame.s. **
@@ -1113,6 +1997,11 @@ class Experiment(ExperimentPickleable, Recordable):
                 * ``slice`` => Permet de manipuler l'experience comme une
                     liste de diagrames ordones dans l'ordre de generation des images.
 
+        Notes
+        -----
+        Si les images sont fournies dans une liste (ou par une expression glob),
+        le ieme diagramme est extrait directement, sans extraire les precedents.
+
         Raises
         ------
         KeyError
@@ -1166,7 +2055,8 @@ class Experiment(ExperimentPickleable, Recordable):
             return get_diag_list(limit=limit, ignore=ignore)
 
         if isinstance(item, (int, np.integer)):
-            return get_diag_list(item)[item]
+            diag = self._get_direct(int(item))
+            return get_diag_list(item)[item] if diag is None else diag
 
         if isinstance(item, slice):
             assert item.start is None or isinstance(item.start, (int, np.integer)), \
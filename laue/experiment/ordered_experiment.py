@@ -119,17 +119,28 @@ class OrderedExperiment(Experiment):
 
         return len(self._x_dict), len(self._y_dict)
 
-    def get_index(self):
+    def get_index(self, *, extracted=False, layer=0):
         """
         ** Recupere la matrice des index d'une couche. **
 
         Utilise uniquement la fonction ``position`` fourni a l'initialisateur.
 
+        Parameters
+        ----------
+        extracted : boolean, optional
+            Si True, renvoie une grille partielle: les rangs des diagrammes
+            de la couche ``layer`` qui ne sont pas encore extraits sont masques.
+            Voir ``laue.experiment.ordered_experiment.OrderedExperiment.coarse_to_fine``.
+        layer : int, optional
+            La couche temporelle consideree quand ``extracted`` est True.
+
         Returns
         -------
         np.ndarray
             La matrice 2d ayant le role d'une fonction de N**2 dans N.
             A couple de rang (x, y) associ le rang 'ravel' du diagrame.
+            Si ``extracted`` est True, c'est un ``np.ma.MaskedArray``
+            des rangs des diagrammes de la couche ``layer``.
 
         Examples
         --------
@@ -171,6 +182,12 @@ class OrderedExperiment(Experiment):
                                   "par la fonction ``self.position``.") from err
             return min(a & b)
 
+        if extracted:
+            assert isinstance(layer, int), f"'layer' has to be int, not {type(layer).__name__}."
+            ranks = self.get_index().astype(np.int64) + layer*self._layer_size()
+            done = np.vectorize(self._is_extracted, otypes=[bool])(ranks)
+            return np.ma.masked_array(ranks, mask=~done)
+
         if self._index is not None:
             return self._index
 
@@ -184,6 +201,177 @@ class OrderedExperiment(Experiment):
             dtype=np.uint32)
         return self._index
 
+    def _layer_size(self):
+        """
+        ** Le nombre de diagrammes d'une couche temporelle. **
+        """
+        return int(np.prod(self.get_shape()))
+
+    def _is_extracted(self, rank):
+        """
+        ** True si le diagramme de rang ``rank`` est deja extrait. **
+        """
+        return rank < len(self._buff_diags) or rank in self._sparse_diags
+
+    def _coarse_to_fine_ranks(self, strides, nbr):
+        """
+        ** Les rangs des ``nbr`` premiers diagrammes, des plus espaces aux plus serres. **
+
+        Examples
+        --------
+        >>> import laue
+        >>> experiment = laue.OrderedExperiment((None,), position=lambda i: divmod(i % 16, 4))
+        >>> experiment._coarse_to_fine_ranks((2,), 16)
+        [0, 2, 8, 10, 1, 3, 4, 5, 6, 7, 9, 11, 12, 13, 14, 15]
+        >>>
+        """
+        index = self.get_index().astype(np.int64)
+        strides = sorted(set(strides) | {1}, reverse=True) # Toujours finir par tous les points.
+        seen = np.zeros(index.shape, dtype=bool)
+        layer_ranks = []
+        for stride in strides:
+            grid = np.zeros(index.shape, dtype=bool)
+            grid[::stride, ::stride] = True
+            layer_ranks.extend(index[grid & ~seen].tolist())
+            seen |= grid
+        size = index.size
+        return [rank + layer*size
+                for layer in range(-(-nbr // size))
+                for rank in layer_ranks
+                if rank + layer*size < nbr]
+
+    def coarse_to_fine(self, strides=(8, 4, 2, 1)):
+        """
+        ** Extrait les diagrammes d'un sous echantillonnage de plus en plus fin. **
+
+        Notes
+        -----
+        * Sur chaque couche, on traite d'abord un point sur ``strides[0]`` selon x et y,
+        puis un sur ``strides[1]`` parmi ceux qui restent, et ainsi de suite.
+        * Les diagrammes sont cedes des qu'ils sont extraits. L'ordre grossier vers fin
+        est respecte au paquet de taches pres (``batch_size``).
+        * Chaque diagramme n'est extrait qu'une fois, il est ensuite repris tel quel
+        par les iterations ordinaires, le debit total est donc inchange.
+        * Pendant l'iteration, ``get_index(extracted=True)`` et ``get_preview``
+        donnent une carte de plus en plus resolue.
+        * Les images doivent etre fournies dans une liste (ou par une expression glob).
+
+        Parameters
+        ----------
+        strides : tuple, optional
+            Les pas successifs de sous echantillonnage. Le pas 1 est toujours ajoute.
+
+        Yields
+        ------
+        rank : int
+            Le rang du diagramme dans l'experience.
+        diagram : laue.diagram.LaueDiagram
+            Le diagramme extrait, dans l'ordre grossier vers fin.
+
+        Examples
+        --------
+        >>> import numpy as np
+        >>> import laue
+        >>> images = [np.zeros((2, 2), dtype=np.uint16) for _ in range(16)]
+        >>> experiment = laue.OrderedExperiment(images, position=lambda i: divmod(i % 16, 4))
+        >>> ranks = [rank for rank, _ in experiment.coarse_to_fine(strides=(2,))]
+        >>> sorted(ranks) == list(range(16))
+        True
+        >>> bool(experiment.get_index(extracted=True).mask.any())
+        False
+        >>>
+        """
+        assert isinstance(strides, (tuple, list)), \
+            f"'strides' has to be a tuple, not a {type(strides).__name__}."
+        assert all(isinstance(stride, int) and stride >= 1 for stride in strides), \
+            f"Les pas doivent etre des entiers positifs, pas {strides}."
+        assert isinstance(self._images, list), ("Les images doivent etre fournies "
+            f"dans une liste, pas un {type(self._images).__name__}.")
+
+        nbr = self._images_offset + len(self._images)
+        ranks = self._coarse_to_fine_ranks(strides, nbr)
+        for rank in ranks: # Les diagrammes deja connus.
+            if self._is_extracted(rank):
+                yield rank, (self._buff_diags[rank] if rank < len(self._buff_diags)
+                             else self._sparse_diags[rank])
+
+        task_ranks = [] # Le rang de chaque tache.
+        def args_gen():
+            for rank in ranks:
+                if self._is_extracted(rank):
+                    continue
+                image_info = (self._buff_images[rank] if rank < self._images_offset
+                              else self._images[rank-self._images_offset])
+                name, image = self._read_image_info(image_info, rank)
+                if image is None: # Une image illisible decale les rangs, on la laisse.
+                    continue
+                task_ranks.append(rank)
+                yield (image, self.kernel_font, self.kernel_dilate, self.threshold), (name, image)
+
+        from laue.core.pic_search import _pickelable_pic_search
+        from laue.utilities.scheduling import scheduled_imap
+        with self._stage_pool() as pool:
+            for task, (spots_args, (name, image)) in scheduled_imap(
+                    pool, _pickelable_pic_search, args_gen(),
+                    cost=self._pic_search_cost, memory_budget=self.memory_budget,
+                    ordered=False, **self._fault_kwargs("pic_search")):
+                rank = task_ranks[task]
+                diag = self._cast_to_diagram(spots_args, name, image)
+                if rank >= len(self._buff_diags): # Sinon, deja extrait entre temps.
+                    self._sparse_diags[rank] = diag
+                yield rank, diag
+
+    def get_preview(self, func=len, *, layer=0, fill=True):
+        """
+        ** Carte d'une grandeur calculee sur les diagrammes deja extraits. **
+
+        Parameters
+        ----------
+        func : callable, optional
+            Associe a chaque diagramme ``laue.diagram.LaueDiagram`` un flottant.
+            Par defaut, c'est le nombre de spots.
+        layer : int, optional
+            La couche temporelle consideree.
+        fill : boolean, optional
+            Si True, chaque point pas encore extrait prend la valeur du point
+            extrait le plus proche, ce qui donne une carte basse resolution.
+            Sinon, les points manquants sont masques.
+
+        Returns
+        -------
+        np.ndarray
+            La carte de shape ``self.get_shape()``, ``np.ma.MaskedArray`` si ``fill`` est False.
+            Si aucun diagramme n'est extrait, toute la carte est a ``nan``.
+
+        Examples
+        --------
+        >>> import numpy as np
+        >>> import laue
+        >>> images = [np.zeros((2, 2), dtype=np.uint16) for _ in range(16)]
+        >>> experiment = laue.OrderedExperiment(images, position=lambda i: divmod(i % 16, 4))
+        >>> _ = next(iter(experiment.coarse_to_fine(strides=(4,))))
+        >>> experiment.get_preview(lambda diag: 1.0)
+        array([[1., 1., 1., 1.],
+               [1., 1., 1., 1.],
+               [1., 1., 1., 1.],
+               [1., 1., 1., 1.]])
+        >>>
+        """
+        assert callable(func), "'func' has to be callable."
+        index = self.get_index(extracted=True, layer=layer)
+        values = np.full(index.shape, np.nan)
+        for (x, y), rank in np.ndenumerate(index.data):
+            if not index.mask[x, y]:
+                values[x, y] = func(self._buff_diags[rank] if rank < len(self._buff_diags)
+                                    else self._sparse_diags[rank])
+        if not fill:
+            return np.ma.masked_array(values, mask=index.mask)
+        if index.mask.all() or not index.mask.any():
+            return values
+        from scipy.ndimage import distance_transform_edt
+        _, (near_x, near_y) = distance_transform_edt(index.mask, return_indices=True)
+        return values[near_x, near_y]
+
     def __getitem__(self, item):
         """
         ** Recupere un diagrame ou un tenseur de diagrames. **
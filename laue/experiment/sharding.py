@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+
+"""
+** Decoupe une experience en morceaux independants puis les reassemble. **
+--------------------------------------------------------------------------
+
+Chaque morceau est une ``laue.experiment.base_experiment.Experiment`` ordinaire,
+qui peut etre serialisee puis traitee par un autre processus ou une autre machine.
+Seul un disque partage est necessaire. Les morceaux traites sont ensuite
+fusionnes de facon deterministe en une seule experience.
+"""
+
+import numpy as np
+
+from laue.experiment.base_experiment import Experiment
+
+
+def _all_images(experiment):
+    """
+    ** Les references de toutes les images d'une experience, dans l'ordre. **
+    """
+    assert isinstance(experiment._images, list), ("Les images doivent etre fournies "
+        f"dans une liste, pas un {type(experiment._images).__name__}.")
+    return list(experiment._buff_images[:experiment._images_offset]) + experiment._images
+
+def shard_experiment(experiment, nbr_shards, *, by="range"):
+    """
+    ** Decoupe une experience en plusieurs experiences independantes. **
+
+    Parameters
+    ----------
+    experiment : laue.experiment.base_experiment.Experiment
+        L'experience a decouper. Ses images doivent etre fournies
+        dans une liste (ou par une expression glob).
+    nbr_shards : int
+        Le nombre de morceaux.
+    by : str, optional
+        * "range" : Chaque morceau est une plage contigue de rangs.
+        * "region" : Chaque morceau est une bande de la grille du balayage.
+        L'experience doit alors etre une ``laue.experiment.ordered_experiment.OrderedExperiment``.
+
+    Returns
+    -------
+    list
+        Les morceaux, de type ``laue.experiment.base_experiment.Experiment``.
+        Ils heritent des parametres et de la calibration de ``experiment``.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> import laue
+    >>> from laue.experiment.sharding import shard_experiment
+    >>> images = [np.zeros((2, 2), dtype=np.uint16) for _ in range(12)]
+    >>> experiment = laue.OrderedExperiment(images, position=lambda i: divmod(i, 4))
+    >>> [shard._shard_ranks for shard in shard_experiment(experiment, 3)]
+    [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9, 10, 11]]
+    >>> [shard._shard_ranks for shard in shard_experiment(experiment, 2, by="region")]
+    [[0, 1, 2, 3, 4, 5, 6, 7], [8, 9, 10, 11]]
+    >>>
+    """
+    assert isinstance(experiment, Experiment), \
+        f"'experiment' has to be an Experiment, not a {type(experiment).__name__}."
+    assert isinstance(nbr_shards, int), f"'nbr_shards' has to be int, not {type(nbr_shards).__name__}."
+    assert nbr_shards >= 1, f"Il faut au moins un morceau, pas {nbr_shards}."
+    assert by in {"range", "region"}, f"'by' must be 'range' or 'region', not {by!r}."
+
+    images = _all_images(experiment)
+    if by == "range":
+        groups = np.array_split(np.arange(len(images)), nbr_shards)
+    else:
+        from laue.experiment.ordered_experiment import OrderedExperiment
+        assert isinstance(experiment, OrderedExperiment), \
+            "Le decoupage par region necessite une OrderedExperiment."
+        x_coords = np.array([experiment.position(rank)[0] for rank in range(len(images))])
+        bands = np.array_split(np.unique(x_coords), nbr_shards)
+        groups = [np.flatnonzero(np.isin(x_coords, band)) for band in bands]
+
+    shards = []
+    for ranks in groups:
+        if not len(ranks):
+            continue
+        shard = Experiment([images[rank] for rank in ranks],
+            verbose=experiment.verbose, **experiment.kwargs)
+        shard._shard_ranks = ranks.tolist()
+        shard._calibration_parameters = experiment._calibration_parameters
+        shard._shape = experiment._shape
+        shards.append(shard)
+    return shards
+
+def merge_experiments(shards, *, into=None):
+    """
+    ** Fusionne les morceaux traites d'une experience. **
+
+    Notes
+    -----
+    * Les diagrammes sont ranges selon leur rang dans l'experience d'origine,
+    quel que soit l'ordre des morceaux. Les noms des images en memoire
+    dependent du rang, ils sont renommes, comme les echecs qui y sont rattaches.
+    * La calibration retenue est celle de ``into`` si elle existe, sinon celle
+    du morceau qui contient le plus petit rang. Les resultats des diagrammes
+    obtenus avec une autre calibration sont vides, leurs spots sont conserves.
+    * L'etat fusionne reprend la structure de ``laue.utilities.serialization.ExperimentPickleable``.
+
+    Parameters
+    ----------
+    shards : iterable
+        Les morceaux issus de ``shard_experiment``, eventuellement deserialises.
+    into : laue.experiment.base_experiment.Experiment, optional
+        L'experience qui a ete decoupee. Si elle est fournie, le resultat
+        est du meme type et en reprend l'etat, sinon c'est une experience simple.
+        Elle n'est pas modifiee.
+
+    Returns
+    -------
+    laue.experiment.base_experiment.Experiment
+        Une nouvelle experience qui contient tous les diagrammes extraits.
+
+    Raises
+    ------
+    ValueError
+        Si deux morceaux se recouvrent, ou si il en manque alors que ``into`` n'est pas fourni.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> import laue
+    >>> from laue.experiment.sharding import merge_experiments, shard_experiment
+    >>> images = [np.zeros((2, 2), dtype=np.uint16) for _ in range(6)]
+    >>> shards = shard_experiment(laue.Experiment(images), 2)
+    >>> for shard in shards[::-1]:
+    ...     _ = shard.get_diagrams()
+    ...
+    >>> for shard in shards:
+    ...     shard._failures["image_1"] = {"pic_search": "ValueError()"}
+    ...
+    >>> merged = merge_experiments(shards[::-1])
+    >>> [diag.get_id() for diag in merged]
+    ['image_0', 'image_1', 'image_2', 'image_3', 'image_4', 'image_5']
+    >>> sorted(merged._failures)
+    ['image_1', 'image_4']
+    >>>
+    """
+    shards = sorted(shards, key=lambda shard: min(shard._shard_ranks, default=0))
+    assert shards, "Il faut au moins un morceau."
+    assert all(shard._shard_ranks is not None for shard in shards), \
+        "Seuls les morceaux issus de 'shard_experiment' peuvent etre fusionnes."
+    assert into is None or isinstance(into, Experiment), \
+        f"'into' has to be an Experiment, not a {type(into).__name__}."
+
+    # Calibration commune.
+    calibration = None if into is None else into._calibration_parameters
+    if calibration is None:
+        calibration = next((shard._calibration_parameters for shard in shards
+                            if shard._calibration_parameters is not None), None)
+
+    # Rangement des images et des diagrammes selon leur rang global.
+    images, diags, failures = {}, {}, {}
+    for shard in shards:
+        local_diags = dict(enumerate(shard._buff_diags))
+        local_diags.update(shard._sparse_diags)
+        names = {} # Les noms locaux qui dependent du rang, et leur nom global.
+        for local, (rank, image) in enumerate(zip(shard._shard_ranks, _all_images(shard))):
+            if rank in images:
+                raise ValueError(f"Le rang {rank} est present dans plusieurs morceaux.")
+            images[rank] = image
+            if isinstance(image, np.ndarray): # Le nom depend du rang.
+                names[f"image_{local}"] = f"image_{rank}"
+            if local not in local_diags:
+                continue
+            diag = local_diags[local]
+            if isinstance(image, np.ndarray):
+                diag._name = names[f"image_{local}"]
+            if shard._calibration_parameters != calibration:
+                diag._clean("calibration") # Les spots restent valables.
+            diags[rank] = diag
+        failures.update((names.get(name, name), stages) for name, stages in shard._failures.items())
+
+    if into is None and sorted(images) != list(range(len(images))):
+        raise ValueError("Sans 'into', tous les morceaux doivent etre fournis. "
+            f"Il manque les rangs {sorted(set(range(max(images)+1)) - set(images))}.")
+    all_images = _all_images(into) if into is not None else [images[rank] for rank in range(len(images))]
+    prefix = 0 # Le nombre de diagrammes consecutifs depuis le debut.
+    while prefix in diags:
+        prefix += 1
+
+    state = (into if into is not None else shards[0]).__getstate__()
+    state["images"] = {"type": "list", "_images": all_images, "_buffer": all_images[:prefix]}
+    state["buff_diags"] = [diags[rank] for rank in range(prefix)]
+    state["len"] = len(all_images) if prefix == len(all_images) else None
+    state["shape"] = next((shard._shape for shard in shards if shard._shape is not None), state["shape"])
+    state["calibration_parameters"] = calibration
+    state["gnomonic_matrix"] = None
+    state["failures"] = {**state["failures"], **failures} if into is not None else failures
+    state["shard_ranks"] = None
+
+    cls = Experiment if into is None else type(into)
+    merged = cls.__new__(cls)
+    merged.__setstate__(state)
+    for rank, diag in diags.items():
+        if rank >= prefix:
+            diag.experiment = merged
+            merged._sparse_diags[rank] = diag
+    return merged
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+
+"""
+** Table de tous les spots d'une experience. **
+-----------------------------------------------
+
+Les grandeurs des spots de tous les diagrammes sont rangees dans des
+tableaux contigus, une ligne par spot. Les requetes et les statistiques
+sur tout le balayage se font alors a la vitesse de numpy, sans parcourir
+les objets ``laue.spot.Spot``.
+"""
+
+import numpy as np
+
+
+class SpotTable:
+    """
+    ** Colonnes des spots de toute une experience, avec des index. **
+
+    Notes
+    -----
+    * Les colonnes sont "diagram" (rang du diagramme), "spot" (rang du spot
+    dans son diagramme), "x", "y", "intensity", "quality", "distortion" et si
+    la camera est calibree "gnomonic_x", "gnomonic_y", "theta" et "chi".
+    * Les lignes d'un meme diagramme sont contigues, dans l'ordre des spots.
+    * Deux index sont construits a la premiere requete qui en a besoin:
+    les lignes triees par intensite, et une grille spatiale ou chaque case
+    regroupe les spots d'un meme diagramme.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> import laue
+    >>> images = [np.zeros((64, 64), dtype=np.uint16) for _ in range(3)]
+    >>> for i, image in enumerate(images):
+    ...     image[10:13, 10:13] = 1000
+    ...     image[40+i:43+i, 50:53] = 3000
+    ...
+    >>> table = laue.Experiment(images).get_spot_table()
+    >>> len(table), table["diagram"].tolist()
+    (6, [0, 0, 1, 1, 2, 2])
+    >>> rows = table.select(intensity_min=20000, near=(51, 41), radius=1)
+    >>> table["diagram"][rows].tolist()
+    [0, 1]
+    >>> [spot.get_bbox() for spot in table.get_spots(rows)]
+    [(48, 38, 7, 7), (48, 39, 7, 7)]
+    >>>
+    """
+    def __init__(self, experiment, *, cell=32.0):
+        """
+        Parameters
+        ----------
+        experiment : laue.experiment.base_experiment.Experiment
+            L'experience dont tous les diagrammes sont extraits si besoin.
+        cell : float, optional
+            La taille en pxl des cases de la grille spatiale.
+        """
+        from laue.experiment.base_experiment import Experiment
+        assert isinstance(experiment, Experiment), \
+            f"'experiment' has to be an Experiment, not a {type(experiment).__name__}."
+        assert isinstance(cell, (int, float)), f"'cell' has to be a number, not {type(cell).__name__}."
+        assert cell > 0, f"'cell' has to be positive, not {cell}."
+
+        self.experiment = experiment
+        self.cell = float(cell)
+        calibrated = experiment._calibration_parameters is not None
+
+        columns = {name: [] for name in ("x", "y", "intensity", "quality", "distortion")}
+        if calibrated:
+            columns.update({name: [] for name in ("gnomonic_x", "gnomonic_y", "theta", "chi")})
+        counts = []
+        for diag in experiment:
+            nbr = len(diag)
+            counts.append(nbr)
+            if not nbr:
+                continue
+            x, y = np.reshape(diag.get_positions(), (2, nbr))
+            columns["x"].append(x)
+            columns["y"].append(y)
+            columns["intensity"].append(diag._intensities)
+            columns["quality"].append(diag._qualities)
+            columns["distortion"].append(diag._distortions)
+            if calibrated:
+                gnomonic_x, gnomonic_y = np.reshape(diag.get_gnomonic_positions(), (2, nbr))
+                theta, chi = np.reshape(diag.get_theta_chi(), (2, nbr))
+                columns["gnomonic_x"].append(gnomonic_x)
+                columns["gnomonic_y"].append(gnomonic_y)
+                columns["theta"].append(theta)
+                columns["chi"].append(chi)
+
+        self._offsets = np.zeros(len(counts)+1, dtype=np.int64)
+        self._offsets[1:] = np.cumsum(counts)
+        self._columns = {name: (np.concatenate(parts).astype(np.float64) if parts else np.empty(0))
+                         for name, parts in columns.items()}
+        self._columns["diagram"] = np.repeat(np.arange(len(counts), dtype=np.int32), counts)
+        self._columns["spot"] = (np.arange(self._offsets[-1], dtype=np.int64)
+                                 - np.repeat(self._offsets[:-1], counts)).astype(np.int32)
+
+        self._by_intensity = None # Les lignes triees par intensite croissante.
+        self._grid_keys = None # Les clefs (case, diagramme) triees.
+        self._grid_rows = None # Les lignes dans l'ordre des clefs.
+
+    def _intensity_index(self):
+        """
+        ** Les lignes triees par intensite, et les intensites triees. **
+        """
+        if self._by_intensity is None:
+            self._by_intensity = np.argsort(self._columns["intensity"], kind="stable")
+        return self._by_intensity, self._columns["intensity"][self._by_intensity]
+
+    def _cell_ids(self, cx, cy):
+        """
+        ** Numero de chaque case, les cases d'une meme ligne sont voisines. **
+        """
+        return cx.astype(np.int64) * (1 << 20) + cy.astype(np.int64)
+
+    def _grid_index(self):
+        """
+        ** La grille spatiale, triee par case puis par diagramme. **
+        """
+        if self._grid_keys is None:
+            cx = np.floor(self._columns["x"] / self.cell)
+            cy = np.floor(self._columns["y"] / self.cell)
+            keys = self._cell_ids(cx, cy) * self.get_nbr_diagrams() + self._columns["diagram"]
+            self._grid_rows = np.argsort(keys, kind="stable")
+            self._grid_keys = keys[self._grid_rows]
+        return self._grid_keys, self._grid_rows
+
+    def _near(self, x, y, radius, diagrams=None):
+        """
+        ** Les lignes des spots a moins de ``radius`` pxl de ``(x, y)``. **
+        """
+        keys, rows = self._grid_index()
+        nbr_diags = self.get_nbr_diagrams()
+        cx_min, cx_max = int(np.floor((x-radius)/self.cell)), int(np.floor((x+radius)/self.cell))
+        cy_min, cy_max = int(np.floor((y-radius)/self.cell)), int(np.floor((y+radius)/self.cell))
+        ranges = []
+        for cx in range(cx_min, cx_max+1):
+            # Les cases d'une meme colonne sont contigues dans l'index.
+            start = int(self._cell_ids(np.array(cx), np.array(cy_min))) * nbr_diags
+            stop = int(self._cell_ids(np.array(cx), np.array(cy_max))+1) * nbr_diags
+            if diagrams is None:
+                ranges.append(rows[np.searchsorted(keys, start):np.searchsorted(keys, stop)])
+            else:
+                for cell_id in range(start//nbr_diags, stop//nbr_diags):
+                    bounds = np.searchsorted(keys, cell_id*nbr_diags + np.stack([diagrams, diagrams+1]))
+                    ranges.extend(rows[lo:hi] for lo, hi in bounds.T if hi > lo)
+        candidates = np.concatenate(ranges) if ranges else np.empty(0, dtype=np.int64)
+        dist2 = (self._columns["x"][candidates]-x)**2 + (self._columns["y"][candidates]-y)**2
+        return candidates[dist2 <= radius**2]
+
+    def get_columns(self):
+        """
+        ** Les noms des colonnes disponibles. **
+        """
+        return sorted(self._columns)
+
+    def get_nbr_diagrams(self):
+        """
+        ** Le nombre de diagrammes de la table, meme sans spot. **
+        """
+        return len(self._offsets) - 1
+
+    def get_rows(self, diagram):
+        """
+        ** Les lignes des spots d'un diagramme. **
+
+        Returns
+        -------
+        slice
+            Une tranche a appliquer aux colonnes.
+        """
+        return slice(int(self._offsets[diagram]), int(self._offsets[diagram+1]))
+
+    def get_spots(self, rows):
+        """
+        ** Les objets ``laue.spot.Spot`` qui correspondent a des lignes. **
+        """
+        diagrams, spots = self._columns["diagram"][rows], self._columns["spot"][rows]
+        return [self.experiment[int(diag)][int(spot)] for diag, spot in zip(diagrams, spots)]
+
+    def per_diagram(self, column, rows=None, *, reduce=np.add):
+        """
+        ** Reduit une colonne diagramme par diagramme. **
+
+        Parameters
+        ----------
+        column : str
+            Le nom de la colonne a reduire.
+        rows : np.ndarray, optional
+            Les lignes a prendre en compte, par defaut toutes.
+        reduce : np.ufunc, optional
+            La reduction a appliquer, par defaut la somme.
+
+        Returns
+        -------
+        np.ndarray
+            Une valeur par diagramme. Les diagrammes sans ligne prennent
+            l'element neutre de ``reduce``, ou NaN si il n'y en a pas.
+
+        Examples
+        --------
+        >>> import numpy as np
+        >>> import laue
+        >>> images = [np.zeros((64, 64), dtype=np.uint16) for _ in range(2)]
+        >>> images[1][10:13, 10:13] = 1000
+        >>> table = laue.Experiment(images).get_spot_table()
+        >>> table.per_diagram("intensity").tolist()
+        [0.0, 9000.0]
+        >>> table.per_diagram("intensity", reduce=np.maximum).tolist()
+        [nan, 9000.0]
+        >>>
+        """
+        values = self._columns[column] if rows is None else self._columns[column][rows]
+        diagrams = self._columns["diagram"] if rows is None else self._columns["diagram"][rows]
+        result = np.full(self.get_nbr_diagrams(),
+            np.nan if reduce.identity is None else reduce.identity, dtype=np.float64)
+        if len(values):
+            order = np.argsort(diagrams, kind="stable")
+            diagrams, values = diagrams[order], values[order]
+            starts = np.flatnonzero(np.concatenate(([True], diagrams[1:] != diagrams[:-1])))
+            result[diagrams[starts]] = reduce.reduceat(values, starts)
+        return result
+
+    def select(self, *, intensity_min=None, intensity_max=None, quality_min=None,
+        near=None, radius=None, diagrams=None):
+        """
+        ** Les lignes des spots qui verifient tous les criteres. **
+
+        Parameters
+        ----------
+        intensity_min, intensity_max : float, optional
+            Les bornes de l'intensite, incluses. Utilise l'index des intensites.
+        quality_min : float, optional
+            La qualite minimale.
+        near : tuple, optional
+            La position ``(x, y)`` en pxl autour de laquelle chercher.
+            Utilise la grille spatiale.
+        radius : float, optional
+            La distance maximale a ``near`` en pxl.
+        diagrams : iterable, optional
+            Les rangs des diagrammes a considerer, par defaut tous.
+
+        Returns
+        -------
+        np.ndarray
+            Les lignes selectionnees, dans l'ordre croissant.
+        """
+        assert (near is None) == (radius is None), "'near' et 'radius' vont ensemble."
+        if diagrams is not None:
+            diagrams = np.unique(np.asarray(list(diagrams), dtype=np.int64))
+
+        candidates = None
+        if near is not None:
+            candidates = self._near(float(near[0]), float(near[1]), float(radius), diagrams)
+        if intensity_min is not None or intensity_max is not None:
+            order, values = self._intensity_index()
+            start = 0 if intensity_min is None else np.searchsorted(values, intensity_min, side="left")
+            stop = len(values) if intensity_max is None else np.searchsorted(values, intensity_max, side="right")
+            found = order[start:stop]
+            candidates = found if candidates is None else np.intersect1d(candidates, found)
+        if candidates is None:
+            candidates = np.arange(self._offsets[-1])
+
+        candidates = np.sort(candidates)
+        mask = np.ones(len(candidates), dtype=bool)
+        if quality_min is not None:
+            mask &= self._columns["quality"][candidates] >= quality_min
+        if diagrams is not None and near is None:
+            mask &= np.isin(self._columns["diagram"][candidates], diagrams)
+        return candidates[mask]
+
+    def __getitem__(self, column):
+        """
+        ** La colonne ``column``, de type ``np.ndarray``. **
+        """
+        return self._columns[column]
+
+    def __len__(self):
+        """
+        ** Le nombre total de spots. **
+        """
+        return int(self._offsets[-1])
+
+    def __repr__(self):
+        return f"SpotTable(nbr_diagrams={self.get_nbr_diagrams()}, nbr_spots={len(self)})"
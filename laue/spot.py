@@ -9,7 +9,6 @@ d'avoir un code vraiment plus clair, ce qui est privilegie a une performance
 legerement amoindrie.
 """
 
-import math
 import numbers
 
 import numpy as np
@@ -26,6 +25,8 @@ def distance(spot1, spot2, *, space="camera", dtype=np.float64):
     ** Calcul la distance entre plusieur spots. **
 
     C'est une generalisation de la methode ``Spot.__sub__``.
+    Pour des tableaux de coordonnees, ``laue.core.neighbors.pairwise_distances``
+    evite les conversions et sait ne garder que les plus proches voisins.
 
     Les formules de calcul des distances sont les suivantes:
     \[ distance\_camera = \sqrt{(pxl\_spot1_x - pxl\_spot2_x)^2 - (pxl\_spot1_y - pxl\_spot2_y)^2} \]
@@ -160,8 +161,17 @@ def distance(spot1, spot2, *, space="camera", dtype=np.float64):
 class Spot(SpotPickleable):
     """
     Represente un spot sur un diagramme de laue.
+
+    Notes
+    -----
+    * Un spot n'est qu'une vue sur une ligne des tableaux de son
+    diagramme ``laue.diagram.LaueDiagram``. Il ne contient que son
+    diagramme et son rang, toutes les grandeurs sont lues dans le diagramme.
+    * Deux vues sur le meme rang d'un meme diagramme sont egales.
     """
-    def __init__(self, bbox, spot_im, distortion, diagram, identifier):
+    __slots__ = ("diagram", "_index")
+
+    def __init__(self, diagram, identifier):
         """
         ** Initialisation du spot. **
 
@@ -176,31 +186,41 @@ class Spot(SpotPickleable):
 
         Parameters
         ----------
-        bbox : tuple
-            Bounding Boxe (x, y, w, h) du spot dans l'image.
-        spot_im : np.ndarray(np.uint16)
-            Le bout de l'image en niveau de gris qui represente le spot.
-            Le fond diffus doit etre deja enleve de l'image.
-        distortion : float
-            Le facteur de distortion accessible par l'accesseur ``Spot.get_distortion``.
         diagram : LaueDiagram
-            Le diagram qui contient ces spots. De sorte a pouvoir remonter.
+            Le diagram qui contient les grandeurs de ce spot.
         identifier : int
             Le rang de ce spot au sein du diagrame.
         """
-        # Constantes.
-        self.x, self.y, self.w, self.h = bbox
-        self._spot_im = spot_im
-        self._distortion = distortion # Facteur de diformite.
         self.diagram = diagram # Le conteneur.
-        self._identifier = identifier # Le rang.
+        self._index = identifier # Le rang.
+
+    @property
+    def x(self):
+        """
+        ** Abscisse du coin de la boite, en pxl. **
+        """
+        return int(self.diagram._bbox[self._index, 0])
+
+    @property
+    def y(self):
+        """
+        ** Ordonnee du coin de la boite, en pxl. **
+        """
+        return int(self.diagram._bbox[self._index, 1])
+
+    @property
+    def w(self):
+        """
+        ** Largeur de la boite, en pxl. **
+        """
+        return int(self.diagram._bbox[self._index, 2])
 
-        # Declaration des variables futur.
-        self._intensity = None # Intensite du spot.
-        self._position = None # Coordonnees x, y du baricentre dans le plan de la camera.
-        self._gnomonic = None # Coordonnees x, y du baricentre projete dans le plan gnomonic.
-        self._thetachi = None # Angles du rayon diffractes ayant engendre ce point.
-        self._quality = None # Beautee du point.
+    @property
+    def h(self):
+        """
+        ** Hauteur de la boite, en pxl. **
+        """
+        return int(self.diagram._bbox[self._index, 3])
 
     def get_bbox(self):
         """
@@ -224,7 +244,7 @@ class Spot(SpotPickleable):
         (1368, 1873, 6, 5)
         >>>
         """
-        return self.x, self.y, self.w, self.h
+        return tuple(self.diagram._bbox[self._index].tolist())
 
     def get_distortion(self):
         r"""
@@ -249,7 +269,7 @@ class Spot(SpotPickleable):
         0.8472
         >>>
         """
-        return self._distortion
+        return self.diagram._distortions[self._index]
 
     def get_gnomonic(self):
         """
@@ -274,13 +294,8 @@ class Spot(SpotPickleable):
         array([ 0.314 , -0.4397])
         >>>
         """
-        if self._gnomonic is not None:
-            return self._gnomonic
-        detector_parameters = self.diagram.experiment.set_calibration()
-        xg, yg = self.diagram.experiment.transformer.cam_to_gnomonic(
-            *self.get_position(), detector_parameters)
-        self._gnomonic = (xg, yg)
-        return self._gnomonic
+        xg, yg = self.diagram._get_coords("gnomonic", np.array([self._index])).ravel().tolist()
+        return xg, yg
 
     def get_id(self):
         """
@@ -297,7 +312,7 @@ class Spot(SpotPickleable):
         True
         >>>
         """
-        return self._identifier
+        return self._index
 
     def get_image(self):
         """
@@ -323,7 +338,7 @@ class Spot(SpotPickleable):
                [  5,   3,   3,   9,  14,   7]], dtype=uint16)
         >>>
         """
-        return self._spot_im
+        return self.diagram._get_spot_image(self._index)
 
     def get_intensity(self):
         r"""
@@ -348,10 +363,7 @@ class Spot(SpotPickleable):
         814
         >>>
         """
-        if self._intensity is not None:
-            return self._intensity
-        self._intensity = self.get_image().sum()
-        return self._intensity
+        return self.diagram._intensities[self._index]
 
     def get_position(self):
         r"""
@@ -376,12 +388,7 @@ class Spot(SpotPickleable):
         array([1370.5172, 1874.7801])
         >>>
         """
-        if self._position is not None:
-            return self._position
-        x, y = (self.get_image()/self.get_intensity() * np.array(np.meshgrid(
-                np.arange(self.x, self.x+self.w), np.arange(self.y, self.y+self.h)))
-                ).reshape((2, -1)).sum(axis=1)
-        self._position = (x, y)
+        x, y = self.diagram._get_positions(np.array([self._index])).ravel().tolist()
         return x, y
 
     def get_quality(self):
@@ -406,19 +413,7 @@ class Spot(SpotPickleable):
         0.57
         >>>
         """
-        if self._quality is not None:
-            return self._quality
-
-        cout_ref = 100_000
-        val_cout_ref = 0.95
-        distortion_weight = 0.667
-
-        a = -math.log(1-val_cout_ref) / cout_ref
-        self._quality = (
-            (1-distortion_weight)
-          * (1 - math.exp(-a*self.get_intensity()))
-          + distortion_weight*self.get_distortion())
-        return self._quality
+        return float(self.diagram._qualities[self._index])
 
     def get_theta_chi(self):
         """
@@ -447,13 +442,8 @@ class Spot(SpotPickleable):
         array([ 25., -25.])
         >>>
         """
-        if self._thetachi is not None:
-            return self._thetachi
-        detector_parameters = self.diagram.experiment.set_calibration()
-        theta, chi = self.diagram.experiment.transformer.cam_to_thetachi(
-            *self.get_position(), detector_parameters)
-        self._thetachi = (theta, chi)
-        return self._thetachi
+        theta, chi = self.diagram._get_coords("thetachi", np.array([self._index])).ravel().tolist()
+        return theta, chi
 
     def find_zone_axes(self, **kwds):
         """
@@ -480,10 +470,8 @@ class Spot(SpotPickleable):
         <class 'laue.zone_axis.ZoneAxis'>
         >>>
         """
-        return {
-            zone_axis for zone_axis
-            in self.diagram.find_zone_axes(**kwds)
-            if self in zone_axis}
+        axes = self.diagram.find_zone_axes(**kwds)
+        return {axes[row] for row in self.diagram._get_incidence(axes).get_axes(self._index).tolist()}
 
     def plot_gnomonic(self, axe_pyplot=None, *, display=True):
         """
@@ -597,20 +585,6 @@ class Spot(SpotPickleable):
         hkls, scores = self.diagram.predict_hkl(*args, **kwds)
         return tuple(hkls[self.get_id()]), scores[self.get_id()]
 
-    def _clean(self):
-        """
-        ** Vide les attributs recaculables. **
-
-        Cela permet de rafraichir la valeur des attributs qui dependent
-        d'une grandeur exterieur qui aurait changee. (Comme par example
-        les parametres de set_calibration.)
-        """
-        self._gnomonic = None # Si jamais la set_calibration change.
-        self._thetachi = None # Si jamais la set_calibration change.
-        self._intensity = None # Si jamais l'image change.
-        self._position = None # Si jamais l'image change.
-        self._quality = None # Car on vient de changer 'self._intensity'.
-
     def __hash__(self):
         """
         ** Permet de faire des tables de hachage. **
@@ -620,7 +594,15 @@ class Spot(SpotPickleable):
         int
             Identifiant "unique" (du moins le plus possible) representant ce spot.
         """
-        return hash((*self.get_position(), self.get_intensity()))
+        return hash((id(self.diagram), self._index))
+
+    def __eq__(self, other):
+        """
+        ** Deux spots sont egaux si ils sont le meme rang du meme diagramme. **
+        """
+        if not isinstance(other, Spot):
+            return NotImplemented
+        return self.diagram is other.diagram and self._index == other._index
 
     def __repr__(self):
         """
@@ -10,6 +10,7 @@ Les resultats des tests pousses sont ecrit dans le fichier 'tests_results.txt'
 # https://docs.pytest.org/en/6.2.x/reference.html
 
 import itertools
+import multiprocessing
 import os
 import sys
 import time
@@ -53,6 +54,54 @@ def _find_images_dir(images_min=10, root=os.path.expanduser("~")):
         globals()["images_iterator"] = iter(generator())
     return RecallingIterator(globals()["images_iterator"])
 
+SYNTHETIC_PARAMETERS = {"dd": 70.0, "xcen": 256.0, "ycen": 256.0, "xbet": 0.0, "xgam": 0.0, "pixelsize": 0.08}
+
+def _synthetic_images(nbr, seed=0):
+    """
+    ** Genere des images dont les spots sont alignes sur des axes de zone. **
+
+    Les spots sont tires sur des droites du plan gnomonic puis projetes sur
+    une camera de 512*512 pxl calibree par ``SYNTHETIC_PARAMETERS``.
+
+    Parameters
+    ----------
+    nbr : int
+        Le nombre d'images.
+    seed : int
+        La graine du generateur aleatoire.
+
+    Returns
+    -------
+    list
+        Les images ``np.ndarray`` de type uint16.
+    """
+    from laue.core.geometry.transformer import Transformer
+    from laue.utilities.parsing import extract_parameters
+
+    rng = np.random.default_rng(seed)
+    parameters = extract_parameters(**SYNTHETIC_PARAMETERS)
+    transformer = Transformer()
+    x_gnom, _ = transformer.cam_to_gnomonic(
+        np.array([0., 511, 0, 511]), np.array([0., 0, 511, 511]), parameters)
+    y_grid, x_grid = np.mgrid[-7:8, -7:8]
+
+    images = []
+    for _ in range(nbr):
+        image = rng.normal(1000, 30, size=(512, 512))
+        points = []
+        for _ in range(rng.integers(4, 9)):
+            start, end = rng.uniform(min(x_gnom), max(x_gnom), (2, 2))
+            points += [start + t*(end-start) for t in rng.uniform(0, 1, rng.integers(6, 15))]
+        x_cam, y_cam = transformer.gnomonic_to_cam(*np.array(points).T, parameters)
+        for x_0, y_0 in zip(x_cam, y_cam):
+            if not (10 < x_0 < 500 and 10 < y_0 < 500):
+                continue
+            x_i, y_i = int(round(x_0)), int(round(y_0))
+            image[y_i-7:y_i+8, x_i-7:x_i+8] += rng.uniform(2000, 20000) * np.exp(
+                -((x_grid+x_i-x_0)**2 + (y_grid+y_i-y_0)**2) / 4)
+        images.append(np.clip(image, 0, 65535).astype(np.uint16))
+    return images
+
 def _timer(f):
     def f_bis(*args, **kwargs):
         ti = time.time()
@@ -79,6 +128,12 @@ def _ftime(t):
         return f"{t*1e3:.3f} ms"
     return f"{t:.3f} s"
 
+def _fthroughput(n, t, nodes=1):
+    """
+    ** Formate un debit en elements par seconde et par noeud NUMA. **
+    """
+    return f"{n/(t*nodes):.2f} diag/s/node" if t else "inf diag/s/node"
+
 class CWDasRoot:
     """
     ** Permet de se placer a la racine du module. **
@@ -372,6 +427,453 @@ def test_ordered_shape():
         experiment = OrderedExperiment(images, position=position)
         assert experiment.get_shape() == position.shape
 
+def _faulty_task(x):
+    if x == 1:
+        time.sleep(60) # Tache bloquee.
+    if x == 2:
+        os._exit(1) # Processus tue.
+    if x == 3:
+        raise ValueError("Tache qui echoue.")
+    return x
+
+def _slow_task(x):
+    time.sleep(.5)
+    return x
+
+def test_fault_tolerance():
+    _print("============ TEST FAULT TOLERANCE ============")
+    with CWDasRoot():
+        from laue.utilities.scheduling import WorkerPool, scheduled_imap
+
+    t1 = time.time()
+    with WorkerPool(2) as pool:
+        res = list(scheduled_imap(pool, _faulty_task, range(6),
+            cost=(lambda x: (0.0, 0)), timeout=2, retries=1,
+            degrade=(lambda x, attempt: -x),
+            on_failure=(lambda rank, x, err: type(err).__name__)))
+    t2 = time.time()
+    _print(f"{res}: {_ftime(t2-t1)}")
+    assert res == [0, -1, -2, -3, 4, 5]
+
+    with WorkerPool(2) as pool:
+        res = list(scheduled_imap(pool, _faulty_task, range(6),
+            cost=(lambda x: (0.0, 0)), timeout=2, retries=0,
+            on_failure=(lambda rank, x, err: type(err).__name__)))
+    assert res == [0, "TimeoutError", "WorkerLost", "ValueError", 4, 5]
+
+    with WorkerPool(2) as pool:
+        res = list(scheduled_imap(pool, _faulty_task, [0, 3, 4],
+            cost=(lambda x: (0.0, 0)), retries=1,
+            degrade=(lambda x, attempt: -x),
+            on_degraded=(lambda rank, x, attempt, res: ("degraded", attempt, res))))
+    assert res == [0, ("degraded", 1, -3), 4]
+
+    # Sans suivi des processus, l'attente dans la file du pool ne compte pas dans le delai.
+    with multiprocessing.Pool(1) as pool:
+        res = list(scheduled_imap(pool, _slow_task, range(4),
+            cost=(lambda x: (0.0, 0)), timeout=1.5,
+            on_failure=(lambda rank, x, err: type(err).__name__)))
+    assert res == [0, 1, 2, 3]
+
+    # Deux appels simultanes sur le meme pool ne se volent pas leurs signalements.
+    import threading
+    results = {}
+    def job(name):
+        results[name] = list(scheduled_imap(pool, _faulty_task, [1], cost=(lambda x: (0.0, 0)),
+            timeout=2, on_failure=(lambda rank, x, err: type(err).__name__)))
+    with WorkerPool(2) as pool:
+        threads = [threading.Thread(target=job, args=(name,), daemon=True) for name in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(30)
+    assert results == {0: ["TimeoutError"], 1: ["TimeoutError"]}
+
+    # Une tentative abandonnee garde sa place tant qu'elle occupe le pool.
+    import asyncio
+    from laue.utilities.asynchronous import apply
+    async def held_slot():
+        limit = asyncio.Semaphore(1)
+        await limit.acquire()
+        with multiprocessing.Pool(1) as pool:
+            res = await apply(pool, _slow_task, 0, timeout=.1,
+                on_failure=(lambda rank, x, err: type(err).__name__), release=limit.release)
+            held = limit.locked()
+            await asyncio.wait_for(limit.acquire(), 5)
+        return res, held
+    assert asyncio.run(held_slot()) == ("TimeoutError", True)
+
+def test_distributed():
+    _print("============= TEST DISTRIBUTED ===============")
+    with CWDasRoot():
+        from laue.experiment.base_experiment import Experiment
+        from laue.utilities.distributed import DistributedPool, LocalCluster, serve_worker
+    import tempfile
+
+    def run(**kwargs):
+        experiment = Experiment(_synthetic_images(6), **SYNTHETIC_PARAMETERS, **kwargs)
+        try: # Toutes les etapes partagent le meme pool.
+            return ([hash(diag) for diag in experiment],
+                    [len(axes) for axes in experiment.find_zone_axes()],
+                    [len(subsets) for subsets in experiment.find_subsets()])
+        finally:
+            experiment.close()
+
+    expected = run()
+    address = os.path.join(tempfile.mkdtemp(), "backend")
+    with LocalCluster(2, address, heartbeat=.2):
+        for _ in range(2): # L'adresse est liberee a la fermeture de l'experience.
+            t1 = time.time()
+            assert run(backend=address) == expected
+            t2 = time.time()
+            _print(f"{sum(expected[1])} axes: {_ftime(t2-t1)}")
+
+    # Un processus qui ne connait pas la clef n'obtient aucune tache.
+    with DistributedPool(address) as pool:
+        intruder = multiprocessing.Process(target=serve_worker, args=(address,),
+            kwargs={"authkey": b"wrong key"}, daemon=True)
+        intruder.start()
+        intruder.join(10)
+        assert intruder.exitcode == 0
+        assert not pool._workers
+
+def test_daemon():
+    _print("================ TEST DAEMON =================")
+    with CWDasRoot():
+        from laue.utilities.daemon import AnalysisDaemon, ping, shutdown, submit
+        from laue.utilities.distributed import recv_message, send_message
+    import pickle
+    import socket
+    import tempfile
+    import threading
+
+    directory = tempfile.mkdtemp()
+    images = _write_synthetic_images(4, directory)
+    address = os.path.join(directory, "laue.sock")
+    daemon = AnalysisDaemon(address, processes=1)
+    thread = threading.Thread(target=daemon.serve_forever)
+    thread.start()
+    try:
+        def run(job):
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.connect(address)
+                send_message(sock, ("submit", job))
+                messages = [recv_message(sock)]
+                while messages[-1][0] not in {"done", "error"}:
+                    messages.append(recv_message(sock))
+            return messages
+
+        output = os.path.join(directory, "result.pickle")
+        t1 = time.time()
+        messages = run({"images": images, "output": output, "stages": ("zone_axes",),
+                        "parameters": SYNTHETIC_PARAMETERS})
+        t2 = time.time()
+        _print(f"job: {_ftime(t2-t1)}")
+        assert messages[0][:2] == ("queued", 0)
+        assert [message[2:] for message in messages[1:-1]] == (
+            [("diagrams", i) for i in range(1, 5)] + [("zone_axes", i) for i in range(1, 5)])
+        assert messages[-1][:2] == ("done", 0) and messages[-1][2]["diagrams"] == 4
+        with open(output, "rb") as file:
+            assert len(pickle.load(file)) == 4
+
+        # Un travail refuse ou qui echoue ne fait pas tomber le demon.
+        messages = run({"images": images, "parameters": {**SYNTHETIC_PARAMETERS, "processes": 2}})
+        assert messages[-1][:2] == ("error", 1) and "processes" in messages[-1][2]
+        messages = run({"images": images, "stages": ("hkl",)})
+        assert messages[-1][:2] == ("error", 2)
+        progress = []
+        summary = submit(images, address=address, on_progress=lambda *args: progress.append(args),
+            **SYNTHETIC_PARAMETERS)
+        assert summary["diagrams"] == 4 and progress[-1] == ("diagrams", 4)
+        for _ in range(100): # Le compteur est mis a jour juste apres l'envoi du resume.
+            if ping(address)["done"] == 4:
+                break
+            time.sleep(.05)
+        assert ping(address)["jobs"] == ping(address)["done"] == 4
+    finally:
+        shutdown(address)
+        thread.join()
+
+def test_cli():
+    _print("================== TEST CLI ==================")
+    with CWDasRoot():
+        from laue.__main__ import main
+        from laue.experiment.base_experiment import Experiment
+    import contextlib
+    import csv
+    import io
+    import tempfile
+
+    directory = tempfile.mkdtemp()
+    _write_synthetic_images(4, directory)
+    source = os.path.join(directory, "*.tiff")
+    calibration = [arg for name, value in SYNTHETIC_PARAMETERS.items() for arg in (f"--{name}", str(value))]
+
+    experiment = Experiment(source, **SYNTHETIC_PARAMETERS)
+    try:
+        names = [diag.get_id() for diag in experiment]
+        positions = np.concatenate([diag.get_positions().reshape(2, -1) for diag in experiment], axis=1)
+        axes = [len(axes) for axes in experiment.find_zone_axes()]
+        subsets = [len(subsets) for subsets in experiment.find_subsets()]
+    finally:
+        experiment.close()
+
+    output, report = os.path.join(directory, "result.npz"), io.StringIO()
+    with contextlib.redirect_stderr(report):
+        t1 = time.time()
+        timing = main([source, "-o", output, "--stages", "zone_axes", "subsets", *calibration])
+        t2 = time.time()
+    _print(f"npz: {_ftime(t2-t1)}")
+    assert list(timing) == ["detection", "zone_axes", "subsets", "output"]
+    assert all(f"{stage:<12} {4:>8}" in report.getvalue() for stage in (*timing, "total"))
+    with np.load(output) as tables:
+        assert tables["frames/name"].tolist() == names
+        assert tables["frames/zone_axes"].tolist() == axes
+        assert tables["frames/subsets"].tolist() == subsets
+        assert tables["frames/spots"].sum() == positions.shape[1] == len(tables["spots/x"])
+        np.testing.assert_array_equal(np.stack([tables["spots/x"], tables["spots/y"]]), positions)
+        assert "spots/two_theta" in tables
+
+    # Sans les etapes optionnelles, les comptes sont remplaces par -1.
+    output, close, closed = os.path.join(directory, "result.csv"), Experiment.close, []
+    Experiment.close = lambda self: (closed.append(self), close(self))[1]
+    try:
+        with contextlib.redirect_stderr(io.StringIO()):
+            main([source, "-o", output, "--stages", "detection"])
+    finally:
+        Experiment.close = close
+    assert len(closed) == 1, "L'experience doit etre fermee."
+    with open(os.path.join(directory, "result_frames.csv"), encoding="utf-8") as file:
+        rows = list(csv.DictReader(file))
+    assert [row["name"] for row in rows] == names and {row["zone_axes"] for row in rows} == {"-1"}
+    with open(output, encoding="utf-8") as file:
+        assert len(list(csv.DictReader(file))) == positions.shape[1]
+
+def test_spill_window():
+    _print("============= TEST SPILL WINDOW ==============")
+    with CWDasRoot():
+        from laue.experiment.base_experiment import Experiment
+
+    images = _synthetic_images(6)
+    for ordered in (True, False):
+        # La fenetre est plus petite que le nombre de taches en vol.
+        experiment = Experiment(images, **SYNTHETIC_PARAMETERS, spill_window=2)
+        try:
+            t1 = time.time()
+            experiment.find_subsets(ordered=ordered)
+            t2 = time.time()
+            _print(f"ordered={ordered}: {_ftime(t2-t1)}")
+            assert all(diag._axes and diag._subsets for diag in experiment._buff_diags)
+        finally:
+            experiment.close()
+
+    # Les resultats des diagrammes deportes doivent atteindre le journal.
+    import tempfile
+    directory = tempfile.mkdtemp()
+    images = _write_synthetic_images(6, directory)
+    saving_file = os.path.join(directory, "state")
+    experiment = Experiment(images, **SYNTHETIC_PARAMETERS, spill_window=2, saving_file=saving_file)
+    try:
+        experiment.get_diagrams()
+        experiment.save_state(compact=True)
+        axes = [len(axes) for axes in experiment.find_zone_axes()]
+        experiment.save_state()
+        for compact in (False, True):
+            resumed = Experiment(images, **SYNTHETIC_PARAMETERS, saving_file=saving_file)
+            try:
+                assert [len(next(iter(diag._axes.values()), [])) for diag in resumed._buff_diags] == axes
+            finally:
+                resumed.close()
+            experiment.save_state(compact=True)
+    finally:
+        experiment.close()
+
+def test_routed_images():
+    _print("============= TEST ROUTED IMAGES =============")
+    with CWDasRoot():
+        from laue.experiment.base_experiment import Experiment
+    import tempfile
+    import cv2
+
+    # Les processus epingles lisent eux meme les images, ils doivent les verifier pareil.
+    directory = tempfile.mkdtemp()
+    images = _write_synthetic_images(5, directory)
+    images.insert(2, os.path.join(directory, "missing.tiff"))
+
+    hashes = []
+    for affinity in (None, "core"):
+        for ordered in (True, False):
+            experiment = Experiment(images, **SYNTHETIC_PARAMETERS, affinity=affinity, ignore_errors=True)
+            try:
+                t1 = time.time()
+                pairs = (list(enumerate(experiment.get_diagrams())) if ordered
+                         else sorted(experiment.get_diagrams(ordered=False), key=lambda pair: pair[0]))
+                t2 = time.time()
+            finally:
+                experiment.close()
+            _print(f"{affinity}, ordered={ordered}: {_ftime(t2-t1)}")
+            assert [rank for rank, _ in pairs] == list(range(5))
+            hashes.append([hash(diag) for _, diag in pairs])
+    assert all(h == hashes[0] for h in hashes)
+
+    cv2.imwrite(images[-1], np.zeros((64, 64), dtype=np.uint16)) # Une image d'une autre taille.
+    experiment = Experiment(images, **SYNTHETIC_PARAMETERS, affinity="core", ignore_errors=True)
+    try:
+        experiment.get_diagrams(ordered=False)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("L'image de taille differente n'a pas ete refusee.")
+    finally:
+        experiment.close()
+
+def test_direct_access():
+    _print("============= TEST DIRECT ACCESS =============")
+    with CWDasRoot():
+        from laue.experiment.base_experiment import Experiment
+        import laue.utilities.image as image_module
+    import tempfile
+
+    # Le fichier 'corrupt' existe mais sa lecture echoue, le rang des suivantes est decale.
+    directory = tempfile.mkdtemp()
+    images = _write_synthetic_images(6, directory)
+    corrupt = os.path.join(directory, "corrupt.tiff")
+    with open(corrupt, "wb") as file:
+        file.write(b"\x00"*64)
+    images.insert(1, corrupt)
+    images.insert(3, os.path.join(directory, "missing.tiff"))
+    names = [image for image in images if image != corrupt and os.path.isfile(image)]
+
+    read_image, reads = image_module.read_image, []
+    def counted_read_image(image_path, *, ignore_errors=False):
+        reads.append(image_path)
+        return None if image_path == corrupt else read_image(image_path, ignore_errors=ignore_errors)
+    image_module.read_image = counted_read_image
+    try:
+        experiment = Experiment(images, **SYNTHETIC_PARAMETERS, ignore_errors=True)
+        try:
+            t1 = time.time()
+            diag = experiment[5]
+            t2 = time.time()
+            assert reads == [diag.get_id()], "Seule l'image demandee doit etre lue."
+            experiment[1] # Revele l'image illisible, les rangs deja attribues sont corriges.
+            assert experiment[4] is diag and diag.get_id() == names[4]
+            assert experiment[5].get_id() == names[5]
+            diags = experiment.get_diagrams()
+            assert [d.get_id() for d in diags] == names and diags[4] is diag
+        finally:
+            experiment.close()
+        _print(f"direct: {_ftime(t2-t1)}")
+
+        # La correction vient aussi de l'extraction sequentielle.
+        experiment = Experiment(images, **SYNTHETIC_PARAMETERS, ignore_errors=True)
+        try:
+            diag = experiment[5]
+            for rank, _ in enumerate(experiment):
+                if rank == 1:
+                    break
+            assert experiment[4] is diag and experiment[4].get_id() == names[4]
+            assert [d.get_id() for d in experiment.get_diagrams()] == names
+        finally:
+            experiment.close()
+    finally:
+        image_module.read_image = read_image
+
+def _write_synthetic_images(nbr, directory):
+    """
+    ** Ecrit des images synthetiques en ``.tiff``, renvoie leurs chemins. **
+    """
+    import cv2
+    images = []
+    for i, image in enumerate(_synthetic_images(nbr)):
+        images.append(os.path.join(directory, f"image_{i}.tiff"))
+        cv2.imwrite(images[-1], image)
+    return images
+
+def test_regression():
+    _print("============== TEST REGRESSION ===============")
+    with CWDasRoot():
+        from laue.experiment.base_experiment import Experiment
+        from laue.utilities.results_store import open_results, write_results
+    import pickle
+    import tempfile
+
+    directory = tempfile.mkdtemp()
+    images = _write_synthetic_images(6, directory)
+    experiment = Experiment(images, **SYNTHETIC_PARAMETERS, saving_file=os.path.join(directory, "state"))
+    try:
+        spots = [_spots_signature(diag) for diag in experiment]
+        axes = [len(axes) for axes in experiment.find_zone_axes()]
+        subsets = [len(subsets) for subsets in experiment.find_subsets()]
+        assert sum(axes) and sum(subsets), "Les images synthetiques doivent avoir des axes et des grains."
+
+        # Aller-retour pickle de l'experience et d'un diagramme seul.
+        copy = pickle.loads(pickle.dumps(experiment))
+        assert [_spots_signature(diag) for diag in copy] == spots
+        assert [len(axes) for axes in copy.find_zone_axes()] == axes
+        assert [len(subsets) for subsets in copy.find_subsets()] == subsets
+        thetachi = experiment[2].get_theta_chi()
+        diag = pickle.loads(pickle.dumps(experiment[2]))
+        assert diag.experiment is None and _spots_signature(diag) == spots[2]
+        assert len(diag.find_zone_axes()) == axes[2] and len(diag.find_subsets()) == subsets[2]
+        np.testing.assert_array_equal(diag.get_theta_chi(), thetachi)
+
+        # Fichiers .dat et .cor, compares aux valeurs spot par spot.
+        for ext in ("dat", "cor"):
+            filenames = experiment.save_files(os.path.join(directory, ext), ext)
+            for diag, filename in zip(experiment, filenames):
+                table = np.loadtxt(filename, skiprows=1, ndmin=2)
+                expected = [[*spot.get_position(), spot.get_intensity()] for spot in diag]
+                if ext == "cor":
+                    expected = [[2*spot.get_theta_chi()[0], spot.get_theta_chi()[1], *row]
+                                for spot, row in zip(diag, expected)]
+                np.testing.assert_allclose(table, np.array(expected).reshape(table.shape), rtol=1e-6)
+
+        # Requetes de la table des spots, comparees a une recherche exhaustive.
+        table = experiment.get_spot_table(cell=16.0)
+        rows = [(d, s, *spot.get_position(), spot.get_intensity(), spot.get_quality())
+                for d, diag in enumerate(experiment) for s, spot in enumerate(diag)]
+        for near, radius, intensity_min, quality_min, diagrams in (
+                ((256, 256), 100, None, None, None), ((150, 350), 150, 1000, .2, [1, 4]),
+                (None, None, 5000, None, [0, 5]), (None, None, None, .5, None)):
+            found = table.select(near=near, radius=radius, intensity_min=intensity_min,
+                quality_min=quality_min, diagrams=diagrams)
+            expected = [i for i, (d, _, x, y, intensity, quality) in enumerate(rows)
+                if (near is None or (x-near[0])**2 + (y-near[1])**2 <= radius**2)
+                and (intensity_min is None or intensity >= intensity_min)
+                and (quality_min is None or quality >= quality_min)
+                and (diagrams is None or d in diagrams)]
+            assert found.tolist() == expected
+
+        # Aller-retour par un fichier de resultats.
+        filename = os.path.join(directory, "results.h5")
+        write_results(experiment, filename)
+        stored = open_results(filename)
+        assert [_spots_signature(diag) for diag in stored] == spots
+        for diag, stored_diag in zip(experiment, stored): # Sans perte de precision.
+            np.testing.assert_array_equal(stored_diag.get_gnomonic_positions(), diag.get_gnomonic_positions())
+        assert [len(axes) for axes in stored.find_zone_axes()] == axes
+        assert [len(subsets) for subsets in stored.find_subsets()] == subsets
+
+        # Journal dont le dernier enregistrement est tronque par un arret brutal.
+        experiment._clean("zone_axes")
+        experiment.save_state(compact=True)
+        size = os.path.getsize(experiment.saving_file)
+        experiment.find_subsets()
+        experiment.save_state()
+        assert os.path.getsize(experiment.saving_file) > size
+        with open(experiment.saving_file, "r+b") as file:
+            file.truncate(os.path.getsize(experiment.saving_file) - 8)
+        resumed = Experiment(images, **SYNTHETIC_PARAMETERS, saving_file=experiment.saving_file)
+        try:
+            assert [_spots_signature(diag) for diag in resumed._buff_diags] == spots
+            assert not any(diag._axes for diag in resumed._buff_diags) # Le dernier point est perdu.
+            assert [len(axes) for axes in resumed.find_zone_axes()] == axes
+        finally:
+            resumed.close()
+    finally:
+        experiment.close()
+
 # Tests sur les donnees reelles.
 
 def test_read_images():
@@ -409,6 +911,65 @@ def test_find_diagrams():
         di2 = [hash(diag) for diag in experiment]
         assert di1 == di2
 
+def _spots_signature(diag):
+    """
+    ** Le nom et la position des spots d'un diagramme, pour les comparer. **
+    """
+    return diag.get_id(), np.round(diag.get_positions(), 6).tobytes()
+
+def test_unordered_diagrams():
+    _print("=========== TEST UNORDERED DIAGRAMS ==========")
+    with CWDasRoot():
+        from laue.experiment.base_experiment import Experiment
+        from laue.utilities.multi_core import reorder
+
+    images = _synthetic_images(8)
+    reference = Experiment(images, **SYNTHETIC_PARAMETERS)
+    try:
+        expected = [_spots_signature(diag) for diag in reference]
+    finally:
+        reference.close()
+
+    experiment = Experiment(images, **SYNTHETIC_PARAMETERS)
+    try:
+        t1 = time.time()
+        pairs = experiment.get_diagrams(ordered=False)
+        t2 = time.time()
+        _print(f"{len(pairs)} diagrams: {_ftime(t2-t1)}")
+
+        assert sorted(i for i, _ in pairs) == list(range(len(images)))
+        assert all(diag.get_id() == f"image_{i}" for i, diag in pairs) # Le rang est celui de l'image.
+        ordered = list(reorder(pairs))
+        assert [_spots_signature(diag) for diag in ordered] == expected
+        assert all(a is b for a, b in zip(ordered, experiment)) # Les diagrammes ne sont pas recalcules.
+    finally:
+        experiment.close()
+
+def test_affinity():
+    _print("=============== TEST AFFINITY ================")
+    with CWDasRoot():
+        from laue.experiment.base_experiment import Experiment
+        from laue.utilities.concurrency import cpu_topology
+        from laue.utilities.multi_core import reorder
+    nodes = len(cpu_topology())
+
+    images = _synthetic_images(8)
+    signatures = []
+    for affinity in (None, "core", "node"):
+        experiment = Experiment(images, **SYNTHETIC_PARAMETERS, affinity=affinity)
+        try:
+            t1 = time.time()
+            pairs = experiment.get_diagrams(ordered=False)
+            t2 = time.time()
+        finally:
+            experiment.close()
+        _print(f"{affinity}: {_fthroughput(len(pairs), t2-t1, nodes)}", end=" ")
+        assert sorted(i for i, _ in pairs) == list(range(len(images)))
+        signatures.append([_spots_signature(diag) for diag in reorder(pairs)])
+    _print()
+    assert signatures[0] == signatures[1] == signatures[2]
+    assert all(len(set(signature)) == len(images) for signature in signatures)
+
 def test_calibration():
     global CALIBRATION_PARAMETERS
 
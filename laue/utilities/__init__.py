@@ -11,21 +11,31 @@ codee ici.
 
 import inspect
 
+from .buffers import SpillBuffer, SpillDict
+from .cache import CacheManager
+from .distributed import DistributedPool, LocalCluster
+from .concurrency import ConcurrencyPolicy
 from .data_consistency import Recordable
-from .image import read_image, create_image, images_to_iter
+from .image import read_image, check_image, read_hdf5_stack, create_image, images_to_iter
 from .lambdify import TimeCost, Lambdify
 from .multi_core import (limited_imap, pickleable_method,
     prevent_generator_size, reduce_object, NestablePool,
-    RecallingIterator)
+    RecallingIterator, reorder)
 from .parsing import extract_parameters
+from .results_store import write_results, open_results
+from .scheduling import CostModel, scheduled_imap
 
 __all__ = [
+    "SpillBuffer", "SpillDict", "CacheManager", "DistributedPool", "LocalCluster",
+    "ConcurrencyPolicy",
     "Recordable",
-    "read_image", "create_image", "images_to_iter",
+    "read_image", "check_image", "read_hdf5_stack", "create_image", "images_to_iter",
     "TimeCost", "Lambdify",
     "limited_imap", "pickleable_method", "prevent_generator_size",
-    "reduce_object", "NestablePool", "RecallingIterator",
-    "extract_parameters"]
+    "reduce_object", "NestablePool", "RecallingIterator", "reorder",
+    "extract_parameters",
+    "write_results", "open_results",
+    "CostModel", "scheduled_imap"]
 
 __pdoc__ = {obj: ("Alias vers ``laue."
                   f"{inspect.getsourcefile(globals()[obj]).split('laue/')[-1][:-3].replace('/', '.').replace('.__init__', '')}"
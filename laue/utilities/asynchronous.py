@@ -0,0 +1,462 @@
+#!/usr/bin/env python3
+
+"""
+** Interface asyncio des etapes d'une experience. **
+----------------------------------------------------
+
+* Permet de piloter les experiences depuis une boucle d'evenements
+sans bloquer le thread qui l'execute.
+* Les taches sont toujours calculees par un pool de processus,
+leurs resultats deviennent des objets ``awaitable``.
+* Plusieurs experiences peuvent partager la meme boucle: un meme pool
+et un meme semaphore bornent le nombre total de taches en cours.
+* Sortir d'une boucle ``async for`` ou annuler la tache asyncio
+abandonne les taches en cours.
+"""
+
+import asyncio
+import atexit
+import functools
+import weakref
+
+
+_POOL = None # Le pool partage par toutes les iterations asynchrones.
+_LIMITS = weakref.WeakKeyDictionary() # A chaque boucle, son semaphore.
+
+def shared_pool():
+    """
+    ** Le pool de processus commun a toutes les experiences asynchrones. **
+
+    Il est cree au premier appel puis detruit a la fin du programme.
+
+    Returns
+    -------
+    laue.utilities.scheduling.WorkerPool
+        Un pool dont la taille est fixee par ``laue.utilities.concurrency.ConcurrencyPolicy``.
+    """
+    global _POOL
+    if _POOL is None:
+        from laue.utilities.concurrency import ConcurrencyPolicy
+        from laue.utilities.scheduling import WorkerPool
+        _POOL = WorkerPool(**ConcurrencyPolicy().pool_kwargs())
+        atexit.register(_POOL.terminate)
+    return _POOL
+
+def shared_limit():
+    """
+    ** Le semaphore qui borne les taches en cours dans la boucle courante. **
+
+    Returns
+    -------
+    asyncio.Semaphore
+        Le meme objet pour toutes les experiences d'une boucle.
+        Il autorise deux taches par coeur.
+    """
+    loop = asyncio.get_running_loop()
+    if loop not in _LIMITS:
+        from laue.utilities.concurrency import available_cores
+        _LIMITS[loop] = asyncio.Semaphore(2*available_cores())
+    return _LIMITS[loop]
+
+def _resolve(future, success, value):
+    """
+    ** Transmet le resultat d'une tache a un futur asyncio. **
+    """
+    if future.done(): # Si la tache a ete abandonnee.
+        return
+    if success:
+        future.set_result(value)
+    else:
+        future.set_exception(value)
+
+async def apply(pool, func, args, *, rank=0, timeout=None, retries=0, degrade=None, on_failure=None,
+        on_degraded=None, release=None):
+    """
+    ** Evalue ``func(args)`` dans le pool sans bloquer la boucle. **
+
+    Parameters
+    ----------
+    pool : multiprocessing.pool.Pool
+        N'importe quel pool qui dispose de ``apply_async``.
+    func : callable
+        La fonction serialisable qui sera evaluee.
+    args : object
+        L'unique argument de ``func``.
+    rank : int, optional
+        Le numero de la tache, transmis a ``on_failure``.
+    timeout, retries, degrade, on_failure, on_degraded
+        Comme pour ``laue.utilities.scheduling.scheduled_imap``.
+        Une tentative trop longue est abandonnee mais son processus n'est pas tue.
+    release : callable, optional
+        Appelee une seule fois, dans la boucle, quand ``apply`` a rendu la main
+        et que plus aucune de ses tentatives n'occupe le pool. Une tentative
+        abandonnee continue en effet d'occuper un processus jusqu'a sa fin.
+
+    Returns
+    -------
+    object
+        Le resultat de ``func(args)``.
+
+    Raises
+    ------
+    laue.utilities.scheduling.TaskFailure
+        Si toutes les tentatives echouent et que ``on_failure`` n'est pas fourni.
+
+    Examples
+    --------
+    >>> import asyncio, multiprocessing
+    >>> from laue.utilities.asynchronous import apply
+    >>> with multiprocessing.Pool(1) as pool:
+    ...     asyncio.run(apply(pool, abs, -1))
+    ...
+    1
+    >>>
+    """
+    loop = asyncio.get_running_loop()
+    running = 0 # Le nombre de tentatives encore dans le pool.
+    returned = False # Si 'apply' a rendu la main.
+
+    def finish(future, success, value):
+        nonlocal running
+        _resolve(future, success, value)
+        running -= 1
+        if returned and not running and release is not None:
+            release()
+
+    def callback(future, success, value):
+        try:
+            loop.call_soon_threadsafe(finish, future, success, value)
+        except RuntimeError: # Si la boucle est deja fermee.
+            pass
+
+    attempt = 0
+    try:
+        while True:
+            future = loop.create_future()
+            pool.apply_async(func, (args,),
+                callback=functools.partial(callback, future, True),
+                error_callback=functools.partial(callback, future, False))
+            running += 1
+            try:
+                result = await asyncio.wait_for(future, timeout)
+            except asyncio.TimeoutError:
+                error = TimeoutError(f"La tache {rank} depasse {timeout} s.")
+            except Exception as err: # L'erreur de la tache.
+                error = err
+            else:
+                if attempt and on_degraded is not None:
+                    return on_degraded(rank, args, attempt, result)
+                return result
+            if attempt < retries:
+                attempt += 1
+                args = args if degrade is None else degrade(args, attempt)
+                continue
+            if on_failure is None:
+                from laue.utilities.scheduling import TaskFailure
+                raise TaskFailure(f"La tache {rank} a echoue {attempt+1} fois.") from error
+            return on_failure(rank, args, error)
+    finally:
+        returned = True
+        if not running and release is not None:
+            release()
+
+async def imap_unordered(pool, func, source, *, limit, **fault_kwargs):
+    """
+    ** Evalue ``func`` sur chaque argument d'un iterateur asynchrone. **
+
+    * Un argument n'est lance qu'une fois une place libre dans ``limit``.
+    * L'iterateur n'est jamais lu en avance de plus d'un element.
+    * Toutes les taches en cours sont abandonnees si le generateur
+    est ferme ou si la tache qui l'itere est annulee.
+
+    Parameters
+    ----------
+    pool : multiprocessing.pool.Pool
+        N'importe quel pool qui dispose de ``apply_async``.
+    func : callable
+        La fonction serialisable qui sera evaluee.
+    source : async iterable
+        Cede sucessivement les arguments de ``func``.
+    limit : asyncio.Semaphore
+        Chaque tache en cours occupe une place, jusqu'a ce que sa derniere
+        tentative quitte le pool, meme si elle a ete abandonnee.
+    **fault_kwargs
+        Les parametres de tolerance aux pannes de ``apply``.
+        Le parametre ``window`` de ``scheduled_imap`` est ignore.
+
+    Yields
+    ------
+    rank : int
+        Le rang de l'argument dans ``source``.
+    result : object
+        Le resultat de ``func``, des qu'il est pret.
+    """
+    source = source.__aiter__()
+    fault_kwargs.pop("window", None) # Les taches sont lancees une a une.
+
+    async def run(rank, args):
+        # La place n'est rendue qu'une fois toutes les tentatives sorties du pool.
+        return rank, await apply(pool, func, args, rank=rank, release=limit.release, **fault_kwargs)
+
+    async def feed():
+        args = await source.__anext__() # Sans place reservee, pour ne pas bloquer l'etape amont.
+        await limit.acquire()
+        return args
+
+    feeder = asyncio.ensure_future(feed())
+    tasks = set()
+    rank = 0
+    try:
+        while feeder is not None or tasks:
+            finished, _ = await asyncio.wait(
+                tasks | ({feeder} if feeder is not None else set()),
+                return_when=asyncio.FIRST_COMPLETED)
+            if feeder in finished:
+                try:
+                    args = feeder.result()
+                except StopAsyncIteration:
+                    feeder = None
+                else:
+                    tasks.add(asyncio.ensure_future(run(rank, args)))
+                    rank += 1
+                    feeder = asyncio.ensure_future(feed())
+            for task in finished & tasks:
+                tasks.remove(task)
+                yield task.result()
+    finally:
+        for task in tasks | ({feeder} if feeder is not None else set()):
+            task.cancel()
+        await asyncio.gather(*tasks, *([feeder] if feeder is not None else []), return_exceptions=True)
+
+async def reorder(source, start=0):
+    """
+    ** Version asynchrone de ``laue.utilities.multi_core.reorder``. **
+
+    Parameters
+    ----------
+    source : async iterable
+        Cede des couples ``(rang, element)`` dans le desordre.
+    start : int, optional
+        Le premier rang.
+
+    Yields
+    ------
+    object
+        Les elements dans l'ordre de leur rang.
+    """
+    pending = {}
+    async for rank, *element in source:
+        pending[rank] = element
+        while start in pending:
+            element = pending.pop(start)
+            yield element[0] if len(element) == 1 else tuple(element)
+            start += 1
+
+class ExperimentAsync:
+    """
+    ** Interface asyncio de ``laue.experiment.base_experiment.Experiment``. **
+
+    Comme pour les iterations non ordonnees, une iteration asynchrone
+    ne doit pas etre faite en meme temps qu'une iteration synchrone ordonnee.
+    """
+    async def _aiter_unordered_diagrams(self, pool, limit):
+        """
+        ** Cede les couples ``(rang, diagramme)`` des qu'ils sont extraits. **
+
+        Equivalent asynchrone de ``laue.experiment.base_experiment.Experiment._unordered_diagrams``.
+        """
+        start = len(self._buff_diags)
+        for rank in range(start):
+            yield rank, self._buff_diags[rank]
+        if len(self) and start >= len(self): # Si il n'y a plus rien a extraire.
+            return
+
+        loop = asyncio.get_running_loop()
+        images = self._pic_search_args()
+        end = object()
+        async def source(): # La lecture des images est faite dans un autre thread.
+            while (args := await loop.run_in_executor(None, next, images, end)) is not end:
+                yield args
+
+        from laue.core.pic_search import _pickelable_pic_search
+        pending = {} # Les diagrammes arrives en avance, a chaque tache. None si l'image est ignoree.
+        next_task = 0 # La premiere tache dont le diagramme n'est pas encore range.
+        skippable = self.ignore_errors and self.concurrency.affinity is not None
+        async for task, (spots_args, (name, image)) in imap_unordered(
+                pool, _pickelable_pic_search, source(), limit=limit,
+                **self._fault_kwargs("pic_search")):
+            if name is None:
+                self._image_skipped(image)
+            pending[task] = None if name is None else self._cast_to_diagram(spots_args, name, image)
+            ready = [] if skippable or name is None else [(start+task, pending[task])]
+            while next_task in pending: # Une image ignoree decale le rang des suivantes.
+                diag = pending.pop(next_task)
+                next_task += 1
+                if diag is not None:
+                    if skippable:
+                        ready.append((len(self._buff_diags), diag))
+                    self._buff_diags.append(diag)
+            for rank, diag in ready:
+                yield rank, diag
+
+    async def _aiter_unordered_axes(self, kwds, pool, limit):
+        """
+        ** Cede les triplets ``(rang, diagramme, axes)`` des qu'ils sont trouves. **
+        """
+        from laue.core.zone_axes import _jump_find_zone_axes
+        loop = asyncio.get_running_loop()
+        tasks = {} # A chaque tache, associe le rang et le diagramme.
+        async def source():
+            task = 0
+            async for rank, diag in self._aiter_unordered_diagrams(pool, limit):
+                tasks[task] = (rank, diag)
+                task += 1
+                yield await loop.run_in_executor(None,
+                    functools.partial(diag.find_zone_axes, **kwds, _get_args=True))
+
+        async for task, args in imap_unordered(pool, _jump_find_zone_axes, source(), limit=limit,
+                **self._fault_kwargs("zone_axes", lambda task: tasks[task][1].get_id())):
+            rank, diag = tasks.pop(task)
+            yield rank, diag, (
+                diag.find_zone_axes(_axes_args=args)
+                if not isinstance(args, dict) else
+                diag.find_zone_axes(**args))
+
+    async def _aiter_unordered_subsets(self, kwds, pool, limit):
+        """
+        ** Cede les triplets ``(rang, diagramme, subsets)`` des qu'ils sont trouves. **
+        """
+        from laue.core.subsets import _jump_find_subsets
+        loop = asyncio.get_running_loop()
+        tasks = {} # A chaque tache, associe le rang et le diagramme.
+        async def source():
+            task = 0
+            async for rank, diag, _ in self._aiter_unordered_axes(kwds, pool, limit):
+                tasks[task] = (rank, diag)
+                task += 1
+                yield await loop.run_in_executor(None,
+                    functools.partial(diag.find_subsets, **kwds, _get_args=True))
+
+        async for task, args in imap_unordered(pool, _jump_find_subsets, source(), limit=limit,
+                **self._fault_kwargs("subsets", lambda task: tasks[task][1].get_id())):
+            rank, diag = tasks.pop(task)
+            yield rank, diag, (
+                diag.find_subsets(_atomic_subsets_res=args)
+                if not isinstance(args, dict) else
+                diag.find_subsets(**args))
+
+    @staticmethod
+    def _async_context(pool, limit):
+        """
+        ** Le pool et le semaphore a utiliser. **
+        """
+        if pool is None:
+            pool = shared_pool()
+        if limit is None:
+            limit = shared_limit()
+        elif isinstance(limit, int):
+            assert limit >= 1, f"'limit' has to be positive, not {limit}."
+            limit = asyncio.Semaphore(limit)
+        assert isinstance(limit, asyncio.Semaphore), \
+            f"'limit' has to be int or asyncio.Semaphore, not {type(limit).__name__}."
+        return pool, limit
+
+    async def aiter_diagrams(self, *, ordered=True, pool=None, limit=None):
+        """
+        ** Cede les diagrammes sans bloquer la boucle d'evenements. **
+
+        Equivalent asynchrone de ``laue.experiment.base_experiment.Experiment.get_diagrams``
+        a flux tendu.
+
+        Parameters
+        ----------
+        ordered : boolean, optional
+            * True : Les diagrammes sont cedes dans l'ordre des images.
+            * False : Cede les couples ``(rang, diagramme)`` des qu'ils sont prets.
+        pool : multiprocessing.pool.Pool, optional
+            Le pool qui execute les taches, par exemple un
+            ``laue.utilities.distributed.DistributedPool``.
+            Par defaut, c'est ``laue.utilities.asynchronous.shared_pool``.
+        limit : int or asyncio.Semaphore, optional
+            Le nombre maximum de taches en cours. Un semaphore peut etre partage
+            entre plusieurs experiences. Par defaut, c'est celui de
+            ``laue.utilities.asynchronous.shared_limit``.
+
+        Yields
+        ------
+        laue.diagram.LaueDiagram
+            Chaque diagramme, des que lui et ses predecesseurs sont extraits.
+
+        Examples
+        --------
+        >>> import asyncio
+        >>> import numpy as np
+        >>> import laue
+        >>> images = [np.zeros((64, 64), dtype=np.uint16) for _ in range(3)]
+        >>> experiment = laue.Experiment(images)
+        >>> async def main():
+        ...     return [diag.get_id() async for diag in experiment.aiter_diagrams()]
+        ...
+        >>> asyncio.run(main())
+        ['image_0', 'image_1', 'image_2']
+        >>>
+        """
+        pool, limit = self._async_context(pool, limit)
+        pairs = self._aiter_unordered_diagrams(pool, limit)
+        async for element in (pairs if not ordered else reorder(pairs)):
+            yield element
+
+    async def aiter_zone_axes(self, *, ordered=True, pool=None, limit=None, **kwds):
+        """
+        ** Cede les axes de zone sans bloquer la boucle d'evenements. **
+
+        Equivalent asynchrone de ``laue.experiment.base_experiment.Experiment.find_zone_axes``
+        a flux tendu. Les diagrammes sont extraits au fur et a mesure.
+
+        Parameters
+        ----------
+        ordered : boolean, optional
+            * True : Les axes sont cedes dans l'ordre des diagrammes.
+            * False : Cede les couples ``(rang, axes)`` des qu'ils sont prets.
+        pool, limit
+            Voir ``laue.utilities.asynchronous.ExperimentAsync.aiter_diagrams``.
+        **kwds
+            Les parametres de ``laue.diagram.LaueDiagram.find_zone_axes``.
+
+        Yields
+        ------
+        list
+            Les axes de zone de chaque diagramme.
+        """
+        pool, limit = self._async_context(pool, limit)
+        pairs = ((rank, axes) async for rank, _, axes in self._aiter_unordered_axes(kwds, pool, limit))
+        async for element in (pairs if not ordered else reorder(pairs)):
+            yield element
+
+    async def aiter_subsets(self, *, ordered=True, pool=None, limit=None, **kwds):
+        """
+        ** Cede les bouts de grains sans bloquer la boucle d'evenements. **
+
+        Equivalent asynchrone de ``laue.experiment.base_experiment.Experiment.find_subsets``
+        a flux tendu.
+
+        Parameters
+        ----------
+        ordered : boolean, optional
+            * True : Les resultats sont cedes dans l'ordre des diagrammes.
+            * False : Cede les couples ``(rang, subsets)`` des qu'ils sont prets.
+        pool, limit
+            Voir ``laue.utilities.asynchronous.ExperimentAsync.aiter_diagrams``.
+        **kwds
+            Les parametres de ``laue.diagram.LaueDiagram.find_subsets``
+            et de ``laue.diagram.LaueDiagram.find_zone_axes``.
+
+        Yields
+        ------
+        list
+            Les bouts de grains de chaque diagramme.
+        """
+        pool, limit = self._async_context(pool, limit)
+        pairs = ((rank, subsets) async for rank, _, subsets in self._aiter_unordered_subsets(kwds, pool, limit))
+        async for element in (pairs if not ordered else reorder(pairs)):
+            yield element
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+
+"""
+** Memoires tampons de taille bornee. **
+----------------------------------------
+
+Permet de conserver les diagrammes et les images d'une experience
+sans que la memoire vive n'augmente avec la longueur du scan.
+Les elements les plus anciens sont deportes sur le disque
+puis recharges seulement quand on en a besoin.
+"""
+
+import collections
+import os
+import pickle
+import shutil
+import tempfile
+import weakref
+
+
+class _SpillStore:
+    """
+    ** Elements ranges par rang dont seule une fenetre reste en memoire. **
+
+    Au dela de ``window`` elements en memoire, le moins recement utilise
+    est serialise dans un fichier, puis relu lors du prochain acces.
+    """
+    def __init__(self, window=64, *, directory=None, on_load=None, signature=None):
+        """
+        Parameters
+        ----------
+        window : int, optional
+            Le nombre maximum d'elements gardes en memoire.
+            Si il vaut None, rien n'est jamais deporte.
+        directory : str, optional
+            Le repertoire ou sont ecrits les elements deportes.
+            Par defaut, un repertoire temporaire est cree puis
+            supprime avec cet objet.
+        on_load : callable, optional
+            Fonction appelee sur chaque element relu depuis le disque,
+            par exemple pour lui rattacher son contexte.
+        signature : callable, optional
+            Fonction appelee sur chaque element au moment ou il est deporte.
+            Son resultat est garde en memoire, voir ``_SpillStore.signatures``.
+        """
+        assert window is None or isinstance(window, int), \
+            f"'window' has to be int, not {type(window).__name__}."
+        assert window is None or window >= 1, f"'window' has to be positive, not {window}."
+        assert directory is None or isinstance(directory, str), \
+            f"'directory' has to be str, not {type(directory).__name__}."
+        assert on_load is None or callable(on_load), "'on_load' has to be callable."
+        assert signature is None or callable(signature), "'signature' has to be callable."
+
+        self.window = window
+        self.on_load = on_load
+        self.signature = signature
+        if window is None:
+            directory = None
+        elif directory is None:
+            directory = tempfile.mkdtemp(prefix="laue_spill_")
+            weakref.finalize(self, shutil.rmtree, directory, ignore_errors=True)
+        else:
+            os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+
+        self._memory = collections.OrderedDict() # Rang -> element, du plus ancien au plus recent.
+        self._signatures = {} # Rang -> signature de l'element, pour ceux qui sont sur le disque.
+
+    def _path(self, rank):
+        """
+        ** Le fichier qui contient l'element de rang ``rank``. **
+        """
+        return os.path.join(self.directory, f"{rank}.pickle")
+
+    def _store(self, rank, element):
+        """
+        ** Met un element en memoire, quitte a en deporter un autre. **
+        """
+        self._memory[rank] = element
+        self._memory.move_to_end(rank)
+        while self.window is not None and len(self._memory) > self.window:
+            old_rank, old_element = self._memory.popitem(last=False)
+            with open(self._path(old_rank), "wb") as file:
+                pickle.dump(old_element, file, protocol=pickle.HIGHEST_PROTOCOL)
+            if self.signature is not None:
+                self._signatures[old_rank] = self.signature(old_element)
+
+    def _load(self, rank):
+        """
+        ** Recupere l'element de rang ``rank``, en memoire ou sur le disque. **
+        """
+        if rank in self._memory:
+            self._memory.move_to_end(rank)
+            return self._memory[rank]
+        with open(self._path(rank), "rb") as file:
+            element = pickle.load(file)
+        if self.on_load is not None:
+            self.on_load(element)
+        self._signatures.pop(rank, None) # L'element en memoire fait foi.
+        self._store(rank, element)
+        return element
+
+    def signatures(self):
+        """
+        ** La signature des elements deportes, sans rien relire. **
+
+        Returns
+        -------
+        dict
+            A chaque rang d'un element sur le disque, l'image par la
+            fonction ``signature`` de l'element tel qu'il a ete ecrit.
+            Les elements en memoire n'y sont pas.
+        """
+        return dict(self._signatures)
+
+    def __repr__(self):
+        """
+        ** Representation succinte. **
+        """
+        return f"{type(self).__name__}(window={self.window}, directory={self.directory!r})"
+
+
+class SpillBuffer(_SpillStore):
+    """
+    ** Liste dont seule une fenetre reste en memoire. **
+
+    Notes
+    -----
+    * S'utilise comme une liste a laquelle on ne fait qu'ajouter des elements.
+    * Au dela de ``window`` elements en memoire, le moins recement utilise
+    est serialise dans un fichier, puis relu lors du prochain acces.
+    * Un element relu est un nouvel objet, les modifications faites sur
+    l'ancien objet apres son depart de la fenetre sont perdues.
+
+    Examples
+    --------
+    >>> from laue.utilities.buffers import SpillBuffer
+    >>> buff = SpillBuffer(window=2)
+    >>> for i in range(5):
+    ...     buff.append([i])
+    ...
+    >>> len(buff), len(buff._memory)
+    (5, 2)
+    >>> buff[0], buff[-1]
+    ([0], [4])
+    >>> buff[1:3]
+    [[1], [2]]
+    >>> list(buff)
+    [[0], [1], [2], [3], [4]]
+    >>>
+    """
+    def __init__(self, window=64, *, directory=None, key=None, on_load=None, signature=None):
+        """
+        Parameters
+        ----------
+        window, directory, on_load, signature
+            Voir ``_SpillStore``.
+        key : callable, optional
+            Fonction qui a chaque element associe une petite clef
+            toujours gardee en memoire. Voir ``SpillBuffer.keys``.
+        """
+        assert key is None or callable(key), "'key' has to be callable."
+        super().__init__(window, directory=directory, on_load=on_load, signature=signature)
+        self.key = key
+
+        self._len = 0
+        self._keys = []
+
+    def append(self, element):
+        """
+        ** Ajoute un element a la fin. **
+        """
+        if self.key is not None:
+            self._keys.append(self.key(element))
+        self._store(self._len, element)
+        self._len += 1
+
+    def keys(self):
+        """
+        ** Les clefs de tous les elements, sans rien relire. **
+
+        Returns
+        -------
+        list
+            Les images des elements par la fonction ``key``.
+        """
+        assert self.key is not None, "Il faut fournir 'key' pour avoir les clefs."
+        return self._keys
+
+    def __getitem__(self, item):
+        """
+        ** Acces a un element ou a une tranche. **
+        """
+        if isinstance(item, slice):
+            return [self._load(rank) for rank in range(*item.indices(self._len))]
+        if item < 0:
+            item += self._len
+        if not 0 <= item < self._len:
+            raise IndexError(f"Le rang {item} n'est pas dans [0, {self._len}[.")
+        return self._load(item)
+
+    def __iter__(self):
+        """
+        ** Cede les elements un a un, en les relisant au besoin. **
+        """
+        for rank in range(self._len):
+            yield self._load(rank)
+
+    def __len__(self):
+        """
+        ** Le nombre total d'elements, en memoire et sur le disque. **
+        """
+        return self._len
+
+
+class SpillDict(_SpillStore):
+    """
+    ** Dictionnaire a clefs entieres dont seule une fenetre reste en memoire. **
+
+    Notes
+    -----
+    * Comme ``SpillBuffer``, mais les elements sont ranges a des rangs
+    quelconques et peuvent etre retires.
+    * Si ``key`` est fourni, un element se retrouve a partir de sa clef
+    sans rien relire (voir ``SpillDict.find``).
+
+    Examples
+    --------
+    >>> from laue.utilities.buffers import SpillDict
+    >>> sparse = SpillDict(window=1, key=len)
+    >>> sparse[7], sparse[3] = [0], [0, 1]
+    >>> len(sparse), len(sparse._memory), 7 in sparse
+    (2, 1, True)
+    >>> sparse.find(1), sparse[7]
+    (7, [0])
+    >>> sparse.pop(3), list(sparse.items())
+    ([0, 1], [(7, [0])])
+    >>>
+    """
+    def __init__(self, window=64, *, directory=None, key=None, on_load=None, signature=None):
+        """
+        Parameters
+        ----------
+        window, directory, on_load, signature
+            Voir ``_SpillStore``.
+        key : callable, optional
+            Fonction qui a chaque element associe une petite clef
+            toujours gardee en memoire.
+        """
+        assert key is None or callable(key), "'key' has to be callable."
+        super().__init__(window, directory=directory, on_load=on_load, signature=signature)
+        self.key = key
+
+        self._keys = {} # Rang -> clef de l'element, pour tous les elements.
+        self._ranks = {} # Clef -> rang, l'index inverse.
+
+    def find(self, key):
+        """
+        ** Le rang de l'element de clef ``key``, None si il est absent. **
+        """
+        assert self.key is not None, "Il faut fournir 'key' pour chercher une clef."
+        return self._ranks.get(key, None)
+
+    def __setitem__(self, rank, element):
+        """
+        ** Range ``element`` au rang ``rank``. **
+        """
+        if rank in self._keys:
+            self.pop(rank)
+        self._keys[rank] = None if self.key is None else self.key(element)
+        if self.key is not None:
+            self._ranks[self._keys[rank]] = rank
+        self._store(rank, element)
+
+    def __getitem__(self, rank):
+        """
+        ** L'element de rang ``rank``, relu au besoin. **
+        """
+        if rank not in self._keys:
+            raise KeyError(rank)
+        return self._load(rank)
+
+    def pop(self, rank, *default):
+        """
+        ** Retire et renvoie l'element de rang ``rank``. **
+        """
+        if rank not in self._keys:
+            if default:
+                return default[0]
+            raise KeyError(rank)
+        element = self._load(rank)
+        del self._memory[rank]
+        if self.directory is not None and os.path.exists(self._path(rank)):
+            os.remove(self._path(rank))
+        self._ranks.pop(self._keys.pop(rank), None)
+        self._signatures.pop(rank, None)
+        return element
+
+    def keys(self):
+        """
+        ** Les rangs des elements, par ordre croissant. **
+        """
+        return sorted(self._keys)
+
+    def values(self):
+        """
+        ** Cede les elements un a un, en les relisant au besoin. **
+        """
+        for rank in self.keys():
+            yield self._load(rank)
+
+    def items(self):
+        """
+        ** Cede les couples ``(rang, element)``. **
+        """
+        for rank in self.keys():
+            yield rank, self._load(rank)
+
+    def __contains__(self, rank):
+        return rank in self._keys
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        """
+        ** Le nombre total d'elements, en memoire et sur le disque. **
+        """
+        return len(self._keys)
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+
+"""
+** Cache des images et des tableaux derives. **
+-----------------------------------------------
+
+Chaque experience possede un ``CacheManager`` qui decide, a partir d'un budget
+en octets fixe a l'avance, quelles images et quelles matrices gnomoniques
+restent en memoire. Le comportement ne depend donc plus de la charge
+du reste de la machine.
+"""
+
+import collections
+import pickle
+import threading
+import zlib
+
+import numpy as np
+
+
+def _nbytes(value):
+    """
+    ** Estime la place en memoire d'une valeur du cache. **
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from laue.utilities.cache import _nbytes
+    >>> _nbytes(np.zeros((2, 3), dtype=np.uint16))
+    12
+    >>> _nbytes((np.zeros(4), np.zeros(4), (0.0, 1.0)))
+    64
+    >>>
+    """
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (tuple, list)):
+        return sum(_nbytes(v) for v in value)
+    return 0
+
+class CacheManager:
+    """
+    ** Cache LRU borne en octets avec une reserve compressee. **
+
+    Notes
+    -----
+    * Les elements les moins recement utilises sont evinces
+    des que la taille totale depasse ``budget``.
+    * Si ``cold_budget`` est non nul, les elements evinces sont compresses
+    avec ``zlib`` et gardes dans une reserve, elle aussi bornee.
+    * Toutes les methodes sont protegees par un verrou.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from laue.utilities.cache import CacheManager
+    >>> cache = CacheManager(budget=1000, cold_budget=1000)
+    >>> cache.put("a", np.zeros(100, dtype=np.uint8))
+    True
+    >>> cache.put("b", np.zeros(1000, dtype=np.uint8)) # "a" est compresse.
+    True
+    >>> cache.get("a").shape # "a" est decompresse, "b" est compresse.
+    (100,)
+    >>> cache.get("c") is None
+    True
+    >>> stats = cache.stats()
+    >>> stats["hits"], stats["cold_hits"], stats["misses"], stats["evictions"]
+    (0, 1, 1, 2)
+    >>>
+    """
+    def __init__(self, budget, *, cold_budget=0, level=1):
+        """
+        Parameters
+        ----------
+        budget : int
+            La taille maximale en octets des elements non compresses.
+        cold_budget : int, optional
+            La taille maximale en octets des elements compresses.
+            Par defaut, il n'y a pas de reserve compressee.
+        level : int, optional
+            Le niveau de compression de ``zlib``, de 1 (rapide) a 9.
+        """
+        assert isinstance(budget, int), f"'budget' has to be int, not {type(budget).__name__}."
+        assert budget >= 0, f"'budget' can not be negative, not {budget}."
+        assert isinstance(cold_budget, int), \
+            f"'cold_budget' has to be int, not {type(cold_budget).__name__}."
+        assert cold_budget >= 0, f"'cold_budget' can not be negative, not {cold_budget}."
+        assert isinstance(level, int), f"'level' has to be int, not {type(level).__name__}."
+        assert 1 <= level <= 9, f"'level' must be between 1 and 9, not {level}."
+
+        self.budget = budget
+        self.cold_budget = cold_budget
+        self.level = level
+
+        self._lock = threading.RLock()
+        self._hot = collections.OrderedDict() # Clef -> (valeur, taille).
+        self._cold = collections.OrderedDict() # Clef -> donnees compressees.
+        self._hot_bytes = 0
+        self._cold_bytes = 0
+        self._stats = collections.Counter()
+
+    def _evict(self):
+        """
+        ** Evince les elements les plus anciens jusqu'a respecter le budget. **
+        """
+        while self._hot_bytes > self.budget:
+            key, (value, size) = self._hot.popitem(last=False)
+            self._hot_bytes -= size
+            self._stats["evictions"] += 1
+            if self.cold_budget:
+                data = zlib.compress(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), self.level)
+                if len(data) <= self.cold_budget:
+                    self._cold[key] = data
+                    self._cold_bytes += len(data)
+        while self._cold_bytes > self.cold_budget:
+            _, data = self._cold.popitem(last=False)
+            self._cold_bytes -= len(data)
+
+    def put(self, key, value):
+        """
+        ** Ajoute ou remplace un element. **
+
+        Parameters
+        ----------
+        key : hashable
+            La clef de l'element.
+        value : np.ndarray or tuple
+            L'element a garder en memoire.
+
+        Returns
+        -------
+        boolean
+            False si l'element est trop gros pour etre garde.
+        """
+        size = _nbytes(value)
+        with self._lock:
+            self.discard(key)
+            if size > self.budget:
+                return False
+            self._hot[key] = (value, size)
+            self._hot_bytes += size
+            self._evict()
+            return True
+
+    def get(self, key, default=None):
+        """
+        ** Recupere un element, en le decompressant au besoin. **
+
+        Parameters
+        ----------
+        key : hashable
+            La clef de l'element.
+        default : object, optional
+            La valeur renvoyee si l'element n'est pas dans le cache.
+        """
+        with self._lock:
+            if key in self._hot:
+                self._hot.move_to_end(key)
+                self._stats["hits"] += 1
+                return self._hot[key][0]
+            if key in self._cold:
+                data = self._cold.pop(key)
+                self._cold_bytes -= len(data)
+                self._stats["cold_hits"] += 1
+                value = pickle.loads(zlib.decompress(data))
+                size = _nbytes(value)
+                if size <= self.budget:
+                    self._hot[key] = (value, size)
+                    self._hot_bytes += size
+                    self._evict()
+                return value
+            self._stats["misses"] += 1
+            return default
+
+    def discard(self, key):
+        """
+        ** Retire un element du cache si il y est. **
+        """
+        with self._lock:
+            if key in self._hot:
+                self._hot_bytes -= self._hot.pop(key)[1]
+            if key in self._cold:
+                self._cold_bytes -= len(self._cold.pop(key))
+
+    def clear(self):
+        """
+        ** Vide entierement le cache. **
+        """
+        with self._lock:
+            self._hot.clear()
+            self._cold.clear()
+            self._hot_bytes = self._cold_bytes = 0
+
+    def stats(self):
+        """
+        ** Les statistiques d'utilisation du cache. **
+
+        Returns
+        -------
+        dict
+            * hits : Le nombre d'elements trouves non compresses.
+            * cold_hits : Le nombre d'elements trouves compresses.
+            * misses : Le nombre d'elements absents.
+            * evictions : Le nombre d'elements evinces de la memoire non compressee.
+            * hot_bytes, cold_bytes : L'occupation courante de chaque niveau.
+            * hot_items, cold_items : Le nombre d'elements dans chaque niveau.
+        """
+        with self._lock:
+            return {"hits": self._stats["hits"],
+                    "cold_hits": self._stats["cold_hits"],
+                    "misses": self._stats["misses"],
+                    "evictions": self._stats["evictions"],
+                    "hot_bytes": self._hot_bytes,
+                    "cold_bytes": self._cold_bytes,
+                    "hot_items": len(self._hot),
+                    "cold_items": len(self._cold)}
+
+    def __contains__(self, key):
+        """
+        ** Verifie la presence d'un element sans changer son rang. **
+        """
+        with self._lock:
+            return key in self._hot or key in self._cold
+
+    def __len__(self):
+        """
+        ** Le nombre d'elements du cache, compresses ou non. **
+        """
+        with self._lock:
+            return len(self._hot) + len(self._cold)
+
+    def __repr__(self):
+        """
+        ** Representation succinte. **
+        """
+        return f"CacheManager(budget={self.budget}, cold_budget={self.cold_budget}, level={self.level})"
@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+
+"""
+** Gouverneur global du nombre de threads. **
+---------------------------------------------
+
+* OpenCV, numexpr, BLAS et sklearn ont chacun leur propre pool de threads.
+* Combines a un processus par coeur, ils surchargent enormement la machine.
+* Ici, une seule politique fixe le nombre de threads de chaque bibliotheque
+en fonction du nombre de processus.
+* Elle peut aussi epingler les processus sur des coeurs ou des noeuds NUMA
+afin qu'ils ne migrent pas d'un socket a l'autre.
+"""
+
+import collections
+import contextlib
+import glob
+import itertools
+import multiprocessing
+import os
+import re
+
+import cv2
+try:
+    import numexpr
+except ImportError:
+    numexpr = None
+try:
+    import threadpoolctl # Pour controler les threads de BLAS et OpenMP.
+except ImportError:
+    threadpoolctl = None
+
+
+_THREADS = None # Le nombre de threads alloues a ce processus, None si pas de politique.
+_BLAS_LIMITS = None # Garde en vie les limites de threadpoolctl.
+_SHARED_THREADS = [] # Les threads laisses au processus principal par chaque pool ouvert.
+
+def available_cores():
+    """
+    ** Le nombre de coeurs utilisables par ce processus. **
+
+    Returns
+    -------
+    int
+        Tient compte de l'affinite du processus si le systeme le permet.
+    """
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count()
+
+def _parse_cpulist(cpulist):
+    """
+    ** Decode une liste de cpu du noyau linux, comme "0-3,8-11". **
+    """
+    cpus = set()
+    for part in cpulist.strip().split(","):
+        if not part:
+            continue
+        first, _, last = part.partition("-")
+        cpus.update(range(int(first), int(last or first)+1))
+    return cpus
+
+def _read_int(path, default):
+    """
+    ** Lit un entier dans un fichier de ``/sys``. **
+    """
+    try:
+        with open(path, "r") as file:
+            return int(file.read())
+    except (OSError, ValueError):
+        return default
+
+def cpu_topology():
+    """
+    ** La repartition des coeurs logiques utilisables. **
+
+    Notes
+    -----
+    * Les informations sont lues dans ``/sys/devices/system``.
+    * Si elles ne sont pas accessibles, chaque coeur logique est considere
+    comme un coeur physique d'un unique noeud NUMA.
+
+    Returns
+    -------
+    list
+        Pour chaque noeud NUMA, la liste de ses coeurs physiques.
+        Chaque coeur physique est la liste de ses coeurs logiques.
+
+    Examples
+    --------
+    >>> from laue.utilities.concurrency import available_cores, cpu_topology
+    >>> topology = cpu_topology()
+    >>> sum(len(core) for node in topology for core in node) == available_cores()
+    True
+    >>>
+    """
+    allowed = (os.sched_getaffinity(0) if hasattr(os, "sched_getaffinity")
+               else set(range(os.cpu_count())))
+
+    nodes = {}
+    for path in glob.glob("/sys/devices/system/node/node[0-9]*/cpulist"):
+        with open(path, "r") as file:
+            nodes[int(re.search(r"node(\d+)/cpulist$", path).group(1))] = _parse_cpulist(file.read())
+    if not nodes or set().union(*nodes.values()) < allowed:
+        nodes = {0: allowed}
+
+    topology = []
+    for node in sorted(nodes):
+        cores = collections.defaultdict(lambda: [])
+        for cpu in sorted(nodes[node] & allowed):
+            root = f"/sys/devices/system/cpu/cpu{cpu}/topology"
+            cores[(_read_int(f"{root}/physical_package_id", 0),
+                   _read_int(f"{root}/core_id", cpu))].append(cpu)
+        if cores:
+            topology.append(list(cores.values()))
+    return topology
+
+def cpu_placement(affinity, processes):
+    """
+    ** Les coeurs logiques attribues a chaque processus. **
+
+    Parameters
+    ----------
+    affinity : str
+        * "core" : Un coeur physique par processus. Les processus
+        consecutifs sont repartis sur les differents noeuds NUMA.
+        * "node" : Chaque processus peut utiliser tous les coeurs
+        d'un noeud NUMA, les noeuds sont attribues a tour de role.
+    processes : int
+        Le nombre de processus.
+
+    Returns
+    -------
+    list
+        Pour chaque processus, l'ensemble des coeurs logiques autorises.
+
+    Examples
+    --------
+    >>> from laue.utilities.concurrency import cpu_placement
+    >>> placement = cpu_placement("core", 3)
+    >>> len(placement)
+    3
+    >>> all(isinstance(cpus, set) for cpus in placement)
+    True
+    >>>
+    """
+    assert affinity in {"core", "node"}, f"'affinity' must be 'core' or 'node', not {affinity!r}."
+    assert isinstance(processes, int), f"'processes' has to be int, not {type(processes).__name__}."
+
+    topology = cpu_topology()
+    if affinity == "node":
+        slots = [{cpu for core in node for cpu in core} for node in topology]
+    else: # On alterne les noeuds pour equilibrer la charge.
+        slots = [set(core)
+                 for cores in itertools.zip_longest(*topology)
+                 for core in cores if core is not None]
+    return [slots[i % len(slots)] for i in range(processes)]
+
+def get_threads():
+    """
+    ** Le nombre de threads alloues au processus courant. **
+
+    Returns
+    -------
+    int
+        * La valeur fixee par ``set_threads`` si elle a ete appelee.
+        * Sinon, pour le processus principal, la part laissee par les pools
+        ouverts (voir ``sharing_cores``), ou tous les coeurs si il n'y en a pas.
+        * Et 1 pour les autres processus.
+
+    Examples
+    --------
+    >>> from laue.utilities.concurrency import get_threads
+    >>> get_threads() >= 1
+    True
+    >>>
+    """
+    if _THREADS is not None:
+        return _THREADS
+    if multiprocessing.current_process().name == "MainProcess":
+        return min(_SHARED_THREADS, default=available_cores())
+    return 1
+
+@contextlib.contextmanager
+def sharing_cores(threads):
+    """
+    ** Limite les threads du processus principal pendant qu'un pool calcule. **
+
+    Le processus principal calcule parfois lui aussi (DBSCAN des axes
+    de zone par exemple), en meme temps que les processus du pool. Il n'a
+    alors droit qu'a la part d'un processus du pool, pas a tous les coeurs.
+
+    Parameters
+    ----------
+    threads : int
+        Le nombre de threads d'un processus du pool.
+
+    Examples
+    --------
+    >>> from laue.utilities.concurrency import get_threads, sharing_cores
+    >>> with sharing_cores(1):
+    ...     get_threads()
+    ...
+    1
+    >>>
+    """
+    assert isinstance(threads, int), f"'threads' has to be int, not {type(threads).__name__}."
+    assert threads >= 1, f"Il faut au moins un thread, pas {threads}."
+    _SHARED_THREADS.append(threads)
+    try:
+        yield threads
+    finally:
+        _SHARED_THREADS.remove(threads)
+
+def set_threads(threads):
+    """
+    ** Limite les pools de threads de toutes les bibliotheques. **
+
+    Notes
+    -----
+    * Agit sur OpenCV, numexpr, BLAS/OpenMP (via ``threadpoolctl`` si il est installe)
+    et sur le ``n_jobs`` de sklearn utilise dans ``laue``.
+    * Sans ``threadpoolctl``, seules les variables d'environement sont fixees,
+    elles ne concernent que les bibliotheques pas encore chargees.
+
+    Parameters
+    ----------
+    threads : int
+        Le nombre de threads alloues au processus courant.
+    """
+    global _THREADS, _BLAS_LIMITS
+    assert isinstance(threads, int), f"'threads' has to be int, not {type(threads).__name__}."
+    assert threads >= 1, f"Il faut au moins un thread, pas {threads}."
+
+    cv2.setNumThreads(threads)
+    if numexpr is not None:
+        numexpr.set_num_threads(threads)
+    if threadpoolctl is not None:
+        _BLAS_LIMITS = threadpoolctl.threadpool_limits(limits=threads)
+    else:
+        for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+            os.environ[var] = str(threads)
+    _THREADS = threads
+
+def _init_worker(threads, placement, counter):
+    """
+    ** Initialise un processus du pool. **
+
+    Fixe le nombre de threads et, si il y en a un, epingle le processus
+    sur l'ensemble de coeurs suivant de ``placement``.
+    """
+    if placement:
+        with counter.get_lock():
+            slot = counter.value
+            counter.value += 1
+        if hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, placement[slot % len(placement)])
+    set_threads(threads)
+
+class ConcurrencyPolicy:
+    """
+    ** Repartit les coeurs entre processus et threads. **
+
+    * Par defaut, il y a un processus par coeur et chaque processus n'a qu'un thread.
+    * En mode hierarchique, quand il y a moins de diagrammes que de coeurs,
+    les coeurs en trop sont donnes aux threads de chaque processus.
+    * Les processus peuvent etre epingles sur des coeurs ou des noeuds NUMA.
+
+    Examples
+    --------
+    >>> from laue.utilities.concurrency import ConcurrencyPolicy
+    >>> policy = ConcurrencyPolicy(8, cores=8)
+    >>> policy.get_processes(), policy.get_threads()
+    (8, 1)
+    >>> policy = ConcurrencyPolicy(8, cores=8, hierarchical=True)
+    >>> policy.get_processes(nbr_tasks=2), policy.get_threads(nbr_tasks=2)
+    (2, 4)
+    >>>
+    """
+    def __init__(self, processes=None, *, cores=None, hierarchical=False, affinity=None):
+        """
+        Parameters
+        ----------
+        processes : int, optional
+            Le nombre maximum de processus. Par defaut, un par coeur.
+        cores : int, optional
+            Le nombre de coeurs a se partager. Par defaut, tous ceux
+            disponibles pour ce processus.
+        hierarchical : boolean, optional
+            Si True, donne les coeurs inutilises aux threads
+            quand il y a moins de taches que de processus.
+        affinity : str, optional
+            Si il est fourni, epingle les processus.
+            Voir ``laue.utilities.concurrency.cpu_placement``.
+        """
+        if cores is None:
+            cores = available_cores()
+        if processes is None:
+            processes = cores
+        assert isinstance(processes, int), \
+            f"'processes' has to be int, not {type(processes).__name__}."
+        assert processes >= 1, f"Il faut au moins un processus, pas {processes}."
+        assert isinstance(cores, int), f"'cores' has to be int, not {type(cores).__name__}."
+        assert cores >= 1, f"Il faut au moins un coeur, pas {cores}."
+        assert isinstance(hierarchical, bool), \
+            f"'hierarchical' has to be a boolean, not a {type(hierarchical).__name__}."
+        assert affinity in {None, "core", "node"}, \
+            f"'affinity' must be None, 'core' or 'node', not {affinity!r}."
+
+        self.processes = processes
+        self.cores = cores
+        self.hierarchical = hierarchical
+        self.affinity = affinity
+
+    def get_processes(self, nbr_tasks=None):
+        """
+        ** Le nombre de processus a lancer. **
+
+        Parameters
+        ----------
+        nbr_tasks : int, optional
+            Le nombre de taches a traiter, si il est connu.
+        """
+        if self.hierarchical and nbr_tasks is not None:
+            return max(1, min(self.processes, nbr_tasks))
+        return self.processes
+
+    def get_threads(self, nbr_tasks=None):
+        """
+        ** Le nombre de threads par processus. **
+
+        Parameters
+        ----------
+        nbr_tasks : int, optional
+            Le nombre de taches a traiter, si il est connu.
+        """
+        return max(1, self.cores // self.get_processes(nbr_tasks))
+
+    def pool_kwargs(self, nbr_tasks=None):
+        """
+        ** Les arguments a fournir a un ``multiprocessing.Pool``. **
+
+        Parameters
+        ----------
+        nbr_tasks : int, optional
+            Le nombre de taches a traiter, si il est connu.
+
+        Returns
+        -------
+        dict
+            ``processes``, ``initializer`` et ``initargs``.
+        """
+        processes = self.get_processes(nbr_tasks)
+        placement = None if self.affinity is None else cpu_placement(self.affinity, processes)
+        return {"processes": processes,
+                "initializer": _init_worker,
+                "initargs": (self.get_threads(nbr_tasks), placement, multiprocessing.Value("i", 0))}
+
+    def __repr__(self):
+        """
+        ** Renvoi une chaine evaluable de self. **
+        """
+        return (f"ConcurrencyPolicy({self.processes}, cores={self.cores}, "
+                f"hierarchical={self.hierarchical}, affinity={self.affinity!r})")
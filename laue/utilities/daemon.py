@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+
+"""
+** Service d'analyse residant en memoire. **
+--------------------------------------------
+
+* Le demon garde charges ``laue``, les equations compilees du ``Transformer``,
+les predicteurs et un pool de processus deja lances.
+* Il recoit des travaux (images, parametres, fichier de sortie) sur
+un socket Unix et les traite les uns apres les autres.
+* L'avancement de chaque travail est renvoye au client au fur et a mesure.
+
+Pour lancer le demon puis lui soumettre un travail:
+
+    python -m laue.utilities.daemon serve
+    python -m laue.utilities.daemon submit "images/*.mccd" result.pickle --dd 70
+"""
+
+import os
+import pickle
+import queue
+import socket
+import tempfile
+import threading
+import time
+import traceback
+
+from laue.utilities.distributed import recv_message, send_message
+
+
+DEFAULT_ADDRESS = os.path.join(tempfile.gettempdir(), f"laue-{os.getuid()}.sock")
+STAGES = ("diagrams", "zone_axes", "subsets")
+POOL_PARAMETERS = ("processes", "affinity", "max_worker_memory", "backend") # Fixes par le pool du demon.
+
+def _warm_up(_):
+    """
+    ** Importe ``laue`` dans un processus du pool. **
+    """
+    import laue # Les imports sont memorises par le processus.
+    return os.getpid()
+
+class AnalysisDaemon:
+    """
+    ** Traite les travaux soumis par ``laue.utilities.daemon.submit``. **
+
+    Notes
+    -----
+    * Un seul travail est traite a la fois, les autres attendent dans une file.
+    * Les experiences successives partagent le meme ``Transformer``, le meme
+    pool et les memes predicteurs. Seul le premier travail d'une calibration
+    donnee paye la compilation des equations.
+    * Comme le pool est partage, un travail ne peut pas fournir les parametres
+    qui le configurent (``POOL_PARAMETERS``), il est alors refuse.
+    * Le message ``("shutdown",)`` arrete le demon apres le travail en cours.
+
+    Examples
+    --------
+    >>> import os, tempfile, threading
+    >>> from laue.utilities.daemon import AnalysisDaemon, ping
+    >>> address = os.path.join(tempfile.mkdtemp(), "laue.sock")
+    >>> daemon = AnalysisDaemon(address, processes=1)
+    >>> thread = threading.Thread(target=daemon.serve_forever)
+    >>> thread.start()
+    >>> ping(address)["jobs"]
+    0
+    >>> daemon.shutdown()
+    >>> thread.join()
+    >>>
+    """
+    def __init__(self, address=DEFAULT_ADDRESS, *, processes=None):
+        """
+        Parameters
+        ----------
+        address : str, optional
+            Le chemin du socket Unix sur lequel le demon ecoute.
+        processes : int, optional
+            Le nombre de processus du pool. Par defaut, un par coeur.
+        """
+        assert isinstance(address, str), f"'address' has to be str, not {type(address).__name__}."
+
+        from laue.core.geometry.transformer import Transformer
+        from laue.utilities.concurrency import ConcurrencyPolicy
+        from laue.utilities.scheduling import WorkerPool
+
+        self.address = address
+        self.transformer = Transformer()
+        self.predictors = {}
+        policy = ConcurrencyPolicy(processes)
+        self.pool = WorkerPool(**policy.pool_kwargs())
+        self.pool.map(_warm_up, range(policy.get_processes()))
+
+        self._jobs = queue.Queue() # Les travaux en attente, (identifiant, travail, fonction d'envoi).
+        self._counter = 0
+        self._done = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+        if os.path.exists(address):
+            os.remove(address)
+        self._listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._listener.bind(address)
+        os.chmod(address, 0o600) # Les travaux sont deserialises, seul le proprietaire peut en soumettre.
+        self._listener.listen() # Les clients peuvent se connecter des maintenant.
+        self._listener.settimeout(.2)
+
+    def run_job(self, job, report=lambda *message: None):
+        """
+        ** Traite un travail. **
+
+        Parameters
+        ----------
+        job : dict
+            * images : Un repertoire, une expression glob ou une liste de chemins.
+            * parameters : Les parametres de ``laue.experiment.base_experiment.Experiment``,
+            sauf ceux du pool (``POOL_PARAMETERS``).
+            * stages : Les etapes a calculer, parmi "diagrams", "zone_axes" et "subsets".
+            * output : Si il est fourni, le chemin ou l'experience est serialisee avec pickle.
+        report : callable
+            Appelee avec ``("progress", etape, nbr_diagrammes_traites)``
+            apres chaque diagramme de chaque etape.
+
+        Returns
+        -------
+        dict
+            Le resume du travail: nombre de diagrammes, duree et fichier de sortie.
+
+        Raises
+        ------
+        ValueError
+            Si le travail fournit des parametres du pool (``POOL_PARAMETERS``).
+        """
+        from laue.experiment.base_experiment import Experiment
+
+        start = time.time()
+        images = job["images"]
+        if isinstance(images, str) and os.path.isdir(images):
+            images = os.path.join(images, "*")
+        stages = job.get("stages", ("diagrams",))
+        assert set(stages) <= set(STAGES), f"Les etapes doivent etre parmi {STAGES}, pas {stages}."
+        parameters = job.get("parameters", {})
+        refused = [name for name in POOL_PARAMETERS if name in parameters]
+        if refused:
+            raise ValueError(f"Le demon utilise son propre pool, les parametres {refused} "
+                "ne peuvent pas etre fournis. Ils se reglent au lancement du demon.")
+
+        experiment = Experiment(images, **parameters)
+        experiment.transformer = self.transformer
+        experiment._predictors = self.predictors
+        experiment._shared_pool = self.pool
+
+        iterators = {"diagrams": lambda: experiment.get_diagrams(tense_flow=True),
+                     "zone_axes": lambda: experiment.find_zone_axes(tense_flow=True),
+                     "subsets": lambda: experiment.find_subsets(tense_flow=True)}
+        try:
+            for stage in STAGES:
+                if stage in stages or stage == "diagrams":
+                    for i, _ in enumerate(iterators[stage]()):
+                        report("progress", stage, i+1)
+
+            if job.get("output", None) is not None:
+                with open(job["output"], "wb") as file:
+                    pickle.dump(experiment, file)
+        finally:
+            experiment.close() # Le pool partage n'est pas ferme.
+        return {"diagrams": len(experiment), "elapsed": time.time()-start,
+                "output": job.get("output", None), "failures": experiment.get_failures()}
+
+    def _job_loop(self):
+        """
+        ** Traite les travaux de la file un par un. **
+        """
+        while True:
+            item = self._jobs.get()
+            if item is None:
+                return
+            job_id, job, send = item
+            try:
+                summary = self.run_job(job, lambda *message: send((*message[:1], job_id, *message[1:])))
+            except Exception: # L'erreur est transmise au client, le demon continue.
+                send(("error", job_id, traceback.format_exc()))
+            else:
+                send(("done", job_id, summary))
+            with self._lock:
+                self._done += 1
+
+    def _handle(self, sock):
+        """
+        ** Dialogue avec un client. **
+        """
+        send_lock = threading.Lock()
+        def send(message):
+            try:
+                with send_lock:
+                    send_message(sock, message)
+            except OSError: # Le client n'ecoute plus, le travail continue.
+                pass
+        try:
+            while True:
+                message = recv_message(sock)
+                if message[0] == "submit":
+                    with self._lock:
+                        job_id = self._counter
+                        self._counter += 1
+                    self._jobs.put((job_id, message[1], send))
+                    send(("queued", job_id, self._jobs.qsize()))
+                elif message[0] == "ping":
+                    with self._lock:
+                        send(("pong", {"pid": os.getpid(), "jobs": self._counter,
+                                       "done": self._done, "queued": self._jobs.qsize()}))
+                elif message[0] == "shutdown":
+                    self.shutdown()
+                    return
+        except (OSError, EOFError):
+            pass
+
+    def serve_forever(self):
+        """
+        ** Ecoute les clients jusqu'a l'appel de ``shutdown``. **
+        """
+        worker = threading.Thread(target=self._job_loop, daemon=True)
+        worker.start()
+        try:
+            while not self._stop.is_set():
+                try:
+                    sock, _ = self._listener.accept()
+                except socket.timeout:
+                    continue
+                sock.settimeout(None)
+                threading.Thread(target=self._handle, args=(sock,), daemon=True).start()
+        finally:
+            self._listener.close()
+            if os.path.exists(self.address):
+                os.remove(self.address)
+            self._jobs.put(None)
+            worker.join()
+            self.pool.terminate()
+
+    def shutdown(self):
+        """
+        ** Demande l'arret du demon. **
+        """
+        self._stop.set()
+
+def _connect(address):
+    """
+    ** Ouvre une connexion vers le demon. **
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(address)
+    return sock
+
+def ping(address=DEFAULT_ADDRESS):
+    """
+    ** L'etat du demon. **
+
+    Returns
+    -------
+    dict
+        Le pid du demon, le nombre de travaux recus, termines et en attente.
+    """
+    with _connect(address) as sock:
+        send_message(sock, ("ping",))
+        return recv_message(sock)[1]
+
+def submit(images, output=None, *, stages=("diagrams",), address=DEFAULT_ADDRESS,
+        on_progress=None, **parameters):
+    """
+    ** Soumet un travail au demon et attend son resultat. **
+
+    Parameters
+    ----------
+    images : str or list
+        Un repertoire, une expression glob ou une liste de chemins d'images.
+        Les chemins doivent avoir un sens pour le demon.
+    output : str, optional
+        Le fichier ou le demon serialise l'experience traitee.
+    stages : tuple, optional
+        Les etapes a calculer, parmi "diagrams", "zone_axes" et "subsets".
+    address : str, optional
+        Le chemin du socket Unix du demon.
+    on_progress : callable, optional
+        ``on_progress(stage, nbr)`` est appelee a chaque diagramme traite.
+    **parameters
+        Les parametres de ``laue.experiment.base_experiment.Experiment``.
+        Ceux du pool (``laue.utilities.daemon.POOL_PARAMETERS``) sont refuses par le demon.
+
+    Returns
+    -------
+    dict
+        Le resume renvoye par ``laue.utilities.daemon.AnalysisDaemon.run_job``.
+
+    Raises
+    ------
+    RuntimeError
+        Si le travail a echoue dans le demon.
+    """
+    job = {"images": images, "output": output, "stages": tuple(stages), "parameters": parameters}
+    with _connect(address) as sock:
+        send_message(sock, ("submit", job))
+        while True:
+            message = recv_message(sock)
+            if message[0] == "progress" and on_progress is not None:
+                on_progress(*message[2:])
+            elif message[0] == "done":
+                return message[2]
+            elif message[0] == "error":
+                raise RuntimeError(f"Le travail {message[1]} a echoue:\n{message[2]}")
+
+def shutdown(address=DEFAULT_ADDRESS):
+    """
+    ** Arrete le demon apres son travail en cours. **
+    """
+    with _connect(address) as sock:
+        send_message(sock, ("shutdown",))
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Demon d'analyse de laue.")
+    parser.add_argument("--address", default=DEFAULT_ADDRESS, help="Chemin du socket Unix.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve_parser = commands.add_parser("serve", help="Lance le demon.")
+    serve_parser.add_argument("--processes", type=int, default=None, help="Nombre de processus.")
+    submit_parser = commands.add_parser("submit", help="Soumet un travail.")
+    submit_parser.add_argument("images", help="Repertoire ou expression glob des images.")
+    submit_parser.add_argument("output", nargs="?", default=None, help="Fichier pickle de sortie.")
+    submit_parser.add_argument("--stages", nargs="+", default=["diagrams"], choices=STAGES)
+    for name in ("dd", "xcen", "ycen", "xbet", "xgam", "pixelsize"):
+        submit_parser.add_argument(f"--{name}", type=float, default=None)
+    commands.add_parser("ping", help="Affiche l'etat du demon.")
+    commands.add_parser("shutdown", help="Arrete le demon.")
+    parsed = parser.parse_args()
+
+    if parsed.command == "serve":
+        AnalysisDaemon(parsed.address, processes=parsed.processes).serve_forever()
+    elif parsed.command == "submit":
+        parameters = {name: getattr(parsed, name)
+                      for name in ("dd", "xcen", "ycen", "xbet", "xgam", "pixelsize")
+                      if getattr(parsed, name) is not None}
+        print(submit(parsed.images, parsed.output, stages=parsed.stages, address=parsed.address,
+            on_progress=lambda stage, nbr: print(f"\r{stage}: {nbr}", end="", flush=True),
+            **parameters))
+    elif parsed.command == "ping":
+        print(ping(parsed.address))
+    else:
+        shutdown(parsed.address)
@@ -10,23 +10,77 @@ acces a l'instance de l'experience. Il est donc difficile d'enregistrer
 les resultats au fur a mesure. C'est pour cela qu'on ajoute a la classe
 ``laue.experiment.base_experiment.Experiment`` une interface chargee d'enregistrer
 l'etat de l'experience pour pouvoir la reprendre a tout moments.
+
+L'etat est enregistre dans un journal ou l'on ne fait qu'ajouter:
+
+* Le journal commence par un etat complet de l'experience, ses diagrammes
+sont ecrits a la suite un a un.
+* A chaque point de sauvegarde, les diagrammes nouveaux depuis le precedent
+y sont ajoutes en entier. Pour ceux deja enregistres, seuls les resultats
+qui ont change (axes, bouts de grains, hkl) sont ajoutes, sans les spots.
+* Tous les ``compaction`` points, le journal est reecrit dans un fichier
+temporaire qui remplace l'ancien de facon atomique.
+* Chaque enregistrement est precede de sa taille et de son CRC32. A la lecture,
+un enregistrement tronque par un arret brutal est ignore avec tout ce qui le suit.
 """
 
 import numbers
 import os
 import pickle
+import struct
 import threading
 import time
+import zlib
 
 
 __pdoc__ = {"Recordable.__enter__": True}
 
+MAGIC = b"LAUEJRN1" # Debut d'un fichier journal.
+FRAME = struct.Struct("!BQI") # Compression, taille et CRC32 de chaque enregistrement.
+
+def _write_frame(file, record, compress=False):
+    """
+    ** Ajoute un enregistrement au journal. **
+    """
+    payload = pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+    if compress:
+        from gzip import compress as gzip_compress
+        payload = gzip_compress(payload)
+    file.write(FRAME.pack(compress, len(payload), zlib.crc32(payload)))
+    file.write(payload)
+
+def _read_frames(file):
+    """
+    ** Cede les enregistrements valides du journal. **
+
+    S'arrete silencieusement au premier enregistrement incomplet ou corrompu.
+
+    Yields
+    ------
+    record : object
+        L'enregistrement deserialise.
+    end : int
+        La position de la fin de cet enregistrement dans le fichier.
+    """
+    while True:
+        header = file.read(FRAME.size)
+        if len(header) < FRAME.size:
+            return
+        compress, size, crc = FRAME.unpack(header)
+        payload = file.read(size)
+        if len(payload) < size or zlib.crc32(payload) != crc:
+            return
+        if compress:
+            from gzip import decompress
+            payload = decompress(payload)
+        yield pickle.loads(payload), file.tell()
+
 
 class Recordable(threading.Thread):
     """
     ** Interface asynchrone gerant la persistance des donnees. **
     """
-    def __init__(self, saving_file="experiment_state", compress=False, dt=600, **_kwargs):
+    def __init__(self, saving_file="experiment_state", compress=False, dt=600, compaction=32, **_kwargs):
         """
         ** Initialise le gestionaire d'enregistrement. **
 
@@ -43,18 +97,29 @@ class Recordable(threading.Thread):
             plus de CPU mais reduit un peu la taille des donnees a ecrire.
         dt : number
             Le temps qui separe 2 enregistrements (en secondes).
+        compaction : int
+            Le nombre de points de sauvegarde incrementaux
+            au dela duquel le journal est reecrit entierement.
         """
         assert isinstance(saving_file, str), f"'file' has to be of type str, not {type(saving_file).__name__}."
         assert isinstance(compress, bool), \
             f"'compress' has to be of type bool, not {type(compress).__name__}."
         assert isinstance(dt, numbers.Number), f"'dt' has to be a number, not a {type(dt).__name__}."
         assert dt > 0, f"Le temps vaut {dt}."
+        assert isinstance(compaction, int), f"'compaction' has to be int, not {type(compaction).__name__}."
+        assert compaction >= 1, f"'compaction' has to be positive, not {compaction}."
 
         self.saving_file = saving_file
         self.compress = compress
         self.dt = dt
+        self.compaction = compaction
 
         self._must_die = False
+        self._journal_lock = threading.Lock()
+        self._journal_end = None # La fin du dernier enregistrement valide, None si il faut tout reecrire.
+        self._journal_saved = {} # A chaque rang en memoire, la signature des resultats enregistres.
+        self._journal_count = 0 # Le nombre de diagrammes du tampon deja enregistres.
+        self._journal_deltas = 0 # Le nombre de points incrementaux depuis le dernier etat complet.
 
         threading.Thread.__init__(self)
 
@@ -157,33 +222,88 @@ class Recordable(threading.Thread):
         if self.verbose:
             print("Updating the current state...")
         with open(self.saving_file, "rb") as f:
-            compress = f.read(1)
-            if compress == b"\x00":
+            head = f.read(len(MAGIC))
+            if head == MAGIC:
+                records = [record for record, _ in _read_frames(f)]
+                if not records or records[0][0] != "state":
+                    raise ValueError(f"Le journal {self.saving_file!r} ne contient pas d'etat complet.")
+                state = self._merge_deltas(records[0][1], [delta for _, delta in records[1:]])
+            elif head[:1] == b"\x00":
+                f.seek(1)
                 state = pickle.load(f)
-            elif compress == b"\x01":
+            elif head[:1] == b"\x01":
                 from gzip import decompress
+                f.seek(1)
                 state = pickle.loads(decompress(f.read()))
             else:
                 raise ValueError(r"Le fichier doit commencer par b'\x00' ou b'\x01'."
-                    f"Or il commence par {compress}.")
+                    f"Or il commence par {head[:1]}.")
         self.__setstate__(state)
+        self._journal_end = None # Le prochain point reecrit un journal propre.
         if self.verbose:
             print("    OK: the attributes are updated")
 
-    def save_state(self):
+    def save_state(self, *, compact=False):
         """
         ** Enregistre l'etat courant. **
+
+        Parameters
+        ----------
+        compact : boolean, optional
+            Si True, reecrit tout le journal au lieu
+            d'y ajouter seulement les changements.
         """
         if self.verbose >= 2:
             print("Recording of the current status...")
-        state = self.__getstate__()
-        with open(self.saving_file, "wb") as f:
-            if self.compress:
-                from gzip import compress
-                f.write(b"\x01")
-                f.write(compress(pickle.dumps(state)))
-            else:
-                f.write(b"\x00")
-                pickle.dump(state, f)
+        with self._journal_lock:
+            for attempt in range(3): # Les producteurs peuvent modifier un diagramme pendant sa lecture.
+                try:
+                    if compact or self._journal_end is None or self._journal_deltas >= self.compaction:
+                        self._compact_journal()
+                    else:
+                        self._append_journal()
+                except RuntimeError: # 'dictionary changed size during iteration'
+                    if attempt == 2:
+                        raise
+                    time.sleep(.01)
+                else:
+                    break
         if self.verbose >= 2:
             print("    OK: the state of the experiment is recorded.")
+
+    def _compact_journal(self):
+        """
+        ** Reecrit le journal avec un etat complet, de facon atomique. **
+
+        L'etat est ecrit sans les diagrammes, qui le suivent un a un pour
+        ne jamais relire tous les diagrammes deportes a la fois.
+        """
+        saved, count = self._get_signatures() # Les signatures avant la capture.
+        temp_file = f"{self.saving_file}.tmp"
+        with open(temp_file, "wb") as f:
+            f.write(MAGIC)
+            _write_frame(f, ("state", self._get_bare_state()), self.compress)
+            for delta in self._iter_state_deltas(saved, count):
+                _write_frame(f, ("delta", delta), self.compress)
+            f.flush()
+            os.fsync(f.fileno())
+            end = f.tell()
+        os.replace(temp_file, self.saving_file) # Atomique, l'ancien journal reste valide jusque la.
+        self._journal_end = end
+        self._journal_saved, self._journal_count = saved, count
+        self._journal_deltas = 0
+
+    def _append_journal(self):
+        """
+        ** Ajoute au journal les changements depuis le dernier point. **
+        """
+        delta, saved, count = self._get_delta(self._journal_saved, self._journal_count)
+        with open(self.saving_file, "r+b") as f:
+            f.seek(self._journal_end)
+            f.truncate() # Efface une eventuelle fin corrompue.
+            _write_frame(f, ("delta", delta), self.compress)
+            f.flush()
+            os.fsync(f.fileno())
+            self._journal_end = f.tell()
+        self._journal_saved, self._journal_count = saved, count
+        self._journal_deltas += 1
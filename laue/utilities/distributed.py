@@ -0,0 +1,737 @@
+#!/usr/bin/env python3
+
+"""
+** Execution des taches sur des processus distants. **
+------------------------------------------------------
+
+* Les taches sont envoyees par TCP ou par socket Unix a des processus ``laue``
+qui peuvent tourner sur d'autres machines.
+* Chaque message est un objet serialise avec ``cloudpickle``, precede de sa taille
+codee sur 8 octets.
+* Comme pour ``multiprocessing.connection``, les deux bouts s'authentifient
+mutuellement par un defi HMAC avant d'echanger le moindre objet serialise.
+La clef est celle de ``multiprocessing.current_process().authkey``, heritee par
+les processus fils, ou bien celle de la variable d'environement ``LAUE_AUTHKEY``
+(en hexadecimal) qu'il faut alors fixer sur toutes les machines.
+* Les processus de calcul signalent regulierement qu'ils sont vivants. Les taches
+d'un processus perdu sont redistribuees aux autres.
+* ``DistributedPool`` s'utilise comme un ``multiprocessing.Pool``, il peut donc
+etre fourni a ``laue.utilities.scheduling.scheduled_imap``.
+
+Sur chaque machine de calcul, il suffit de lancer:
+
+    LAUE_AUTHKEY=... python -m laue.utilities.distributed host:port
+"""
+
+import collections
+import hmac
+import itertools
+import multiprocessing
+import os
+import pickle
+import socket
+import struct
+import threading
+import time
+
+import cloudpickle
+
+
+HEADER = struct.Struct("!Q") # La taille du message qui suit, en octets.
+CHALLENGE = b"#CHALLENGE#"
+WELCOME = b"#WELCOME#"
+FAILURE = b"#FAILURE#"
+NONCE_SIZE = 32
+
+def default_authkey():
+    """
+    ** La clef d'authentification par defaut. **
+
+    Returns
+    -------
+    bytes
+        Le contenu hexadecimal de la variable d'environement ``LAUE_AUTHKEY``
+        si elle existe, sinon ``multiprocessing.current_process().authkey``.
+    """
+    if os.environ.get("LAUE_AUTHKEY", ""):
+        return bytes.fromhex(os.environ["LAUE_AUTHKEY"])
+    return bytes(multiprocessing.current_process().authkey)
+
+def _send_bytes(sock, data):
+    """
+    ** Envoie des octets bruts, precedes de leur taille. **
+    """
+    sock.sendall(HEADER.pack(len(data)) + data)
+
+def _recv_bytes(sock, max_size):
+    """
+    ** Recoit des octets bruts, sans jamais en accepter plus de ``max_size``. **
+    """
+    size, = HEADER.unpack(_recv_exact(sock, HEADER.size))
+    if size > max_size:
+        raise multiprocessing.AuthenticationError(f"Message de {size} octets inattendu.")
+    return bytes(_recv_exact(sock, size))
+
+def _deliver_challenge(sock, authkey):
+    """
+    ** Verifie que l'autre bout connait la clef. **
+    """
+    nonce = os.urandom(NONCE_SIZE)
+    _send_bytes(sock, CHALLENGE + nonce)
+    digest = _recv_bytes(sock, 64)
+    if not hmac.compare_digest(digest, hmac.new(authkey, nonce, "sha256").digest()):
+        _send_bytes(sock, FAILURE)
+        raise multiprocessing.AuthenticationError("La reponse au defi est fausse.")
+    _send_bytes(sock, WELCOME)
+
+def _answer_challenge(sock, authkey):
+    """
+    ** Prouve a l'autre bout que l'on connait la clef. **
+    """
+    message = _recv_bytes(sock, len(CHALLENGE) + NONCE_SIZE)
+    if not message.startswith(CHALLENGE):
+        raise multiprocessing.AuthenticationError("Le defi est mal forme.")
+    _send_bytes(sock, hmac.new(authkey, message[len(CHALLENGE):], "sha256").digest())
+    if _recv_bytes(sock, len(WELCOME)) != WELCOME:
+        raise multiprocessing.AuthenticationError("La clef a ete refusee.")
+
+def authenticate(sock, authkey, *, server):
+    """
+    ** Authentification mutuelle des deux bouts d'un socket. **
+
+    Doit etre faite avant tout appel a ``recv_message``, qui deserialise
+    ce qu'il recoit et ne doit donc lire que des pairs de confiance.
+
+    Parameters
+    ----------
+    sock : socket.socket
+        Le socket connecte.
+    authkey : bytes
+        La clef secrete partagee par les deux bouts.
+    server : boolean
+        True du cote qui a accepte la connexion, False de l'autre.
+
+    Raises
+    ------
+    multiprocessing.AuthenticationError
+        Si l'autre bout ne connait pas la clef.
+
+    Examples
+    --------
+    >>> import socket, threading
+    >>> from laue.utilities.distributed import authenticate
+    >>> sock1, sock2 = socket.socketpair()
+    >>> thread = threading.Thread(target=authenticate, args=(sock2, b"key"), kwargs={"server": False})
+    >>> thread.start()
+    >>> authenticate(sock1, b"key", server=True)
+    >>> thread.join()
+    >>>
+    """
+    assert isinstance(authkey, bytes), f"'authkey' has to be bytes, not {type(authkey).__name__}."
+    if server:
+        _deliver_challenge(sock, authkey)
+        _answer_challenge(sock, authkey)
+    else:
+        _answer_challenge(sock, authkey)
+        _deliver_challenge(sock, authkey)
+
+def send_message(sock, obj):
+    """
+    ** Envoie un objet serialise, precede de sa taille. **
+
+    Parameters
+    ----------
+    sock : socket.socket
+        Le socket connecte.
+    obj : object
+        Un objet serialisable avec ``cloudpickle``.
+    """
+    data = cloudpickle.dumps(obj)
+    sock.sendall(HEADER.pack(len(data)))
+    sock.sendall(data)
+
+def _recv_exact(sock, size):
+    """
+    ** Lit exactement ``size`` octets. **
+    """
+    buff = bytearray(size)
+    view = memoryview(buff)
+    pos = 0
+    while pos < size:
+        nbytes = sock.recv_into(view[pos:], size-pos)
+        if not nbytes:
+            raise ConnectionError("La connexion a ete fermee.")
+        pos += nbytes
+    return buff
+
+def recv_message(sock):
+    """
+    ** Recoit un objet envoye par ``send_message``. **
+
+    Le message est deserialise avec pickle, le socket doit donc
+    etre authentifie au prealable (voir ``authenticate``).
+
+    Raises
+    ------
+    ConnectionError
+        Si la connexion est fermee avant la fin du message.
+
+    Examples
+    --------
+    >>> import socket
+    >>> from laue.utilities.distributed import recv_message, send_message
+    >>> sock1, sock2 = socket.socketpair()
+    >>> send_message(sock1, ("task", 0, abs, (-1,), {}))
+    >>> recv_message(sock2)
+    ('task', 0, <built-in function abs>, (-1,), {})
+    >>>
+    """
+    size, = HEADER.unpack(_recv_exact(sock, HEADER.size))
+    return pickle.loads(_recv_exact(sock, size))
+
+def parse_address(address):
+    """
+    ** Interprete une adresse de socket. **
+
+    Parameters
+    ----------
+    address : str or tuple
+        * ``"host:port"`` ou ``(host, port)`` pour TCP.
+        * Un chemin pour un socket Unix.
+
+    Returns
+    -------
+    family : int
+        ``socket.AF_INET`` ou ``socket.AF_UNIX``.
+    address : str or tuple
+        L'adresse telle que l'attend ``socket``.
+
+    Examples
+    --------
+    >>> from laue.utilities.distributed import parse_address
+    >>> parse_address("localhost:8000")[1]
+    ('localhost', 8000)
+    >>> parse_address("/tmp/laue.sock")[1]
+    '/tmp/laue.sock'
+    >>>
+    """
+    if isinstance(address, tuple):
+        return socket.AF_INET, (address[0], int(address[1]))
+    assert isinstance(address, str), \
+        f"'address' has to be str or tuple, not {type(address).__name__}."
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit() and "/" not in address:
+        return socket.AF_INET, (host, int(port))
+    return socket.AF_UNIX, address
+
+def _connect(address, timeout):
+    """
+    ** Se connecte au coordinateur, en reessayant jusqu'a ``timeout``. **
+    """
+    family, address = parse_address(address)
+    deadline = time.time() + timeout
+    while True:
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        try:
+            sock.connect(address)
+        except OSError:
+            sock.close()
+            if time.time() > deadline:
+                raise
+            time.sleep(.1)
+        else:
+            return sock
+
+def _heartbeat(sock, send_lock, interval, stop):
+    """
+    ** Signale regulierement au coordinateur que le processus est vivant. **
+    """
+    while not stop.wait(interval):
+        try:
+            with send_lock:
+                send_message(sock, ("heartbeat",))
+        except OSError:
+            return
+
+def serve_worker(address, *, heartbeat=1.0, connect_timeout=10.0, reconnect=False, authkey=None):
+    """
+    ** Boucle d'un processus de calcul. **
+
+    Se connecte au coordinateur, execute les taches qu'il envoie
+    une par une et lui renvoie les resultats.
+
+    Parameters
+    ----------
+    address : str or tuple
+        L'adresse du ``DistributedPool``. Voir ``parse_address``.
+    heartbeat : float, optional
+        L'intervalle en secondes entre deux signes de vie.
+    connect_timeout : float, optional
+        La duree en secondes pendant laquelle on reessaye de se connecter.
+    reconnect : boolean, optional
+        Si True, se reconnecte indefiniment a chaque perte du coordinateur,
+        ce qui permet de servir plusieurs pools successifs.
+    authkey : bytes, optional
+        La clef partagee avec le coordinateur, par defaut ``default_authkey()``.
+    """
+    authkey = default_authkey() if authkey is None else authkey
+    while True:
+        try:
+            sock = _connect(address, connect_timeout)
+        except OSError:
+            if reconnect:
+                continue
+            return
+        try:
+            sock.settimeout(connect_timeout)
+            authenticate(sock, authkey, server=False)
+            sock.settimeout(None)
+        except (OSError, multiprocessing.AuthenticationError):
+            sock.close()
+            if reconnect:
+                time.sleep(heartbeat)
+                continue
+            return
+        send_lock = threading.Lock()
+        stop = threading.Event()
+        threading.Thread(target=_heartbeat, args=(sock, send_lock, heartbeat, stop), daemon=True).start()
+        try:
+            with send_lock:
+                send_message(sock, ("hello", socket.gethostname(), os.getpid()))
+            while True:
+                message = recv_message(sock)
+                if message[0] == "stop":
+                    return
+                _, task_id, func, args, kwds = message
+                try:
+                    reply = ("result", task_id, True, func(*args, **kwds))
+                except Exception as err: # L'erreur est transmise au coordinateur.
+                    reply = ("result", task_id, False, err)
+                with send_lock:
+                    try:
+                        send_message(sock, reply)
+                    except (pickle.PicklingError, TypeError, AttributeError) as err:
+                        send_message(sock, ("result", task_id, False, RuntimeError(repr(err))))
+        except (OSError, EOFError):
+            pass
+        finally:
+            stop.set()
+            sock.close()
+        if not reconnect:
+            return
+
+class DistributedResult:
+    """
+    ** Resultat asynchrone d'une tache distante. **
+
+    Meme interface que ``multiprocessing.pool.AsyncResult``.
+    L'attribut ``started`` est la date d'envoi de la tache a un processus
+    de calcul, None tant qu'elle attend dans la file du pool.
+    """
+    def __init__(self, callback=None, error_callback=None):
+        self.started = None
+        self._event = threading.Event()
+        self._callback = callback
+        self._error_callback = error_callback
+        self._success = None
+        self._value = None
+
+    def _set(self, success, value):
+        self._success, self._value = success, value
+        self._event.set()
+        if success and self._callback is not None:
+            self._callback(value)
+        elif not success and self._error_callback is not None:
+            self._error_callback(value)
+
+    def ready(self):
+        """
+        ** True si la tache est terminee. **
+        """
+        return self._event.is_set()
+
+    def successful(self):
+        """
+        ** True si la tache s'est terminee sans erreur. **
+        """
+        assert self.ready(), "La tache n'est pas terminee."
+        return self._success
+
+    def wait(self, timeout=None):
+        """
+        ** Attend la fin de la tache. **
+        """
+        self._event.wait(timeout)
+
+    def get(self, timeout=None):
+        """
+        ** Renvoie le resultat, ou leve l'erreur de la tache. **
+        """
+        if not self._event.wait(timeout):
+            raise multiprocessing.TimeoutError("La tache n'est pas terminee.")
+        if not self._success:
+            raise self._value
+        return self._value
+
+class DistributedPool:
+    """
+    ** Pool de processus de calcul connectes par socket. **
+
+    Notes
+    -----
+    * Les processus de calcul se connectent d'eux meme a ``address``,
+    voir ``serve_worker``. Ils peuvent arriver ou partir a tout moment.
+    * Chaque processus execute une seule tache a la fois.
+    * Un processus qui ne donne plus signe de vie pendant ``timeout``
+    secondes est considere comme perdu, sa tache est redistribuee.
+    Une tache perdue plus de ``max_losses`` fois echoue avec
+    ``laue.utilities.scheduling.WorkerLost``.
+    * Un processus qui ne repond pas au defi d'authentification est rejete
+    avant qu'un seul de ses messages ne soit deserialise.
+    * Le pool signale quand chaque tache est envoyee (``DistributedResult.started``),
+    ainsi ``laue.utilities.scheduling.scheduled_imap`` ne compte pas l'attente
+    dans la file dans le delai d'une tache.
+
+    Examples
+    --------
+    >>> from laue.utilities.distributed import DistributedPool, LocalCluster
+    >>> with DistributedPool(("127.0.0.1", 0)) as pool, LocalCluster(2, pool.address):
+    ...     pool.map(abs, [-1, -2, -3])
+    ...
+    [1, 2, 3]
+    >>>
+    """
+    reports_dispatch = True # Voir ``DistributedResult.started``.
+
+    def __init__(self, address=("127.0.0.1", 0), *, heartbeat=1.0, timeout=None, max_losses=2,
+            authkey=None):
+        """
+        Parameters
+        ----------
+        address : str or tuple, optional
+            L'adresse d'ecoute. Voir ``parse_address``. Un port 0
+            laisse le systeme choisir, l'adresse reelle est ``self.address``.
+        heartbeat : float, optional
+            L'intervalle de surveillance des processus, en secondes.
+        timeout : float, optional
+            La duree sans signe de vie au bout de laquelle un processus
+            est considere comme perdu. Par defaut ``10*heartbeat``.
+        max_losses : int, optional
+            Le nombre de fois qu'une tache peut etre redistribuee.
+        authkey : bytes, optional
+            La clef que doivent connaitre les processus de calcul,
+            par defaut ``default_authkey()``.
+        """
+        assert isinstance(heartbeat, (int, float)), \
+            f"'heartbeat' has to be a number, not {type(heartbeat).__name__}."
+        assert heartbeat > 0, f"'heartbeat' doit etre positif, il vaut {heartbeat}."
+        assert timeout is None or timeout > 0, f"'timeout' doit etre positif, il vaut {timeout}."
+        assert isinstance(max_losses, int), f"'max_losses' has to be int, not {type(max_losses).__name__}."
+        assert authkey is None or isinstance(authkey, bytes), \
+            f"'authkey' has to be bytes, not {type(authkey).__name__}."
+
+        family, sock_address = parse_address(address)
+        if family == socket.AF_UNIX and os.path.exists(sock_address):
+            os.remove(sock_address)
+        self._listener = socket.socket(family, socket.SOCK_STREAM)
+        if family == socket.AF_INET:
+            self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._listener.bind(sock_address)
+        self._listener.listen()
+        self.address = self._listener.getsockname()
+
+        self.heartbeat = heartbeat
+        self.timeout = 10*heartbeat if timeout is None else timeout
+        self.max_losses = max_losses
+        self._authkey = default_authkey() if authkey is None else authkey
+
+        self._lock = threading.Condition()
+        self._counter = itertools.count()
+        self._queue = collections.deque() # Les identifiants des taches en attente.
+        self._jobs = {} # A chaque tache, (func, args, kwds, result, nbr de pertes).
+        self._workers = {} # A chaque socket, [dernier signe de vie, tache en cours, verrou d'envoi].
+        self._closed = False
+        self._terminated = False
+
+        self._accept_thread = threading.Thread(target=self._accept_loop, daemon=True)
+        self._accept_thread.start()
+        threading.Thread(target=self._monitor_loop, daemon=True).start()
+
+    @property
+    def _processes(self):
+        """
+        ** Le nombre de processus de calcul connectes. **
+        """
+        with self._lock:
+            return len(self._workers)
+
+    def _accept_loop(self):
+        """
+        ** Accepte les nouveaux processus de calcul. **
+        """
+        while not self._terminated:
+            try:
+                sock, _ = self._listener.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._read_loop, args=(sock,), daemon=True).start()
+
+    def _read_loop(self, sock):
+        """
+        ** Authentifie un processus de calcul puis recoit ses messages. **
+        """
+        try:
+            sock.settimeout(self.timeout)
+            authenticate(sock, self._authkey, server=True)
+            sock.settimeout(None)
+        except (OSError, multiprocessing.AuthenticationError):
+            sock.close()
+            return
+        with self._lock:
+            if self._terminated:
+                sock.close()
+                return
+            self._workers[sock] = [time.time(), None, threading.Lock()]
+        self._dispatch()
+
+        try:
+            while True:
+                message = recv_message(sock)
+                with self._lock:
+                    if sock not in self._workers:
+                        return
+                    self._workers[sock][0] = time.time()
+                    if message[0] != "result":
+                        continue
+                    _, task_id, success, value = message
+                    self._workers[sock][1] = None
+                    job = self._jobs.pop(task_id, None)
+                    self._lock.notify_all()
+                if job is not None:
+                    job[3]._set(success, value)
+                self._dispatch()
+        except (OSError, EOFError, pickle.UnpicklingError):
+            self._lose(sock)
+
+    def _monitor_loop(self):
+        """
+        ** Detecte les processus qui ne donnent plus signe de vie. **
+        """
+        while not self._terminated:
+            time.sleep(self.heartbeat)
+            with self._lock:
+                silent = [sock for sock, (last, *_) in self._workers.items()
+                          if time.time() - last > self.timeout]
+            for sock in silent:
+                self._lose(sock)
+
+    def _lose(self, sock):
+        """
+        ** Oublie un processus perdu et redistribue sa tache. **
+        """
+        failed = None
+        with self._lock:
+            state = self._workers.pop(sock, None)
+            if state is not None and state[1] is not None and state[1] in self._jobs:
+                job = self._jobs[state[1]]
+                job[4] += 1
+                if job[4] > self.max_losses:
+                    failed = self._jobs.pop(state[1])
+                else:
+                    job[3].started = None # Elle attend de nouveau dans la file.
+                    self._queue.appendleft(state[1]) # Prioritaire.
+            self._lock.notify_all()
+        try:
+            sock.close()
+        except OSError:
+            pass
+        if failed is not None:
+            from laue.utilities.scheduling import WorkerLost
+            failed[3]._set(False, WorkerLost(
+                f"La tache a ete perdue par {failed[4]} processus de calcul."))
+        self._dispatch()
+
+    def _dispatch(self):
+        """
+        ** Attribue les taches en attente aux processus libres. **
+        """
+        assignments = []
+        with self._lock:
+            idle = [sock for sock, state in self._workers.items() if state[1] is None]
+            while idle and self._queue:
+                task_id = self._queue.popleft()
+                if task_id not in self._jobs:
+                    continue
+                sock = idle.pop()
+                self._workers[sock][1] = task_id
+                func, args, kwds, result, _ = self._jobs[task_id]
+                result.started = time.time()
+                assignments.append((sock, self._workers[sock][2], ("task", task_id, func, args, kwds)))
+        for sock, send_lock, message in assignments:
+            try:
+                with send_lock:
+                    send_message(sock, message)
+            except OSError:
+                self._lose(sock)
+
+    def apply_async(self, func, args=(), kwds=None, callback=None, error_callback=None):
+        """
+        ** Same as ``multiprocessing.pool.Pool.apply_async``. **
+        """
+        assert not self._closed, "Le pool est ferme."
+        result = DistributedResult(callback, error_callback)
+        with self._lock:
+            task_id = next(self._counter)
+            self._jobs[task_id] = [func, tuple(args), dict(kwds or {}), result, 0]
+            self._queue.append(task_id)
+        self._dispatch()
+        return result
+
+    def apply(self, func, args=(), kwds=None):
+        """
+        ** Same as ``multiprocessing.pool.Pool.apply``. **
+        """
+        return self.apply_async(func, args, kwds).get()
+
+    def imap_unordered(self, func, iterable):
+        """
+        ** Same as ``multiprocessing.pool.Pool.imap_unordered``. **
+        """
+        done = collections.deque()
+        ready = threading.Semaphore(0)
+        def put(value):
+            done.append(value)
+            ready.release()
+        results = [self.apply_async(func, (args,), callback=put, error_callback=put)
+                   for args in iterable]
+        for _ in results:
+            ready.acquire()
+            value = done.popleft()
+            if isinstance(value, BaseException):
+                raise value
+            yield value
+
+    def imap(self, func, iterable):
+        """
+        ** Same as ``multiprocessing.pool.Pool.imap``. **
+        """
+        results = [self.apply_async(func, (args,)) for args in iterable]
+        for result in results:
+            yield result.get()
+
+    def map(self, func, iterable):
+        """
+        ** Same as ``multiprocessing.pool.Pool.map``. **
+        """
+        return list(self.imap(func, iterable))
+
+    def close(self):
+        """
+        ** Refuse les nouvelles taches. **
+        """
+        self._closed = True
+
+    def join(self):
+        """
+        ** Attend la fin de toutes les taches. **
+        """
+        with self._lock:
+            while self._jobs:
+                self._lock.wait(self.heartbeat)
+
+    def terminate(self):
+        """
+        ** Deconnecte tous les processus et arrete d'ecouter. **
+
+        Les processus lances avec ``reconnect=True`` attendent le pool suivant.
+        L'adresse est liberee au retour, un nouveau pool peut aussitot l'occuper.
+        """
+        with self._lock:
+            self._closed = self._terminated = True
+            sockets = list(self._workers)
+            self._workers.clear()
+        for sock in sockets:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+                sock.close()
+            except OSError:
+                pass
+        try: # Debloque 'accept', sinon le socket reste a l'ecoute.
+            self._listener.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        try:
+            self._listener.close()
+        except OSError:
+            pass
+        if self._accept_thread is not threading.current_thread():
+            self._accept_thread.join()
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.remove(self.address)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.terminate()
+
+class LocalCluster:
+    """
+    ** Lance des processus de calcul locaux pour un ``DistributedPool``. **
+
+    Permet de tester le calcul distribue sur une seule machine.
+    Les processus se reconnectent a chaque nouveau pool de meme adresse
+    et sont tues a la sortie du contexte.
+    """
+    def __init__(self, processes, address, *, heartbeat=1.0):
+        """
+        Parameters
+        ----------
+        processes : int
+            Le nombre de processus de calcul.
+        address : str or tuple
+            L'adresse du ``DistributedPool``.
+        heartbeat : float, optional
+            L'intervalle en secondes entre deux signes de vie.
+        """
+        assert isinstance(processes, int), f"'processes' has to be int, not {type(processes).__name__}."
+        assert processes >= 1, f"Il faut au moins un processus, pas {processes}."
+        self.processes = [
+            multiprocessing.Process(target=serve_worker, args=(address,),
+                kwargs={"heartbeat": heartbeat, "reconnect": True}, daemon=True)
+            for _ in range(processes)]
+
+    def start(self):
+        """
+        ** Demarre les processus. **
+        """
+        for process in self.processes:
+            process.start()
+        return self
+
+    def stop(self):
+        """
+        ** Tue les processus. **
+        """
+        for process in self.processes:
+            if process.is_alive():
+                process.kill()
+            process.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *_):
+        self.stop()
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Processus de calcul distant de laue.")
+    parser.add_argument("address", help="host:port ou chemin du socket Unix du coordinateur.")
+    parser.add_argument("--heartbeat", type=float, default=1.0, help="Intervalle des signes de vie (s).")
+    parser.add_argument("--once", action="store_true", help="Ne pas se reconnecter.")
+    parsed = parser.parse_args()
+    if not os.environ.get("LAUE_AUTHKEY", ""):
+        parser.error("La variable d'environement LAUE_AUTHKEY doit contenir la clef du coordinateur.")
+    serve_worker(parsed.address, heartbeat=parsed.heartbeat, reconnect=not parsed.once)
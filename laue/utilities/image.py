@@ -90,6 +90,50 @@ def read_image(image_path, *, ignore_errors=False):
     image = image.astype(np.uint16)
     return image
 
+def check_image(image, image_name, shape=None):
+    """
+    ** Verifie qu'une image peut etre traitee. **
+
+    Ce sont les verifications de ``laue.experiment.base_experiment.Experiment``,
+    faites aussi par les processus qui lisent eux meme leurs images.
+
+    Parameters
+    ----------
+    image : np.ndarray
+        L'image lue.
+    image_name : str
+        Le nom de l'image, pour les messages d'erreur.
+    shape : tuple, optional
+        Les dimensions des images precedentes, si elles sont connues.
+
+    Raises
+    ------
+    TypeError
+        Si l'image n'est pas une matrice 2d de type uint16.
+    ValueError
+        Si l'image n'a pas les dimensions ``shape``.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from laue.utilities.image import check_image
+    >>> check_image(np.zeros((4, 4), dtype=np.uint16), "image_0", (4, 4))
+    >>> check_image(np.zeros((4, 4), dtype=np.uint8), "image_1")
+    Traceback (most recent call last):
+        ...
+    TypeError: L'image image_1 doit etre encodee en uint16, pas uint8.
+    >>>
+    """
+    if not isinstance(image, np.ndarray):
+        raise TypeError(f"L'image doit etre un array numpy, pas un {type(image).__name__}.")
+    if image.ndim != 2:
+        raise TypeError(f"L'image {image_name} doit etre en niveau de gris pas de dimension {image.ndim}.")
+    if image.dtype != np.uint16:
+        raise TypeError(f"L'image {image_name} doit etre encodee en uint16, pas {image.dtype}.")
+    if shape is not None and tuple(shape) != image.shape:
+        raise ValueError(f"L'image {image_name} a pour taille {image.shape} tandis que les images "
+            f"precedentes ont pour taille {tuple(shape)}. Les images ne sont pas issues de la meme experience.")
+
 def create_image(positions, intensities=None, *, shape=None):
     """
     ** Genere syntetiquement une image de laue. **
@@ -156,6 +200,68 @@ def create_image(positions, intensities=None, *, shape=None):
 
     return image
     
+def read_hdf5_stack(filename, dataset=None, *, batch_size=16):
+    """
+    ** Lit peu a peu une pile d'images HDF5. **
+
+    Parameters
+    ----------
+    filename : str
+        Le chemin du fichier HDF5.
+    dataset : str, optional
+        Le chemin du jeu de donnees 3d dans le fichier, de shape (n, height, width).
+        Par defaut, c'est le premier jeu de donnees 3d rencontre.
+    batch_size : int, optional
+        Le nombre d'images lues d'un coup, pour amortir les acces au disque.
+
+    Yields
+    ------
+    np.ndarray
+        Chaque image en niveau de gris encodee en uint16.
+
+    Raises
+    ------
+    ImportError
+        Si le module ``h5py`` n'est pas installe.
+    KeyError
+        Si le fichier ne contient aucun jeu de donnees 3d.
+
+    Examples
+    --------
+    >>> import os, tempfile
+    >>> import h5py
+    >>> import numpy as np
+    >>> from laue.utilities.image import read_hdf5_stack
+    >>> filename = os.path.join(tempfile.mkdtemp(), "stack.h5")
+    >>> with h5py.File(filename, "w") as file:
+    ...     _ = file.create_dataset("entry/data", data=np.ones((3, 4, 5)))
+    ...
+    >>> [image.shape for image in read_hdf5_stack(filename, batch_size=2)]
+    [(4, 5), (4, 5), (4, 5)]
+    >>>
+    """
+    assert isinstance(filename, str), f"'filename' has to be str, not {type(filename).__name__}."
+    assert dataset is None or isinstance(dataset, str), \
+        f"'dataset' has to be str, not {type(dataset).__name__}."
+    assert isinstance(batch_size, int), f"'batch_size' has to be int, not {type(batch_size).__name__}."
+    assert batch_size >= 1, f"'batch_size' has to be positive, not {batch_size}."
+    try:
+        import h5py
+    except ImportError as err:
+        raise ImportError("Pour lire les fichiers HDF5, il faut installer le module 'h5py'.") from err
+
+    with h5py.File(filename, "r") as file:
+        if dataset is None:
+            stacks = []
+            file.visititems(lambda name, obj: stacks.append(name)
+                if isinstance(obj, h5py.Dataset) and obj.ndim == 3 else None)
+            if not stacks:
+                raise KeyError(f"Le fichier {filename!r} ne contient pas de pile d'images.")
+            dataset = stacks[0]
+        stack = file[dataset]
+        for start in range(0, stack.shape[0], batch_size):
+            yield from stack[start:start+batch_size].astype(np.uint16)
+
 def images_to_iter(images):
     """
     ** Converti les images en un generateur d'images. **
@@ -166,9 +272,14 @@ def images_to_iter(images):
         Ce qui representes les images. Que ce soit le nom
         d'un dossier, d'une image elle meme, une glob expression,
         une liste d'image ou bien un generateur.
+        Une pile HDF5 est designee par ``"fichier.h5"`` ou ``"fichier.h5::/jeu/de/donnees"``,
+        voir ``laue.utilities.image.read_hdf5_stack``.
     """
     if isinstance(images, str): # Dans le cas ou une chaine de caractere
-        if os.path.isdir(images): # decrit l'ensemble des images.
+        filename, _, dataset = images.partition("::")
+        if filename.lower().endswith((".h5", ".hdf5", ".nxs")) and os.path.isfile(filename):
+            images = read_hdf5_stack(filename, dataset or None)
+        elif os.path.isdir(images): # decrit l'ensemble des images.
             images = sorted(
                 os.path.join(father, file)
                 for father, _, files in os.walk(images)
@@ -18,7 +18,17 @@ import time
 import cloudpickle
 
 
-def limited_imap(pool, func, iterable, **kwargs):
+def _pickelable_indexed(args):
+    """
+    ** Evalue une fonction en conservant le rang de la tache. **
+
+    Permet a ``Pool.imap_unordered`` de ceder des resultats
+    dont on est capable de retrouver l'origine.
+    """
+    func, rank, func_args = args
+    return rank, func(func_args)
+
+def limited_imap(pool, func, iterable, *, ordered=True, **kwargs):
     """
     ** Same as ``Pool.imap`` with limited buffer. **
 
@@ -37,6 +47,13 @@ def limited_imap(pool, func, iterable, **kwargs):
         La fonction serialisable avec pickle qui sera evaluee.
     iterable : iterable
         Cede sucessivement les argument a fournir a ``func``.
+    ordered : boolean, optional
+        * True (par defaut) : Les resultats sont cedes dans l'ordre
+        des arguments, comme avec ``Pool.imap``.
+        * False : Les resultats sont cedes des qu'ils sont prets,
+        comme avec ``Pool.imap_unordered``. Chaque resultat est alors
+        accompagne du rang de l'argument qui l'a produit. Voir
+        ``reorder`` pour retrouver l'ordre initial.
     **kwargs
         See ``multiprocessing.Pool().imap``.
 
@@ -44,6 +61,19 @@ def limited_imap(pool, func, iterable, **kwargs):
     ------
     result
         Cede peu a peu les resultats de la fonction ``func``.
+        Si ``ordered`` est False, cede les couples ``(rank, result)``.
+
+    Examples
+    --------
+    >>> import multiprocessing
+    >>> from laue.utilities.multi_core import limited_imap
+    >>> with multiprocessing.Pool(2) as pool:
+    ...     list(limited_imap(pool, abs, [-1, -2, -3]))
+    ...     sorted(limited_imap(pool, abs, [-1, -2, -3], ordered=False))
+    ...
+    [1, 2, 3]
+    [(0, 1), (1, 2), (2, 3)]
+    >>>
     """
     class Regulator:
         """
@@ -80,9 +110,18 @@ def limited_imap(pool, func, iterable, **kwargs):
             """
             Cede les resultats.
             """
-            for res in self.pool.imap(func, self, **kwargs):
+            for res in _imap(self.pool, func, self, **kwargs):
                 self.nbr_yields += 1
                 yield res
+
+    def _imap(pool, func, iterable, **kwargs):
+        if ordered:
+            yield from pool.imap(func, iterable, **kwargs)
+        else:
+            yield from pool.imap_unordered(
+                _pickelable_indexed,
+                ((func, rank, args) for rank, args in enumerate(iterable)),
+                **kwargs)
     
     try:
         import psutil
@@ -93,11 +132,54 @@ def limited_imap(pool, func, iterable, **kwargs):
         psutil = None
     
     if psutil is None:
-        yield from pool.imap(func, iterable, **kwargs)
+        yield from _imap(pool, func, iterable, **kwargs)
     else:
         regulator = Regulator(pool, iterable)
         yield from regulator.imap(func, **kwargs)
 
+def reorder(iterable, start=0):
+    """
+    ** Remet dans l'ordre des resultats indexes. **
+
+    C'est le tampon de reordonnancement qui permet aux utilisateurs
+    du mode ``ordered=False`` de retrouver l'ordre des taches.
+    Les resultats arrives en avance sont gardes en memoire
+    jusqu'a ce que tous les precedents soient cedes.
+
+    Parameters
+    ----------
+    iterable : iterable
+        Cede les couples ``(rank, result)`` dans un ordre quelconque.
+        Chaque rang ne doit apparaitre qu'une seule fois.
+    start : int, optional
+        Le rang du premier element a ceder.
+
+    Yields
+    ------
+    result
+        Les resultats, dans l'ordre croissant des rangs.
+
+    Examples
+    --------
+    >>> from laue.utilities.multi_core import reorder
+    >>> list(reorder([(2, "c"), (0, "a"), (1, "b")]))
+    ['a', 'b', 'c']
+    >>> list(reorder([(4, "e"), (3, "d")], start=3))
+    ['d', 'e']
+    >>>
+    """
+    assert isinstance(start, int), f"'start' has to be int, not {type(start).__name__}."
+
+    pending = {} # Les resultats arrives en avance.
+    for rank, result in iterable:
+        pending[rank] = result
+        while start in pending:
+            yield pending.pop(start)
+            start += 1
+    if pending:
+        raise ValueError(f"Il manque le resultat de rang {start}, "
+            f"alors que {len(pending)} resultats suivants sont arrives.")
+
 def pickleable_method(args, serialize=False):
     """
     ** Permet de serialiser une methode. **
@@ -396,3 +478,20 @@ class RecallingIterator:
                     self.buffer.append(element)
                     self.stape += 1
                     return element
+
+    @staticmethod
+    def forget(base_iterator, *, mother=None):
+        """
+        ** Oublie les elements deja cedes par ``base_iterator``. **
+
+        A appeler avant de remplacer un iterateur dont les elements
+        ne sont plus valables. Sinon, un nouvel iterateur qui reprendrait
+        la meme adresse memoire reutiliserait l'ancienne memoire.
+        """
+        signature = hashlib.md5(id(base_iterator).to_bytes(16, "big")).hexdigest()
+        buffer_name = f"_buffer_recalling_{signature}"
+        if mother is not None:
+            if hasattr(mother, buffer_name):
+                delattr(mother, buffer_name)
+        else:
+            globals().pop(buffer_name, None)
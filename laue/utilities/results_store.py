@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+
+"""
+** Enregistre les resultats d'une experience en colonnes dans un fichier HDF5. **
+---------------------------------------------------------------------------------
+
+Contrairement a pickle, le fichier n'est pas relu en entier a l'ouverture.
+Les diagrammes et leurs spots sont reconstruits a la demande a partir
+des seules lignes qui les concernent.
+
+Organisation du fichier:
+
+* ``/diagrams`` : Une ligne par diagramme, son nom et les decalages
+``spot_offset``, ``axis_offset`` et ``subset_offset`` de ses lignes dans les autres tables.
+Les parametres des axes et des bouts de grains sont dans ``axes_key`` et ``subsets_key``.
+* ``/spots`` : Une ligne par spot (boite, position, intensite, distortion, qualite
+et si la camera est calibree, les coordonnees gnomoniques).
+* ``/axes`` : Une ligne par axe de zone (``phi``, ``mu``), la liste de ses spots
+est ``spots[spot_offset[i]:spot_offset[i+1]]``, en indices locaux au diagramme.
+* ``/subsets`` : Meme representation que les axes pour les bouts de grains.
+* ``/calibration`` et ``/provenance`` : Les parametres de la camera
+et ceux de chaque etape de calcul, dans les attributs.
+"""
+
+import json
+import numbers
+import time
+import weakref
+
+import numpy as np
+
+
+FORMAT = "laue-results"
+VERSION = 1
+SPOT_COLUMNS = ("x", "y", "w", "h", "position_x", "position_y", "intensity", "distortion", "quality")
+
+def _import_h5py():
+    """
+    ** Importe ``h5py`` ou leve une erreur explicite. **
+    """
+    try:
+        import h5py
+    except ImportError as err:
+        raise ImportError("Pour utiliser les fichiers de resultats HDF5, "
+            "il faut installer le module 'h5py'.") from err
+    return h5py
+
+def _to_json(parameters):
+    """
+    ** Serialise des parametres simples en json, ignore les autres. **
+    """
+    if parameters is None:
+        return "null"
+    return json.dumps({key: (float(value) if isinstance(value, numbers.Real)
+                             and not isinstance(value, (bool, int)) else value)
+                       for key, value in parameters.items()
+                       if value is None or isinstance(value, (numbers.Number, str, bool))})
+
+def _write_column(group, name, data, chunk):
+    """
+    ** Ecrit une colonne compressee par morceaux. **
+    """
+    data = np.asarray(data)
+    if data.dtype.kind == "U":
+        import h5py
+        data = data.astype(h5py.string_dtype())
+    if not len(data):
+        group.create_dataset(name, data=data)
+        return
+    group.create_dataset(name, data=data, chunks=(min(chunk, len(data)), *data.shape[1:]),
+        compression="gzip", shuffle=data.dtype.kind != "O")
+
+def _csr(groups):
+    """
+    ** Aplatit une liste de listes d'indices en (decalages, indices). **
+    """
+    offsets = np.zeros(len(groups)+1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(group) for group in groups])
+    indices = np.fromiter((ind for group in groups for ind in sorted(group)),
+        dtype=np.int32, count=int(offsets[-1]))
+    return offsets, indices
+
+def write_results(experiment, filename, *, chunk=65536):
+    """
+    ** Enregistre les resultats deja calcules d'une experience. **
+
+    Notes
+    -----
+    * Seuls les diagrammes deja extraits sont enregistres, rien n'est calcule.
+    * Pour chaque diagramme, ce sont les derniers axes de zone et bouts de grains
+    calcules qui sont enregistres, avec les parametres qui ont permis de les obtenir.
+    * Les images ne sont pas copiees, seuls leurs noms sont conserves.
+
+    Parameters
+    ----------
+    experiment : laue.experiment.base_experiment.Experiment
+        L'experience a enregistrer.
+    filename : str
+        Le chemin du fichier ``.h5`` a creer, il est ecrase si il existe.
+    chunk : int, optional
+        Le nombre de lignes par morceau compresse.
+
+    Examples
+    --------
+    >>> import os, tempfile
+    >>> import numpy as np
+    >>> import laue
+    >>> from laue.utilities.results_store import open_results, write_results
+    >>> images = [np.zeros((64, 64), dtype=np.uint16) for _ in range(3)]
+    >>> images[1][30:33, 20:23] = 1000
+    >>> experiment = laue.Experiment(images)
+    >>> _ = experiment.get_diagrams()
+    >>> filename = os.path.join(tempfile.mkdtemp(), "results.h5")
+    >>> write_results(experiment, filename)
+    >>> stored = open_results(filename)
+    >>> len(stored), [len(diag) for diag in stored]
+    (3, [0, 1, 0])
+    >>> stored[1][0].get_bbox() == experiment[1][0].get_bbox()
+    True
+    >>>
+    """
+    from laue.experiment.base_experiment import Experiment
+    assert isinstance(experiment, Experiment), \
+        f"'experiment' has to be an Experiment, not a {type(experiment).__name__}."
+    assert isinstance(filename, str), f"'filename' has to be str, not {type(filename).__name__}."
+    assert isinstance(chunk, int), f"'chunk' has to be int, not {type(chunk).__name__}."
+    assert chunk >= 1, f"'chunk' has to be positive, not {chunk}."
+    h5py = _import_h5py()
+
+    calibrated = experiment._calibration_parameters is not None
+    spots = {name: [] for name in SPOT_COLUMNS + (("gnomonic_x", "gnomonic_y") if calibrated else ())}
+    names, spot_counts = [], []
+    axes_key, axes_phi, axes_mu, axes_spots, axis_counts = [], [], [], [], []
+    subsets_key, subsets_spots, subset_counts = [], [], []
+
+    for diag in experiment._buff_diags: # Un a un, les diagrammes deportes ne sont pas tous relus.
+        names.append(diag.get_id())
+        spot_counts.append(len(diag))
+        for name, column in zip("xywh", diag._bbox.transpose()):
+            spots[name].append(column)
+        positions = diag._get_positions(np.arange(len(diag)))
+        spots["position_x"].append(positions[0])
+        spots["position_y"].append(positions[1])
+        spots["intensity"].append(diag._intensities)
+        spots["distortion"].append(diag._distortions)
+        spots["quality"].append(diag._qualities)
+        if calibrated and len(diag):
+            gnomonic_x, gnomonic_y = diag.get_gnomonic_positions()
+            spots["gnomonic_x"].append(gnomonic_x)
+            spots["gnomonic_y"].append(gnomonic_y)
+
+        key, axes = next(reversed(diag._axes.items()), ((np.nan,)*3, []))
+        axes_key.append([np.nan if value is None else value for value in key])
+        axis_counts.append(len(axes))
+        for axis in axes:
+            axes_phi.append(axis.get_polar_coords()[0])
+            axes_mu.append(axis.get_polar_coords()[1])
+            axes_spots.append([spot.get_id() for spot in axis])
+
+        key, subsets = next(reversed(diag._subsets.items()), ((np.nan,)*3, []))
+        subsets_key.append(key)
+        subset_counts.append(len(subsets))
+        subsets_spots.extend([spot.get_id() for spot in subset] for subset in subsets)
+
+    with h5py.File(filename, "w") as file:
+        file.attrs["format"] = FORMAT
+        file.attrs["version"] = VERSION
+        file.attrs["nbr_diagrams"] = len(names)
+        file.attrs["kwargs"] = _to_json(
+            {key: value for key, value in experiment.kwargs.items() if key != "saving_file"})
+        file.attrs["detection"] = _to_json(
+            {"threshold": experiment.threshold, "font_size": experiment.font_size,
+             "max_space": experiment.max_space})
+        file.attrs["shape"] = (-1, -1) if experiment._shape is None else experiment._shape
+
+        group = file.create_group("calibration")
+        for name, value in (experiment._calibration_parameters or {}).items():
+            group.attrs[name] = float(value)
+
+        group = file.create_group("provenance")
+        group.attrs["created"] = time.asctime()
+        for stage in experiment.stages.dependencies:
+            group.attrs[stage] = _to_json(experiment.stages.get_parameters(stage))
+
+        group = file.create_group("diagrams")
+        _write_column(group, "name", np.array(names, dtype=str), chunk)
+        for name, counts in (("spot_offset", spot_counts), ("axis_offset", axis_counts),
+                             ("subset_offset", subset_counts)):
+            _write_column(group, name, np.concatenate([[0], np.cumsum(counts, dtype=np.int64)]), chunk)
+        _write_column(group, "axes_key", np.array(axes_key, dtype=np.float64).reshape(-1, 3), chunk)
+        _write_column(group, "subsets_key", np.array(subsets_key, dtype=np.float64).reshape(-1, 3), chunk)
+
+        group = file.create_group("spots")
+        dtypes = {"x": np.int32, "y": np.int32, "w": np.int32, "h": np.int32} # Comme a l'extraction.
+        for name, column in spots.items():
+            column = np.concatenate(column) if column else np.empty(0)
+            _write_column(group, name, column.astype(dtypes.get(name, np.float64)), chunk)
+
+        group = file.create_group("axes")
+        _write_column(group, "phi", np.array(axes_phi, dtype=np.float32), chunk)
+        _write_column(group, "mu", np.array(axes_mu, dtype=np.float32), chunk)
+        offsets, indices = _csr(axes_spots)
+        _write_column(group, "spot_offset", offsets, chunk)
+        _write_column(group, "spots", indices, chunk)
+
+        group = file.create_group("subsets")
+        offsets, indices = _csr(subsets_spots)
+        _write_column(group, "spot_offset", offsets, chunk)
+        _write_column(group, "spots", indices, chunk)
+
+class _StoredDiagrams:
+    """
+    ** Les diagrammes d'un fichier de resultats, reconstruits a la demande. **
+
+    S'utilise comme le tampon ``_buff_diags`` d'une experience. Un diagramme
+    reste le meme objet tant qu'il est reference ailleurs.
+    """
+    def __init__(self, file, experiment, names):
+        self._file = file
+        self.experiment = experiment
+        self._names = list(names) # Comme ``laue.utilities.buffers.SpillBuffer.keys``.
+        self._nbr = int(file.attrs["nbr_diagrams"])
+        self._calibrated = "gnomonic_x" in file["spots"]
+        self._alive = weakref.WeakValueDictionary() # Les diagrammes deja reconstruits.
+        self._extra = [] # Les diagrammes ajoutes apres l'ouverture.
+
+    def _build(self, rank):
+        """
+        ** Reconstruit le diagramme de rang ``rank``. **
+        """
+        from laue.diagram import LaueDiagram
+        from laue.zone_axis import ZoneAxis
+
+        file = self._file
+        group = file["diagrams"]
+        start, stop = group["spot_offset"][rank:rank+2]
+        diag = LaueDiagram(self._names[rank], self.experiment)
+        columns = {name: dataset[start:stop] for name, dataset in file["spots"].items()}
+
+        # Les images des spots ne sont pas stockees, seules leurs grandeurs le sont.
+        diag._set_spots(np.stack([columns[name] for name in "xywh"], axis=1), columns["distortion"],
+                        np.empty(0, dtype=np.uint16), np.zeros(stop-start, dtype=bool),
+                        intensities=columns["intensity"],
+                        positions=np.stack([columns["position_x"], columns["position_y"]], axis=1))
+        diag._qualities = columns["quality"].astype(np.float64)
+        if self._calibrated:
+            diag._gnomonics = np.stack( # Les coordonnees projetees sont toujours en float64.
+                [columns["gnomonic_x"], columns["gnomonic_y"]], axis=1).astype(np.float64)
+            diag._tokens["gnomonic"] = self.experiment.stages.token("gnomonic")
+
+        start, stop = group["axis_offset"][rank:rank+2]
+        if stop > start:
+            key = tuple(group["axes_key"][rank].tolist())
+            bounds = file["axes/spot_offset"][start:stop+1]
+            indices = file["axes/spots"][bounds[0]:bounds[-1]]
+            phi_s, mu_s = file["axes/phi"][start:stop], file["axes/mu"][start:stop]
+            diag._axes[key] = [
+                ZoneAxis(diagram=diag, spots_ind=indices[bounds[i]-bounds[0]:bounds[i+1]-bounds[0]],
+                         identifier=i, phi=phi_s[i], mu=mu_s[i])
+                for i in range(stop-start)]
+            diag._tokens["zone_axes"] = self.experiment.stages.token("zone_axes")
+
+        start, stop = group["subset_offset"][rank:rank+2]
+        if stop > start:
+            key = tuple(group["subsets_key"][rank].tolist())
+            bounds = file["subsets/spot_offset"][start:stop+1]
+            indices = file["subsets/spots"][bounds[0]:bounds[-1]]
+            diag._subsets[key] = [
+                {diag[int(ind)] for ind in indices[bounds[i]-bounds[0]:bounds[i+1]-bounds[0]]}
+                for i in range(stop-start)]
+            diag._tokens["subsets"] = self.experiment.stages.token("subsets")
+        return diag
+
+    def append(self, diag):
+        self._names.append(diag.get_id())
+        self._extra.append(diag)
+
+    def keys(self):
+        return self._names
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self[rank] for rank in range(*item.indices(len(self)))]
+        if item < 0:
+            item += len(self)
+        if not 0 <= item < len(self):
+            raise IndexError(f"Le rang {item} n'est pas dans [0, {len(self)}[.")
+        if item >= self._nbr:
+            return self._extra[item-self._nbr]
+        diag = self._alive.get(item, None)
+        if diag is None:
+            diag = self._build(item)
+            self._alive[item] = diag
+        return diag
+
+    def __iter__(self):
+        for rank in range(len(self)):
+            yield self[rank]
+
+    def __len__(self):
+        return self._nbr + len(self._extra)
+
+def open_results(filename):
+    """
+    ** Ouvre un fichier de resultats sans le lire. **
+
+    Notes
+    -----
+    * Seuls les attributs et les decalages sont lus a l'ouverture, chaque
+    diagramme est reconstruit quand on y accede.
+    * Les positions, intensites et qualites des spots proviennent du fichier,
+    leurs images ne sont pas disponibles.
+    * Le fichier reste ouvert en lecture tant que l'experience existe.
+
+    Parameters
+    ----------
+    filename : str
+        Le chemin d'un fichier cree par ``laue.utilities.results_store.write_results``.
+
+    Returns
+    -------
+    laue.experiment.base_experiment.Experiment
+        Une experience dont tous les diagrammes sont consideres comme extraits.
+    """
+    assert isinstance(filename, str), f"'filename' has to be str, not {type(filename).__name__}."
+    h5py = _import_h5py()
+    from laue.experiment.base_experiment import Experiment
+
+    file = h5py.File(filename, "r")
+    if file.attrs.get("format", None) != FORMAT:
+        file.close()
+        raise ValueError(f"Le fichier {filename!r} n'est pas un fichier de resultats de laue.")
+
+    kwargs = json.loads(file.attrs["kwargs"])
+    kwargs.update(json.loads(file.attrs["detection"]))
+    names = list(file["diagrams/name"].asstr()[()])
+    experiment = Experiment(names, **kwargs)
+    if tuple(file.attrs["shape"]) != (-1, -1):
+        experiment._shape = tuple(int(size) for size in file.attrs["shape"])
+    if len(file["calibration"].attrs):
+        experiment._calibration_parameters = {
+            name: float(value) for name, value in file["calibration"].attrs.items()}
+
+    experiment._buff_images = names
+    experiment._images = []
+    experiment._images_offset = len(names)
+    experiment._buff_diags = _StoredDiagrams(file, experiment, names)
+    experiment._len = len(names)
+    weakref.finalize(experiment, file.close)
+    return experiment
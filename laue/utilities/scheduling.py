@@ -0,0 +1,495 @@
+#!/usr/bin/env python3
+
+"""
+** Ordonnancement des taches selon leur cout. **
+------------------------------------------------
+
+* Estime le temps de calcul et la memoire de chaque tache a partir du nombre de spots.
+* Lance les taches les plus lourdes en premier pour reduire la latence de queue.
+* Limite les taches simultanees pour que leur memoire estimee tienne dans un budget.
+* Tolere les pannes: delai maximal par tache, limite memoire des processus,
+remplacement des processus perdus et nouvelles tentatives degradees.
+"""
+
+import collections
+import itertools
+import math
+import multiprocessing
+import multiprocessing.pool
+import os
+import queue
+import signal
+import threading
+import time
+
+try:
+    import psutil # Pour acceder a la memoire disponible.
+except ImportError:
+    psutil = None
+
+
+class CostModel:
+    """
+    ** Modele de cout des etapes du traitement d'un diagramme. **
+
+    Les estimations sont grossieres, elles ne servent qu'a comparer
+    les taches entre elles et a borner la memoire utilisee.
+    Le temps est en unite arbitraire, la memoire en octets.
+
+    Examples
+    --------
+    >>> from laue.utilities.scheduling import CostModel
+    >>> model = CostModel()
+    >>> cpu_small, mem_small = model.zone_axes(50)
+    >>> cpu_big, mem_big = model.zone_axes(1500)
+    >>> cpu_small < cpu_big and mem_small < mem_big
+    True
+    >>> model.zone_axes(0)
+    (0.0, 0)
+    >>>
+    """
+    def __init__(self, *, itemsize=8, axes_ratio=.25, block_bytes=32*2**20):
+        """
+        Parameters
+        ----------
+        itemsize : int, optional
+            La taille en octet des flottants manipules.
+        axes_ratio : float, optional
+            Le nombre d'axes de zone estime par spot. Cela permet
+            de predire la taille des matrices d'intersections.
+        block_bytes : int, optional
+            La taille maximale d'un bloc de matrice de distances.
+            Voir ``laue.core.zone_axes.atomic_find_zone_axes``.
+        """
+        assert isinstance(itemsize, int), f"'itemsize' has to be int, not {type(itemsize).__name__}."
+        assert itemsize > 0, f"'itemsize' doit etre positif, il vaut {itemsize}."
+        assert isinstance(axes_ratio, float), \
+            f"'axes_ratio' has to be float, not {type(axes_ratio).__name__}."
+        assert axes_ratio > 0, f"'axes_ratio' doit etre positif, il vaut {axes_ratio}."
+        assert isinstance(block_bytes, int), \
+            f"'block_bytes' has to be int, not {type(block_bytes).__name__}."
+
+        self.itemsize = itemsize
+        self.axes_ratio = axes_ratio
+        self.block_bytes = block_bytes
+
+    def pic_search(self, shape):
+        """
+        ** Cout du pic search d'une image. **
+
+        Parameters
+        ----------
+        shape : tuple
+            Les dimensions de l'image.
+
+        Returns
+        -------
+        cpu : float
+            Le temps de calcul estime.
+        memory : int
+            Le pic de memoire estime en octets.
+        """
+        pixels = math.prod(shape)
+        return float(pixels), 6*pixels*self.itemsize # Image, fond, masques et copies de travail.
+
+    def zone_axes(self, nbr_spots):
+        """
+        ** Cout de la recherche des axes de zone d'un diagramme. **
+
+        Notes
+        -----
+        * La transformee de hough est en O(n**2) en nombre de spots.
+        * La matrice des distances entre les intersections et les spots
+        est calculee par blocs de taille au plus ``block_bytes``.
+
+        Parameters
+        ----------
+        nbr_spots : int
+            Le nombre de spots du diagramme.
+
+        Returns
+        -------
+        cpu : float
+            Le temps de calcul estime.
+        memory : int
+            Le pic de memoire estime en octets.
+        """
+        if nbr_spots <= 1:
+            return 0.0, 0
+        pairs = nbr_spots*(nbr_spots-1)//2
+        nbr_axes = max(2, int(self.axes_ratio*nbr_spots))
+        inters = nbr_axes*(nbr_axes-1)//2
+        cpu = pairs*math.log2(pairs+1) + inters*nbr_spots
+        memory = (6*pairs*self.itemsize # Combinaisons de points et espace de hough.
+                + min(inters*nbr_spots*self.itemsize, self.block_bytes)) # Distances.
+        return float(cpu), memory
+
+    def subsets(self, nbr_spots, nbr_axes):
+        """
+        ** Cout de la separation des grains d'un diagramme. **
+
+        Parameters
+        ----------
+        nbr_spots : int
+            Le nombre de spots du diagramme.
+        nbr_axes : int
+            Le nombre d'axes de zone du diagramme.
+
+        Returns
+        -------
+        cpu : float
+            Le temps de calcul estime.
+        memory : int
+            Le pic de memoire estime en octets.
+        """
+        cpu = nbr_axes**2 + nbr_spots**2
+        return float(cpu), (nbr_axes**2 + nbr_spots**2)*self.itemsize
+
+def default_memory_budget(fraction=.5):
+    """
+    ** Budget memoire par defaut. **
+
+    Parameters
+    ----------
+    fraction : float
+        La part de la memoire disponible allouee aux taches.
+
+    Returns
+    -------
+    int or float
+        Le nombre d'octets, ``math.inf`` si ``psutil`` n'est pas installe.
+    """
+    if psutil is None:
+        return math.inf
+    return int(fraction*psutil.virtual_memory().available)
+
+class TaskFailure(Exception):
+    """
+    ** Une tache a echoue malgre toutes les tentatives. **
+    """
+
+class WorkerLost(TaskFailure):
+    """
+    ** Le processus qui executait la tache a disparu. **
+
+    C'est par exemple le cas quand il est tue par le noyau (OOM killer).
+    """
+
+def _worker_init(tracker, max_memory, initializer, initargs):
+    """
+    ** Initialise un processus de ``WorkerPool``. **
+    """
+    globals()["_tracker"] = tracker
+    if max_memory is not None:
+        import resource
+        resource.setrlimit(resource.RLIMIT_AS, (max_memory, max_memory))
+    if initializer is not None:
+        initializer(*initargs)
+
+_CALL_IDS = itertools.count() # Distingue les appels de ``scheduled_imap`` qui partagent un pool.
+
+def _tracked_call(args):
+    """
+    ** Signale le debut de la tache puis l'execute. **
+    """
+    func, call_id, rank, attempt, func_args = args
+    tracker = globals().get("_tracker", None)
+    if tracker is not None:
+        tracker.put((call_id, rank, attempt, os.getpid()))
+    return func(func_args)
+
+class WorkerPool(multiprocessing.pool.Pool):
+    """
+    ** Pool de processus surveilles. **
+
+    * Chaque processus signale les taches qu'il commence, ce qui
+    permet a ``scheduled_imap`` de savoir quel processus tuer
+    quand une tache depasse son delai, et de detecter les taches
+    perdues quand un processus disparait.
+    * Les processus tues sont remplaces automatiquement par le pool.
+    * La memoire de chaque processus peut etre bornee.
+    * Plusieurs ``scheduled_imap`` peuvent partager le pool en meme temps,
+    chacun ne recoit que les signalements de ses propres taches.
+
+    Examples
+    --------
+    >>> from laue.utilities.scheduling import WorkerPool
+    >>> with WorkerPool(2, max_memory=2**32) as pool:
+    ...     pool.apply(abs, (-1,))
+    ...
+    1
+    >>>
+    """
+    def __init__(self, processes=None, initializer=None, initargs=(), *,
+            max_memory=None, **kwargs):
+        """
+        Parameters
+        ----------
+        processes : int, optional
+            Le nombre de processus, par defaut ``os.cpu_count()``.
+        initializer : callable, optional
+            Fonction appelee au demarage de chaque processus.
+        initargs : tuple, optional
+            Les arguments de ``initializer``.
+        max_memory : int, optional
+            La taille maximale en octets de l'espace d'adressage de chaque
+            processus (``resource.RLIMIT_AS``). Au dela, les allocations
+            levent un ``MemoryError`` dans le processus au lieu de
+            declancher le OOM killer. Par defaut, il n'y a pas de limite.
+        **kwargs
+            See ``multiprocessing.pool.Pool``.
+        """
+        assert max_memory is None or isinstance(max_memory, int), \
+            f"'max_memory' has to be int, not {type(max_memory).__name__}."
+        assert max_memory is None or max_memory > 0, \
+            f"'max_memory' doit etre positif, il vaut {max_memory}."
+
+        context = kwargs.get("context", None) or multiprocessing.get_context()
+        self.tracker = context.SimpleQueue()
+        self._started = collections.defaultdict(list) # A chaque appel, ses taches commencees.
+        self._started_lock = threading.Lock()
+        super().__init__(processes, _worker_init,
+            (self.tracker, max_memory, initializer, initargs), **kwargs)
+
+    def alive_pids(self):
+        """
+        ** Les pids des processus vivants. **
+        """
+        return {process.pid for process in self._pool if process.is_alive()}
+
+    def started_tasks(self, call_id):
+        """
+        ** Vide la file des taches commencees d'un appel. **
+
+        Les signalements des autres appels sont gardes pour eux.
+
+        Parameters
+        ----------
+        call_id : int
+            L'identifiant de l'appel de ``scheduled_imap``.
+
+        Returns
+        -------
+        list
+            Les triplets ``(rank, attempt, pid)`` signales depuis le dernier appel.
+        """
+        with self._started_lock:
+            while not self.tracker.empty():
+                other_id, *task = self.tracker.get()
+                self._started[other_id].append(tuple(task))
+            return self._started.pop(call_id, [])
+
+def scheduled_imap(pool, func, iterable, *, cost, memory_budget=None,
+        window=None, ordered=True, timeout=None, retries=0, degrade=None,
+        on_failure=None, on_degraded=None):
+    """
+    ** Comme ``limited_imap`` mais ordonnance selon le cout des taches. **
+
+    * Les arguments sont lus par paquets de ``window`` taches.
+    * Dans chaque paquet, les taches les plus couteuses sont lancees en premier.
+    * Une tache n'est lancee que si la somme des memoires estimees
+    des taches en cours reste dans le budget. Une tache seule
+    est toujours acceptee afin de ne jamais bloquer.
+    * Une tache qui leve une exception, qui depasse ``timeout``
+    ou dont le processus disparait est relancee au plus ``retries`` fois,
+    avec des arguments eventuellement degrades par ``degrade``.
+    Avec un ``WorkerPool``, le processus d'une tache trop longue est tue
+    puis remplace, et la perte d'un processus est detectee.
+    * Un pool dont l'attribut ``reports_dispatch`` est vrai date lui meme le
+    depart de chaque tache dans l'attribut ``started`` de son ``AsyncResult``,
+    comme ``laue.utilities.distributed.DistributedPool``.
+    * Avec un autre pool, une tache n'est pas reperee quand elle commence.
+    Si ``timeout`` est fourni, il n'y a donc pas plus de taches en cours que
+    de processus, pour que le delai ne compte pas l'attente dans la file du pool.
+
+    Parameters
+    ----------
+    pool : multiprocessing.pool.Pool
+        Pool de ``multiprocessing.Pool()``, idealement un ``WorkerPool``.
+    func : callable
+        La fonction serialisable avec pickle qui sera evaluee.
+    iterable : iterable
+        Cede sucessivement les argument a fournir a ``func``.
+    cost : callable
+        Associe aux arguments d'une tache le couple ``(cpu, memory)``.
+        Voir ``CostModel``.
+    memory_budget : int, optional
+        La memoire maximale en octet des taches simultanees.
+        Par defaut, c'est la moitie de la memoire disponible.
+    window : int, optional
+        Le nombre de taches triees ensemble. Par defaut ``4*os.cpu_count()``.
+    ordered : boolean, optional
+        * True : Les resultats sont cedes dans l'ordre des arguments.
+        * False : Cede les couples ``(rank, result)`` des qu'ils sont prets.
+    timeout : float, optional
+        La duree maximale en secondes d'une tentative. Par defaut, pas de limite.
+    retries : int, optional
+        Le nombre de nouvelles tentatives apres un echec.
+    degrade : callable, optional
+        ``degrade(args, attempt) -> args``, fournit les arguments
+        de la tentative numero ``attempt`` (a partir de 1).
+    on_failure : callable, optional
+        ``on_failure(rank, args, error) -> result``, appelee quand toutes
+        les tentatives ont echoue. Son resultat est cede a la place de celui
+        de la tache. Si elle n'est pas fournie, l'erreur est levee.
+    on_degraded : callable, optional
+        ``on_degraded(rank, args, attempt, result) -> result``, appelee quand une
+        tache ne reussit qu'a la tentative numero ``attempt`` (a partir de 1),
+        avec les arguments ``args`` de cette tentative. Son resultat est cede
+        a la place de celui de la tache.
+
+    Yields
+    ------
+    result
+        Cede peu a peu les resultats de la fonction ``func``.
+
+    Raises
+    ------
+    TaskFailure
+        Si une tache echoue definitivement et que ``on_failure`` n'est pas fournie.
+
+    Examples
+    --------
+    >>> import multiprocessing
+    >>> from laue.utilities.scheduling import scheduled_imap
+    >>> with multiprocessing.Pool(2) as pool:
+    ...     list(scheduled_imap(pool, abs, [-1, -5, -3], cost=lambda x: (abs(x), 0)))
+    ...
+    [1, 5, 3]
+    >>> with multiprocessing.Pool(2) as pool:
+    ...     list(scheduled_imap(pool, abs, [-1, "a"], cost=lambda x: (0, 0),
+    ...         on_failure=lambda rank, args, err: None))
+    ...
+    [1, None]
+    >>>
+    """
+    from laue.utilities.multi_core import reorder
+
+    if memory_budget is None:
+        memory_budget = default_memory_budget()
+    if window is None:
+        window = 4*os.cpu_count()
+    assert memory_budget > 0, f"'memory_budget' doit etre positif, il vaut {memory_budget}."
+    assert isinstance(window, int), f"'window' has to be int, not {type(window).__name__}."
+    assert window >= 1, f"'window' doit etre au moins 1, il vaut {window}."
+    assert timeout is None or timeout > 0, f"'timeout' doit etre positif, il vaut {timeout}."
+    assert isinstance(retries, int), f"'retries' has to be int, not {type(retries).__name__}."
+    assert retries >= 0, f"'retries' ne doit pas etre negatif, il vaut {retries}."
+
+    tracked = isinstance(pool, WorkerPool)
+    call_id = next(_CALL_IDS)
+    reports = not tracked and getattr(pool, "reports_dispatch", False)
+
+    def _unordered():
+        done = queue.Queue() # Les tentatives terminees, (rank, attempt, success, result).
+        iterator = iter(enumerate(iterable))
+        pending = [] # Les taches lues mais pas encore lancees, (cpu, memory, rank, attempt, args).
+        running = {} # A chaque tache en cours, (attempt, memory, args, start, pid, async_result).
+        max_running = 2*max(os.cpu_count(), getattr(pool, "_processes", 0))
+        if timeout is not None and not tracked and not reports: # Une tache lancee est alors commencee.
+            max_running = max(1, getattr(pool, "_processes", 1))
+        exhausted = False
+
+        def submit(rank, attempt, memory, args):
+            callback = lambda res, rank=rank, attempt=attempt: done.put((rank, attempt, True, res))
+            error_callback = lambda err, rank=rank, attempt=attempt: done.put((rank, attempt, False, err))
+            if tracked:
+                async_result = pool.apply_async(_tracked_call, ((func, call_id, rank, attempt, args),),
+                    callback=callback, error_callback=error_callback)
+            else:
+                async_result = pool.apply_async(
+                    func, (args,), callback=callback, error_callback=error_callback)
+            running[rank] = (attempt, memory, args, time.time(), None, async_result)
+
+        def fail(rank, error):
+            """Relance la tache ou abandonne."""
+            attempt, memory, args, *_ = running.pop(rank)
+            if attempt < retries:
+                new_args = args if degrade is None else degrade(args, attempt+1)
+                pending.append((math.inf, memory, rank, attempt+1, new_args)) # Prioritaire.
+                return None
+            if on_failure is None:
+                raise TaskFailure(f"La tache {rank} a echoue {attempt+1} fois.") from error
+            return on_failure(rank, args, error)
+
+        def watch():
+            """Detecte les taches trop longues ou perdues."""
+            failures = []
+            if tracked:
+                for rank, attempt, pid in pool.started_tasks(call_id):
+                    if rank in running and running[rank][0] == attempt:
+                        running[rank] = (*running[rank][:3], time.time(), pid, running[rank][5])
+                alive = pool.alive_pids()
+            for rank, (attempt, _, _, start, pid, async_result) in running.items():
+                if reports: # Le pool date lui meme l'envoi de la tache.
+                    start = getattr(async_result, "started", None)
+                    started = start is not None
+                else:
+                    started = pid is not None or not tracked # Une tache en file d'attente n'a pas commence.
+                if timeout is not None and started and time.time() - start > timeout:
+                    if tracked and pid is not None:
+                        try:
+                            os.kill(pid, signal.SIGKILL) # Le pool le remplacera.
+                        except ProcessLookupError:
+                            pass
+                    failures.append((rank, TimeoutError(
+                        f"La tache {rank} depasse {timeout} s.")))
+                elif tracked and pid is not None and pid not in alive:
+                    failures.append((rank, WorkerLost(
+                        f"Le processus {pid} de la tache {rank} a disparu.")))
+            return failures
+
+        while True:
+            # Remplissage de la fenetre.
+            if not pending and not exhausted:
+                for rank, args in iterator:
+                    pending.append((*cost(args), rank, 0, args))
+                    if len(pending) >= window:
+                        break
+                else:
+                    exhausted = True
+            pending.sort(key=lambda task: task[0]) # Les plus lourdes a la fin.
+
+            # Lancement des taches qui rentrent dans le budget.
+            while pending and len(running) < max_running:
+                _, memory, rank, attempt, args = pending[-1]
+                if running and sum(r[1] for r in running.values()) + memory > memory_budget:
+                    break
+                pending.pop()
+                submit(rank, attempt, memory, args)
+
+            if not running:
+                if exhausted and not pending:
+                    return
+                continue
+
+            # Recuperation d'un resultat.
+            try:
+                rank, attempt, success, result = done.get(
+                    timeout=(1.0 if (tracked or timeout is not None) else None))
+            except queue.Empty:
+                for rank, error in watch():
+                    result = fail(rank, error)
+                    if rank not in running and not any(t[2] == rank for t in pending):
+                        yield rank, result
+                continue
+            if rank not in running or running[rank][0] != attempt: # Tentative deja abandonnee.
+                continue
+            if success:
+                _, _, args, *_ = running.pop(rank)
+                if attempt and on_degraded is not None:
+                    result = on_degraded(rank, args, attempt, result)
+                yield rank, result
+                continue
+            result = fail(rank, result)
+            if not any(task[2] == rank for task in pending):
+                yield rank, result
+
+    try:
+        if ordered:
+            yield from reorder(_unordered())
+        else:
+            yield from _unordered()
+    finally:
+        if tracked: # Les signalements restants ne concernent plus personne.
+            pool.started_tasks(call_id)
@@ -15,6 +15,7 @@ import hashlib
 import os
 
 import cloudpickle
+import numpy as np
 
 
 __pdoc__ = {"SpotPickelable.__getstate__": True,
@@ -30,10 +31,21 @@ __pdoc__ = {"SpotPickelable.__getstate__": True,
             "OrderedExperimentPickleable": False}
 
 
+def _results_signature(diag):
+    """
+    ** Resume ce qui a ete calcule sur un diagramme. **
+
+    La signature change des que des axes, des bouts de grains ou
+    des indices hkl sont ajoutes ou recalcules avec d'autres parametres.
+    """
+    return (tuple(diag._axes), tuple(diag._subsets), tuple(diag._hkl), tuple(diag._tokens.items()))
+
 class SpotPickleable:
     """
     ** Interface pour serialiser les spots. **
     """
+    __slots__ = ()
+
     def __getstate__(self):
         """
         ** Extrait le contenu d'un spot. **
@@ -63,12 +75,10 @@ class SpotPickleable:
         Spot(position=(1370.52, 1874.78), quality=0.573)
         >>>
         """
-        self.__init__(
-            bbox=state["bbox"],
-            spot_im=state["im"],
-            distortion=state["dis"],
-            diagram=None,
-            identifier=state["id"])
+        from laue.diagram import LaueDiagram, _pack_images
+        diagram = LaueDiagram(None, None) # Un spot seul est l'unique spot d'un diagramme detache.
+        diagram._set_spots([state["bbox"]], [state["dis"]], *_pack_images([state["im"]]))
+        self.__init__(diagram, 0)
 
 class ZoneAxisPickleable:
     """
@@ -110,9 +120,33 @@ class ZoneAxisPickleable:
         self._phi = state[2]
         self._mu = state[3]
 
+def _pack_groups(groups, dtype=np.int32):
+    """
+    ** Aplatit des listes d'indices en ``(decalages, indices)``. **
+    """
+    offsets = np.zeros(len(groups)+1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(group) for group in groups])
+    indices = np.fromiter((ind for group in groups for ind in group), dtype=dtype, count=int(offsets[-1]))
+    return offsets, indices
+
+def _unpack_groups(offsets, indices):
+    """
+    ** Inverse de ``_pack_groups``. **
+    """
+    return [indices[offsets[i]:offsets[i+1]] for i in range(len(offsets)-1)]
+
 class DiagramPickleable:
     """
     ** Interface pour serialiser un diagrame. **
+
+    Notes
+    -----
+    * Les spots sont ranges dans des tableaux contigus: les boites, les
+    distortions, les positions et intensites deja calculees, et une seule
+    arene qui contient les pixels de tous les spots bout a bout.
+    * Les axes de zone et les bouts de grains sont aussi des tableaux.
+    * Avec le protocole 5 de pickle, ces tableaux peuvent etre transmis hors
+    bande (``buffer_callback``), donc sans copie entre processus.
     """
     def __getstate__(self):
         """
@@ -120,20 +154,60 @@ class DiagramPickleable:
 
         Enregistre l'etat courant, ne fait pas de zele.
         """
-        state = {}
+        state = {"packed": 1}
         state["name"] = self.get_id()
         if not os.path.exists(self.get_id()):
             state["image"] = self.get_image_xy()
 
-        state["spots"] = [spot.__getstate__() for spot in self]
-        if self._axes:
-            state["axes"] = {key: [axis.__getstate__() for axis in axes]
-                for key, axes in self._axes.items()}
-        if self._subsets:
-            state["subsets"] = {key: [{spot.get_id() for spot in subset} for subset in subsets]
+        # Les spots, tels qu'ils sont ranges dans le diagramme.
+        state["bbox"] = self._bbox
+        state["distortion"] = self._distortions
+        state["position"] = self._positions
+        state["intensity"] = self._intensities
+        state["has_image"] = self._has_image
+        state["pixels"] = self._pixels
+        if self._gnomonics is not None: # Les projections deja calculees.
+            state["gnomonic"] = self._gnomonics
+        if self._thetachis is not None:
+            state["thetachi"] = self._thetachis
+
+        # Les resultats.
+        state.update({field: value for field, value in self._get_results_state().items() if value})
+        return state
+
+    def _get_results_state(self, fields=("axes", "subsets", "hkl")):
+        """
+        ** Extrait seulement les resultats, sans les spots. **
+
+        Parameters
+        ----------
+        fields : iterable
+            Les resultats a extraire, parmi "axes", "subsets" et "hkl".
+            Les signatures des etapes sont toujours jointes.
+
+        Returns
+        -------
+        dict
+            Les champs demandes, meme vides, a fournir a
+            ``DiagramPickleable._set_results_state``.
+        """
+        state = {}
+        if "axes" in fields:
+            state["axes"] = {}
+            for key, axes in self._axes.items():
+                offsets, indices = _pack_groups([tuple(axis.spots.keys()) for axis in axes])
+                state["axes"][key] = {
+                    "id": np.array([axis.get_id() for axis in axes], dtype=np.int64),
+                    "phi": np.array([axis._phi for axis in axes]),
+                    "mu": np.array([axis._mu for axis in axes]),
+                    "offsets": offsets, "spots": indices}
+        if "subsets" in fields:
+            state["subsets"] = {key: _pack_groups([sorted(spot.get_id() for spot in subset)
+                                                   for subset in subsets])
                 for key, subsets in self._subsets.items()}
-        if self._hkl:
+        if "hkl" in fields:
             state["hkl"] = self._hkl
+        state["tokens"] = self._tokens
         return state
 
     def __setstate__(self, state):
@@ -151,16 +225,72 @@ class DiagramPickleable:
         >>> pickle.loads(pickle.dumps(diag))
         LaueDiagram(name='laue/examples/ge_blanc.mccd')
         >>>
+
+        Les tableaux peuvent etre transmis hors bande.
+        >>> buffers = []
+        >>> data = pickle.dumps(diag, protocol=5, buffer_callback=buffers.append)
+        >>> len(pickle.loads(data, buffers=buffers)) == len(diag)
+        True
+        >>>
         """
-        from laue.spot import Spot as Spot_
-        from laue.zone_axis import ZoneAxis as ZoneAxis_
+        if "packed" not in state:
+            self._set_unpacked_state(state)
+            return
 
-        class Spot(Spot_):
-            def __init__(self, *args, state=None, **kwargs):
-                if state is None:
-                    super().__init__(*args, **kwargs)
-                else:
-                    self.__setstate__(state)
+        self.__init__(state["name"], None)
+        self._set_image(state.get("image", None))
+
+        # Les spots, l'arene est reprise telle quelle.
+        intensities = state["intensity"]
+        if intensities.dtype.kind == "f" and np.isnan(intensities).any(): # Format des spots objets.
+            intensities = None
+        self._set_spots(state["bbox"], state["distortion"], state["pixels"], state["has_image"],
+                        intensities=intensities, positions=state["position"])
+        self._gnomonics = state.get("gnomonic", None)
+        self._thetachis = state.get("thetachi", None)
+
+        # Les resultats.
+        self._set_results_state(state)
+
+    def _set_results_state(self, state):
+        """
+        ** Remplace les resultats presents dans ``state``. **
+
+        Les champs absents de ``state`` sont laisses tels quels,
+        voir ``DiagramPickleable._get_results_state``.
+        """
+        from laue.zone_axis import ZoneAxis
+
+        spots = list(self)
+        if "axes" in state:
+            self._axes, self._incidences = {}, {}
+        for key, axes in state.get("axes", {}).items():
+            self._axes[key] = [
+                ZoneAxis.__new__(ZoneAxis) for _ in range(len(axes["id"]))]
+            for axis, identifier, phi, mu, spots_ind in zip(self._axes[key],
+                    axes["id"].tolist(), axes["phi"], axes["mu"],
+                    _unpack_groups(axes["offsets"], axes["spots"])):
+                axis.diagram = self
+                axis.spots = collections.OrderedDict((ind, spots[ind]) for ind in spots_ind.tolist())
+                axis._identifier = identifier
+                axis._phi = phi
+                axis._mu = mu
+        if "subsets" in state:
+            self._subsets = {}
+        for key, (offsets, indices) in state.get("subsets", {}).items():
+            self._subsets[key] = [{spots[ind] for ind in subset.tolist()}
+                                  for subset in _unpack_groups(offsets, indices)]
+        if "hkl" in state:
+            self._hkl = state["hkl"]
+        if "tokens" in state:
+            self._tokens = state["tokens"]
+
+    def _set_unpacked_state(self, state):
+        """
+        ** Relit l'ancien format, un dictionnaire par spot. **
+        """
+        from laue.diagram import _pack_images
+        from laue.zone_axis import ZoneAxis as ZoneAxis_
 
         class ZoneAxis(ZoneAxis_):
             def __init__(self, *args, state=None, **kwargs):
@@ -172,9 +302,8 @@ class DiagramPickleable:
         self.__init__(state["name"], None)
         self._set_image(state.get("image", None))
 
-        self._set_spots([Spot(state=s) for s in state["spots"]])
-        for spot in self:
-            spot.diagram = self
+        self._set_spots([s["bbox"] for s in state["spots"]], [s["dis"] for s in state["spots"]],
+                        *_pack_images(s["im"] for s in state["spots"]))
         if "axes" in state:
             self._axes = {key: [ZoneAxis(state=s) for s in axes]
                 for key, axes in state["axes"].items()}
@@ -184,10 +313,11 @@ class DiagramPickleable:
                 axis.spots = collections.OrderedDict(
                     ((ind, self[ind]) for ind in axis.spots.keys()))
         if "subsets" in state:
-            self._subsets = {key: [{self[spot_id] for spot_id in subset} for subset in subets]
+            self._subsets = {key: [{self[spot_id] for spot_id in subset} for subset in subsets]
                 for key, subsets in state["subsets"].items()}
 
         self._hkl = state.get("hkl", {})
+        self._tokens = state.get("tokens", {})
 
 class TransformerPickleable:
     """
@@ -318,6 +448,19 @@ class ExperimentPickleable(OrderedExperimentPickleable):
         """
         ** Recupere des informations d'une experience. **
         """
+        state = self._get_bare_state()
+        state["images"]["_buffer"] = list(self._buff_images)
+        state["buff_diags"] = list(self._buff_diags)
+        state["sparse_diags"] = dict(self._sparse_diags)
+        return state
+
+    def _get_bare_state(self):
+        """
+        ** L'etat de l'experience, sans les diagrammes ni le tampon des images. **
+
+        Les diagrammes peuvent ensuite etre ajoutes un a un par
+        ``ExperimentPickleable._iter_state_deltas``.
+        """
         # cas OrderedExperiment
         from laue.experiment.ordered_experiment import OrderedExperiment
         if isinstance(self, OrderedExperiment):
@@ -341,7 +484,9 @@ class ExperimentPickleable(OrderedExperimentPickleable):
         state["shape"] = self._shape
         state["mean_bg"] = self._mean_bg
         state["calibration_parameters"] = self._calibration_parameters
-        state["gnomonic_matrix"] = self._gnomonic_matrix
+        state["failures"] = self._failures
+        state["shard_ranks"] = self._shard_ranks
+        state["gnomonic_matrix"] = self.cache.get(("gnomonic_matrix", self.stages.token("calibration")))
         state["saving_file"] = self.saving_file
         state["compress"] = self.compress
         state["dt"] = self.dt
@@ -353,20 +498,176 @@ class ExperimentPickleable(OrderedExperimentPickleable):
             state["images"] = {
                 "type": "list",
                 "_images": self._images,
-                "_buffer": self._buff_images}
+                "_buffer": []}
         else: # cas ou self._image est un generateur
             state["images"] = {
                 "type": "generator",
-                "_buffer": self._buff_images}
+                "_buffer": []}
 
         ## gestion transformer
         state["transformer"] = self.transformer
 
         ## gestion des diagrames
-        state["buff_diags"] = self._buff_diags
+        state["buff_diags"] = []
+        state["sparse_diags"] = {}
 
         return state
 
+    def _get_signatures(self):
+        """
+        ** La signature des resultats de chaque diagramme, sans les relire. **
+
+        Un diagramme deporte sur le disque est resume par la signature prise
+        a son depart de la memoire (voir ``laue.utilities.buffers._SpillStore.signatures``).
+
+        Returns
+        -------
+        signatures : dict
+            A chaque rang de diagramme, du tampon ou extrait par acces direct, sa signature.
+        end : int
+            Le nombre de diagrammes du tampon pris en compte.
+        """
+        end = len(self._buff_diags) # Le tampon ne fait que grandir.
+        signatures = {}
+        for store, ranks in ((self._buff_diags, range(end)), (self._sparse_diags, self._sparse_diags.keys())):
+            memory = dict(getattr(store, "_memory", {})) # Avant toute relecture.
+            spilled = store.signatures() if hasattr(store, "signatures") else {}
+            for rank in ranks:
+                if rank in memory:
+                    signatures[rank] = _results_signature(memory[rank])
+                elif rank in spilled:
+                    signatures[rank] = spilled[rank]
+                else: # En memoire, ou deplace pendant la capture.
+                    signatures[rank] = _results_signature(self._saved_diagram(rank))
+        return signatures, end
+
+    def _saved_diagram(self, rank):
+        """
+        ** Le diagramme de rang ``rank``, du tampon ou extrait par acces direct. **
+        """
+        return self._buff_diags[rank] if rank < len(self._buff_diags) else self._sparse_diags[rank]
+
+    def _get_meta(self):
+        """
+        ** Les petits attributs qui accompagnent chaque changement. **
+        """
+        return {
+            "len": self._len,
+            "shape": self._shape,
+            "mean_bg": self._mean_bg,
+            "calibration_parameters": self._calibration_parameters,
+            "failures": dict(self._failures)}
+
+    def _iter_state_deltas(self, signatures, end):
+        """
+        ** Cede les diagrammes un a un, pour completer ``ExperimentPickleable._get_bare_state``. **
+
+        Un seul diagramme deporte est relu a la fois, chacun forme un
+        changement a fusionner avec ``ExperimentPickleable._merge_deltas``.
+
+        Parameters
+        ----------
+        signatures : dict
+            Les rangs des diagrammes a ceder, voir ``ExperimentPickleable._get_signatures``.
+        end : int
+            Le nombre de diagrammes du tampon au moment de la capture.
+        """
+        meta = self._get_meta()
+        nbr_images = len(self._buff_images)
+        for rank in sorted(signatures):
+            yield {
+                "diags": {rank: self._saved_diagram(rank)},
+                "results": {},
+                "images": {rank: self._buff_images[rank]} if rank < min(end, nbr_images) else {},
+                "meta": meta,
+                }
+
+    def _get_delta(self, saved, count):
+        """
+        ** Les changements survenus depuis le dernier point de sauvegarde. **
+
+        Notes
+        -----
+        Les diagrammes deportes sur le disque ne sont relus que si
+        la signature prise a leur depart a change.
+
+        Parameters
+        ----------
+        saved : dict
+            A chaque rang de diagramme deja enregistre,
+            la signature de ses resultats.
+        count : int
+            Le nombre de diagrammes du tampon deja enregistres.
+
+        Returns
+        -------
+        delta : dict
+            Les diagrammes nouveaux en entier avec leurs images, seulement
+            les resultats qui ont change pour les diagrammes deja enregistres,
+            et les petits attributs. A fusionner avec ``ExperimentPickleable._merge_deltas``.
+        saved : dict
+            Les signatures a jour, a fournir au prochain appel.
+        count : int
+            Le nombre de diagrammes du tampon enregistres avec ce delta.
+        """
+        new_saved, end = self._get_signatures()
+        diags, results = {}, {}
+        for rank, signature in new_saved.items():
+            known = saved.get(rank, None)
+            if count <= rank < end or known is None: # Les spots n'ont jamais ete ecrits.
+                diags[rank] = self._saved_diagram(rank)
+            elif known != signature: # Seuls les resultats ont change, pas les spots.
+                fields = [field for field, old, new in zip(("axes", "subsets", "hkl"), known, signature)
+                          if old != new or known[3] != signature[3]]
+                results[rank] = self._saved_diagram(rank)._get_results_state(fields)
+        nbr_images = len(self._buff_images)
+        delta = {
+            "diags": diags,
+            "results": results,
+            "images": {rank: self._buff_images[rank] for rank in diags if rank < min(end, nbr_images)},
+            "meta": self._get_meta(),
+            }
+        return delta, new_saved, end
+
+    @staticmethod
+    def _merge_deltas(state, deltas):
+        """
+        ** Reconstitue un etat complet a partir d'un etat de base et des changements. **
+
+        Parameters
+        ----------
+        state : dict
+            L'etat renvoye par ``ExperimentPickleable.__getstate__``, il est modifie.
+        deltas : iterable
+            Les changements renvoyes par ``ExperimentPickleable._get_delta``, dans l'ordre.
+
+        Returns
+        -------
+        dict
+            L'etat ``state`` complete, pret pour ``ExperimentPickleable.__setstate__``.
+        """
+        diags = dict(enumerate(state["buff_diags"]))
+        diags.update(state.get("sparse_diags", {}))
+        images = dict(enumerate(state["images"]["_buffer"]))
+        for delta in deltas:
+            diags.update(delta["diags"])
+            for rank, results in delta.get("results", {}).items():
+                diags[rank]._set_results_state(results)
+            images.update(delta["images"])
+            state.update(delta["meta"])
+
+        all_images = state["images"].get("_images", None) # Seulement si c'est une liste.
+        prefix = 0 # Le nombre de diagrammes consecutifs depuis le debut.
+        while prefix in diags and (prefix in images or (all_images is not None and prefix < len(all_images))):
+            prefix += 1
+        state["images"]["_buffer"] = [images[rank] if rank in images else all_images[rank]
+                                      for rank in range(prefix)]
+        state["buff_diags"] = [diags[rank] for rank in range(prefix)]
+        state["sparse_diags"] = {rank: diag for rank, diag in diags.items() if rank >= prefix}
+        if state["len"] != prefix:
+            state["len"] = None # Tout n'a pas ete enregistre.
+        return state
+
     def __setstate__(self, state):
         """
         ** Initialise partiellement l'experience. **
@@ -398,13 +699,34 @@ class ExperimentPickleable(OrderedExperimentPickleable):
         if not hasattr(self, "ignore_errors"):
             self.ignore_errors = state["ignore_errors"]
         self.kwargs = state["kwargs"]
+        self.memory_budget = self.kwargs.get("memory_budget", None)
+        self.timeout = self.kwargs.get("timeout", None)
+        self.retries = self.kwargs.get("retries", 1)
+        self.max_worker_memory = self.kwargs.get("max_worker_memory", None)
+        from laue.utilities.concurrency import ConcurrencyPolicy
+        self.concurrency = ConcurrencyPolicy(self.kwargs.get("processes", None),
+            hierarchical=self.kwargs.get("hierarchical", False),
+            affinity=self.kwargs.get("affinity", None))
+        if not hasattr(self, "_cost_model"):
+            from laue.utilities.scheduling import CostModel
+            self._cost_model = CostModel()
         self.kernel_font = state["kernel_font"]
         self.kernel_dilate = state["kernel_dilate"]
         self._len = state["len"]
         self._mean_bg = state["mean_bg"]
         self._shape = state["shape"]
+        from laue.utilities.stages import StageGraph
+        self.stages = StageGraph() # Les signatures ne dependent que des parametres.
+        self.stages.set_parameters("detection",
+            {"threshold": self.threshold, "font_size": self.font_size, "max_space": self.max_space})
         self._calibration_parameters = state["calibration_parameters"]
-        self._gnomonic_matrix = state["gnomonic_matrix"]
+        self._failures = state.get("failures", {})
+        self._shard_ranks = state.get("shard_ranks", None)
+        self._shared_pool = None
+        self._pool, self._pool_finalizer = None, None
+        self.cache = self._new_cache()
+        if state["gnomonic_matrix"] is not None:
+            self.cache.put(("gnomonic_matrix", self.stages.token("calibration")), state["gnomonic_matrix"])
         if not hasattr(self, "saving_file"):
             self.saving_file = state["saving_file"]
         if not hasattr(self, "compress"):
@@ -426,21 +748,31 @@ class ExperimentPickleable(OrderedExperimentPickleable):
             if hasattr(self, "_images"):
                 self._images = [im for im in self._images if im not in set_buff]
             else:
-                self._images = [im for im in state["images"]["_images"] if im not in set_buff]
+                self._images = list(state["images"]["_images"][len(buff):]) # Le tampon en est le debut.
         else:
             if hasattr(self, "_images"):
                 self._images = (lambda: (yield from (im for im in self._images if im not in set_buff)))()
             else:
                 self._images = iter([])
         self._images_iterator = None
-        self._buff_images = buff
+        self._images_offset = len(buff)
+        self._readable_images = []
+        self._unreadable_images = set()
+        buff_images, buff_diags, self._sparse_diags = self._new_buffers()
+        for image in buff:
+            buff_images.append(image)
+        self._buff_images = buff_images
 
         ## gestion transformer
         self.transformer = state["transformer"]
         self.transformer.verbose = self.verbose
 
         ## gestion des diagrames
-        self._buff_diags = state["buff_diags"]
-        for diag in self._buff_diags:
+        for diag in state["buff_diags"]:
+            diag.experiment = self
+            buff_diags.append(diag)
+        self._buff_diags = buff_diags
+        for rank, diag in state.get("sparse_diags", {}).items():
             diag.experiment = self
+            self._sparse_diags[rank] = diag
         self._diagrams_iterator = None
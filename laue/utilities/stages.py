@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+
+"""
+** Suivi des dependances entre les etapes de calcul. **
+-------------------------------------------------------
+
+Chaque produit mis en cache (coordonnees gnomoniques, axes de zone, ...)
+retient la signature des parametres dont il depend, etapes amonts comprises.
+Quand un parametre change, seuls les produits des etapes en aval sont
+recalcules, les autres restent valables.
+"""
+
+
+STAGES = {
+    "detection": (), # Les spots, parametres 'threshold', 'font_size', 'max_space'.
+    "calibration": (), # Les parametres geometriques de la camera.
+    "gnomonic": ("detection", "calibration"), # Les coordonnees dans le plan gnomonic.
+    "thetachi": ("detection", "calibration"), # Les angles des rayons diffractes.
+    "zone_axes": ("gnomonic",), # Les axes de zone.
+    "subsets": ("zone_axes",), # Les bouts de grains.
+    "hkl": ("thetachi",), # Les indices de miller predits.
+}
+
+def _freeze(parameters):
+    """
+    ** Rend les parametres hashables et comparables. **
+    """
+    if isinstance(parameters, dict):
+        return tuple(sorted((key, _freeze(value)) for key, value in parameters.items()))
+    if isinstance(parameters, (list, tuple)):
+        return tuple(_freeze(value) for value in parameters)
+    return parameters
+
+class StageGraph:
+    """
+    ** Graphe des etapes et signature de leurs parametres. **
+
+    Notes
+    -----
+    * La signature d'une etape ne depend que du contenu des parametres,
+    pas de l'historique. Elle reste donc comparable apres une serialisation
+    ou entre deux experiences qui ont les memes parametres.
+    * La version d'une etape est incrementee a chaque changement reel
+    de ses parametres.
+
+    Examples
+    --------
+    >>> from laue.utilities.stages import StageGraph
+    >>> graph = StageGraph()
+    >>> graph.set_parameters("detection", {"threshold": 5.1})
+    True
+    >>> graph.set_parameters("calibration", {"dd": 70.0})
+    True
+    >>> axes, hkl = graph.token("zone_axes"), graph.token("hkl")
+    >>> graph.set_parameters("calibration", {"dd": 70.0}) # Rien ne change.
+    False
+    >>> graph.set_parameters("calibration", {"dd": 71.0})
+    True
+    >>> graph.token("zone_axes") == axes, graph.version("calibration")
+    (False, 2)
+    >>> sorted(graph.downstream("calibration"))
+    ['calibration', 'gnomonic', 'hkl', 'subsets', 'thetachi', 'zone_axes']
+    >>> sorted(graph.downstream("zone_axes"))
+    ['subsets', 'zone_axes']
+    >>>
+    """
+    def __init__(self, dependencies=None):
+        """
+        Parameters
+        ----------
+        dependencies : dict, optional
+            A chaque etape, les etapes dont elle depend directement.
+            Par defaut ``laue.utilities.stages.STAGES``.
+        """
+        self.dependencies = dict(STAGES if dependencies is None else dependencies)
+        assert all(dep in self.dependencies for deps in self.dependencies.values() for dep in deps), \
+            "Toutes les dependances doivent etre des etapes du graphe."
+
+        self._parameters = {stage: None for stage in self.dependencies}
+        self._versions = {stage: 0 for stage in self.dependencies}
+        self._tokens = {} # Les signatures deja calculees.
+
+    def downstream(self, *stages):
+        """
+        ** Les etapes fournies et toutes celles qui en dependent. **
+        """
+        assert all(stage in self.dependencies for stage in stages), \
+            f"Les etapes doivent etre parmi {sorted(self.dependencies)}, pas {stages}."
+        result = set(stages)
+        changed = True
+        while changed:
+            changed = False
+            for stage, deps in self.dependencies.items():
+                if stage not in result and result.intersection(deps):
+                    result.add(stage)
+                    changed = True
+        return result
+
+    def get_parameters(self, stage):
+        """
+        ** Les parametres propres a une etape, None si ils sont inconnus. **
+        """
+        return self._parameters[stage]
+
+    def set_parameters(self, stage, parameters):
+        """
+        ** Met a jour les parametres propres a une etape. **
+
+        Parameters
+        ----------
+        stage : str
+            Le nom de l'etape.
+        parameters : dict
+            Les nouveaux parametres, None si ils sont inconnus.
+
+        Returns
+        -------
+        boolean
+            True si les parametres ont change.
+        """
+        assert stage in self.dependencies, \
+            f"L'etape doit etre parmi {sorted(self.dependencies)}, pas {stage!r}."
+        parameters = None if parameters is None else dict(parameters)
+        if _freeze(parameters) == _freeze(self._parameters[stage]):
+            return False
+        self._parameters[stage] = parameters
+        self._versions[stage] += 1
+        self._tokens = {}
+        return True
+
+    def token(self, stage):
+        """
+        ** La signature d'une etape et de tout ce dont elle depend. **
+
+        Deux produits d'une meme etape sont interchangeables
+        si et seulement si leurs signatures sont egales.
+        """
+        token = self._tokens.get(stage, None)
+        if token is None:
+            token = (_freeze(self._parameters[stage]),
+                     *(self.token(dep) for dep in self.dependencies[stage]))
+            self._tokens[stage] = token
+        return token
+
+    def version(self, stage):
+        """
+        ** Le nombre de changements des parametres propres a une etape. **
+        """
+        return self._versions[stage]
+
+    def __getstate__(self):
+        return {"dependencies": self.dependencies, "parameters": self._parameters, "versions": self._versions}
+
+    def __setstate__(self, state):
+        self.dependencies = state["dependencies"]
+        self._parameters = state["parameters"]
+        self._versions = state["versions"]
+        self._tokens = {}
@@ -15,10 +15,6 @@ import math
 import numbers
 
 import numpy as np
-try:
-    import numexpr
-except ImportError:
-    numexpr = None
 try:
     import psutil # Pour acceder a la memoire disponible.
 except ImportError:
@@ -37,6 +33,9 @@ def distance(axis1, axis2, *, weight=.5):
     r"""
     ** Calcule la distance entre plusieurs axes de zones. **
 
+    Les distances sont calculees par ``laue.core.neighbors.pairwise_distances``,
+    qui accepte directement les tableaux des coordonnees ``(phi, mu)``.
+
     Parameters
     ----------
     axis1 : laue.zone_axis.ZoneAxis, tuple, list, np.ndarray
@@ -141,30 +140,20 @@ def distance(axis1, axis2, *, weight=.5):
             np.array([axis2]),
             weight=weight)[:, 0]
 
-    # Calcul des distances
+    # Calcul des distances, par blocs.
+    from laue.core.neighbors import pairwise_distances
     meth = lambda axis: axis.get_polar_coords() if isinstance(axis, ZoneAxis) else axis
-    phi1, mu1 = np.array([meth(axis) for axis in axis1], dtype=np.float32).transpose()
-    phi2, mu2 = np.array([meth(axis) for axis in axis2], dtype=np.float32).transpose()
-    phi1, phi2 = np.meshgrid(phi1, phi2, indexing="ij", copy=False)
-    mu1, mu2 = np.meshgrid(mu1, mu2, indexing="ij", copy=False)
-    pi = np.float32(np.pi)
-
-    if weight == 0:
-        return np.abs(mu2-mu1)
-    if weight == 1:
-        return pi - np.abs(np.abs(phi2-phi1) - pi)
-    if numexpr is not None:
-        return numexpr.evaluate("sqrt(weight**2*(pi - abs(abs(phi2-phi1) - pi))**2 "
-                                "+ (1-weight)**2*(mu2-mu1)**2)")
-    return np.sqrt(
-        weight**2*(pi - np.abs(np.abs(phi2-phi1) - pi))**2
-      + (1-weight)**2*(mu2-mu1)**2)
+    polar1 = np.array([meth(axis) for axis in axis1], dtype=np.float32).transpose()
+    polar2 = np.array([meth(axis) for axis in axis2], dtype=np.float32).transpose()
+    return pairwise_distances(polar1, polar2, space="axis", weight=weight, dtype=np.float32)
 
 
 class ZoneAxis(ZoneAxisPickleable):
     """
     Un axe de zone seul.
     """
+    _incidence = None # La matrice d'incidence de tous les axes du diagramme.
+
     def __init__(self, diagram, spots_ind, identifier, phi, mu):
         """
         Notes
@@ -222,11 +211,27 @@ class ZoneAxis(ZoneAxisPickleable):
         <class 'numpy.float64'>
         >>>
         """
-        phi_vect, mu_vect = self.get_polar_coords()
-        phi_vect, mu_vect = np.array([phi_vect]), np.array([mu_vect])
-        x_vect, y_vect = np.array([spot.get_gnomonic() for spot in self]).transpose()
-        return self.diagram.experiment.transformer.dist_line(
-            phi_vect, mu_vect, x_vect, y_vect).mean()
+        incidence, row = self._get_incidence()
+        return incidence.dist_means(
+            self.diagram.experiment.transformer, self.diagram.get_gnomonic_positions())[row]
+
+    def _get_incidence(self):
+        """
+        ** La matrice d'incidence qui contient cet axe, et le rang de sa ligne. **
+
+        Les metriques sont calculees pour tous les axes du diagramme d'un coup.
+        Un axe qui n'appartient pas a son diagramme a sa propre matrice.
+        """
+        if self._incidence is None:
+            for axes in self.diagram._axes.values():
+                if self._identifier < len(axes) and axes[self._identifier] is self:
+                    self.diagram._get_incidence(axes)
+                    break
+            else:
+                from laue.core.incidence import AxesIncidence
+                return AxesIncidence.from_groups(
+                    [self.spots.keys()], len(self.diagram), [self._phi], [self._mu]), 0
+        return self._incidence, self._identifier
 
     def get_id(self):
         """
@@ -297,37 +302,9 @@ class ZoneAxis(ZoneAxisPickleable):
         True
         >>>
         """
-        def dmean_2_score(dmean, d_max=.0117):
-            """
-            f([0, d_min/4[) = [1, .9[
-            f([d_min/4, d_max[) = [.9, .2[
-            f([d_max, +oo[) = [.2, 0[
-            """ 
-            d_min = d_max / 4
-            
-            if dmean < d_min:
-                return 1 - ((1-.9)/d_min)*dmean
-            slope = (.9-.2)/(d_max-d_min)
-            if dmean < d_max:
-                return .9 - slope*(dmean-d_min)
-            return .2*math.exp(-(slope/.2)*(dmean-d_max))
-
-        def nbr_2_score(nbr, nbr_min=7):
-            """
-            f(nbr_min) = 0.1
-            f(2*nbr_min) = 0.8
-            f(+00) = 1
-            """
-            nbr_max = 2 * nbr_min
-            a, b = .1, .8
-            lna = math.log((1-a)/a)
-            lnb = math.log((1-b)/b)
-            beta = (nbr_min*lnb - nbr_max*lna) / (lnb - lna)
-            lamb = lna / (beta - nbr_min)
-            return 1 / (1 + math.exp(-lamb*(nbr-beta)))
-
-        nbr_weight = .75 # Importance du nombre de points par raport a la proximite.
-        return nbr_weight*nbr_2_score(len(self)) + (1-nbr_weight)*dmean_2_score(self.dist_mean())
+        incidence, row = self._get_incidence()
+        return float(incidence.qualities(
+            self.diagram.experiment.transformer, self.diagram.get_gnomonic_positions())[row])
 
     def plot_gnomonic(self, axe_pyplot=None, *, display=True):
         """